@@ -0,0 +1,615 @@
+import argparse
+import collections
+import collections.abc
+import concurrent.futures
+import json
+import os
+import random
+import inspect
+import itertools
+import re
+import resource
+import shlex
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+import costar_graph_module
+import database_module as dm
+import extraction_module
+from fetch_module import HostRateLimiter, RequestsFetcher, SeleniumFetcher, create_driver
+from fixture_server_module import serve_directory, write_fixture_site
+from query_client_module import QueryClient
+from query_server_module import serve_queries
+import user_interface_module as ui
+from scraping_pool_module import ScrapeWorkerPool
+from snapshot_module import export_snapshot, load_snapshot, snapshot_path
+from synthetic_database_module import generate_database, skewed_cast
+
+def _fetch_page(page_url, fetcher):
+    return len(fetcher.fetch(page_url))
+
+def _time_pool(pool, page_urls):
+    started = time.perf_counter()
+    failures = 0
+    for _, _, error in pool.run((page_url, _fetch_page, (page_url, )) for page_url in page_urls):
+        if error is not None:
+            failures += 1
+    elapsed = time.perf_counter() - started
+    return {
+        'pages': len(page_urls),
+        'failures': failures,
+        'seconds': round(elapsed, 4),
+        'pages_per_second': round(len(page_urls) / elapsed, 2),
+    }
+
+def benchmark_fetch(page_count=500, concurrency=8, browser_workers=2):
+    '''
+        Fetches the same fixture movie pages from a local server with both fetch backends.
+        The Selenium backend is reported as skipped when no Chrome is available.
+        Returns:
+            dict: {backend_name: {pages, failures, seconds, pages_per_second} | {skipped}}
+    '''
+    results = {}
+    with tempfile.TemporaryDirectory() as fixture_directory:
+        write_fixture_site(fixture_directory, actor_count=1, movie_count=page_count, movies_per_actor=1, awards_per_actor=0)
+        with serve_directory(fixture_directory) as base_url:
+            page_urls = [f'{base_url}/title/tt{1000000 + movie_index}/' for movie_index in range(page_count)]
+
+            http_fetcher = RequestsFetcher(concurrency)
+            with ScrapeWorkerPool(concurrency, lambda: http_fetcher) as pool:
+                results[f'requests (concurrency={concurrency})'] = _time_pool(pool, page_urls)
+
+            rate_limiter = HostRateLimiter()
+            with ScrapeWorkerPool(browser_workers, lambda: SeleniumFetcher(create_driver(), rate_limiter)) as pool:
+                # Start the browsers before timing, they are reused for the whole scrape.
+                warm_up_errors = [error for _, _, error in pool.run((page_url, _fetch_page, (page_url, )) for page_url in page_urls[:browser_workers]) if error is not None]
+                if len(warm_up_errors) > 0:
+                    results[f'selenium (workers={browser_workers})'] = {'skipped': repr(warm_up_errors[0])}
+                else:
+                    results[f'selenium (workers={browser_workers})'] = _time_pool(pool, page_urls)
+    return results
+
+# The parsers as they were before extraction_module: a full html.parser tree per page
+# (shared by the three actor page parsers) and a str(li) scan over the filmography.
+
+def _legacy_parse_actor_list(list_html):
+    soup = BeautifulSoup(list_html, 'html.parser')
+    actors = []
+    for anchor in soup.find_all('a', class_='ipc-title-link-wrapper'):
+        name_anchor = anchor.find('h3', class_='ipc-title__text')
+        name = name_anchor.get_text(strip=True) if name_anchor else "Unknown Actor"
+        actors.append((' '.join(name.split(' ')[1:]), f"{extraction_module.IMDB_BASE_URL}{anchor['href']}"))
+    return actors
+
+def _legacy_parse_actor_page(actor_html):
+    actor_soup = BeautifulSoup(actor_html, 'html.parser')
+    bio_div = actor_soup.find('div', class_='ipc-html-content-inner-div')
+    actor_bio = bio_div.get_text(strip=True) if bio_div else "Biography not available."
+    award_url = f"{extraction_module.IMDB_BASE_URL}{actor_soup.find('a', href=re.compile(r'^/name/.*/awards/.*'))['href']}"
+    movie_lis = actor_soup.find_all('li', class_='ipc-metadata-list-summary-item')
+    movie_lis = [li for li in movie_lis if 'data-testid=\"cred_actor' in str(li) or 'data-testid=\"cred_actress' in str(li)]
+    movies = []
+    for movie_li in movie_lis:
+        film_title_anchor = movie_li.find('a', class_="ipc-metadata-list-summary-item__t")
+        movies.append((film_title_anchor.decode_contents(), extraction_module.canonical_url(f"{extraction_module.IMDB_BASE_URL}{film_title_anchor['href']}")))
+    return actor_bio, award_url, movies
+
+def _legacy_parse_actor_awards(award_html):
+    award_soup = BeautifulSoup(award_html, 'html.parser')
+    actor_awards = []
+    for award_li in award_soup.find_all('li', {'data-testid': "list-item"}):
+        award_div = award_li.find('div', class_='ipc-metadata-list-summary-item__tc')
+        award_anchor = award_div.find('a', class_='ipc-metadata-list-summary-item__t')
+        award_year, award_tag = tuple(award_anchor.decode_contents().split('<span')[0].split(' '))
+        award_name = award_anchor.find('span').decode_contents()
+        award_category = award_div.find('span', class_='ipc-metadata-list-summary-item__li awardCategoryName')
+        actor_awards.append((award_name, award_tag, award_category.decode_contents() if award_category is not None else "No Category", award_year))
+    return actor_awards
+
+def _legacy_parse_movie_metadata(movie_html):
+    movie_soup = BeautifulSoup(movie_html, 'html.parser')
+    genres_div = movie_soup.find('div', {'data-testid': "interests"})
+    movie_genres = [anchor.find('span').decode_contents() for anchor in genres_div.find_all('a')]
+    year_anchor = movie_soup.find('h1', {'data-testid': "hero__pageTitle"}).parent.find('a', href=re.compile(r"^/title/.*/releaseinfo/.*"))
+    movie_year = year_anchor.decode_contents()[:4] if year_anchor is not None else None
+    rating_div = movie_soup.find('div', {'data-testid': "hero-rating-bar__aggregate-rating__score"})
+    movie_rating = rating_div.find_all('span')[0].decode_contents() if rating_div is not None else 0
+    return movie_year, movie_rating, movie_genres
+
+def _extract_actor_page(actor_html):
+    return (
+        extraction_module.extract_actor_bio(actor_html),
+        extraction_module.extract_award_url(actor_html),
+        extraction_module.extract_actor_movies(actor_html),
+    )
+
+def _time_parser(parse_function, pages, repeats):
+    timings = []
+    for _ in range(repeats):
+        for page in pages:
+            started = time.perf_counter()
+            parse_function(page)
+            timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    peaks = []
+    for page in pages:
+        tracemalloc.reset_peak()
+        parse_function(page)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    return {
+        'pages': len(pages),
+        'ms_per_page': round(1000 * statistics.median(timings), 3),
+        'peak_kib_per_page': round(statistics.median(peaks) / 1024, 1),
+    }
+
+def _read_fixture_page(fixture_directory, url_path):
+    with open(os.path.join(fixture_directory, *url_path.strip('/').split('/'), 'index.html'), encoding='utf-8') as page_file:
+        return page_file.read()
+
+def benchmark_parse(filmography_size=2000, award_count=200, movie_pages=50, repeats=5):
+    '''
+        Parses fixture pages with the legacy full-tree parsers and with extraction_module.
+        Time is the median per page, allocations are the median tracemalloc peak per page.
+        Returns:
+            dict: {"<page type> (<parser>)": {pages, ms_per_page, peak_kib_per_page}}
+    '''
+    with tempfile.TemporaryDirectory() as fixture_directory:
+        list_path = write_fixture_site(fixture_directory, actor_count=100, movie_count=max(filmography_size, movie_pages), movies_per_actor=filmography_size, awards_per_actor=award_count)
+        list_pages = [_read_fixture_page(fixture_directory, list_path)]
+        actor_pages = [_read_fixture_page(fixture_directory, f'/name/nm{1000000 + actor_index}/') for actor_index in range(2)]
+        award_pages = [_read_fixture_page(fixture_directory, f'/name/nm{1000000 + actor_index}/awards/') for actor_index in range(2)]
+        movie_pages = [_read_fixture_page(fixture_directory, f'/title/tt{1000000 + movie_index}/') for movie_index in range(movie_pages)]
+
+    parsers = [
+        ('actor list', list_pages, _legacy_parse_actor_list, extraction_module.extract_actor_list),
+        ('actor page', actor_pages, _legacy_parse_actor_page, _extract_actor_page),
+        ('awards page', award_pages, _legacy_parse_actor_awards, extraction_module.extract_actor_awards),
+        ('movie page', movie_pages, _legacy_parse_movie_metadata, extraction_module.extract_movie_metadata),
+    ]
+    results = {}
+    for page_type, pages, legacy_function, extract_function in parsers:
+        results[f'{page_type} (legacy)'] = _time_parser(legacy_function, pages, repeats)
+        results[f'{page_type} (extraction_module)'] = _time_parser(extract_function, pages, repeats)
+    return results
+
+def _percentiles(timings):
+    timings = sorted(timings)
+    return {
+        'p50_ms': round(1000 * timings[len(timings) // 2], 3),
+        'p99_ms': round(1000 * timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+    }
+
+def _time_queries(query, arguments):
+    timings = []
+    for query_arguments in arguments:
+        started = time.perf_counter()
+        query(*query_arguments)
+        timings.append(time.perf_counter() - started)
+    return _percentiles(timings)
+
+def benchmark_graph(actor_count=200000, movie_count=100000, average_cast=20, query_count=200, changed_pairs=1000, seed=0):
+    '''
+        Builds the co-star graph of a synthetic played_in table in a temporary database and times
+        the build, the load, top co-stars, shortest paths and an incremental update.
+        Returns:
+            dict: {step: {seconds} | {p50_ms, p99_ms}}
+    '''
+    rng = random.Random(seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as database_directory:
+        with dm.open_database(os.path.join(database_directory, 'movies.db'), readonly=False):
+            dm.reset_database()
+            started = time.perf_counter()
+            dm.insert_played_in((actor_id, movie_id) for movie_id, cast in skewed_cast(actor_count, movie_count, average_cast, rng) for actor_id in cast)
+            edge_count = dm.get_connection().execute('SELECT COUNT(*) FROM played_in').fetchone()[0]
+            results['insert played_in'] = {'edges': edge_count, 'seconds': round(time.perf_counter() - started, 3)}
+
+            started = time.perf_counter()
+            costar_graph_module.update_graph()
+            results['full build and save'] = {'seconds': round(time.perf_counter() - started, 3)}
+
+            started = time.perf_counter()
+            graph = costar_graph_module.load_graph()
+            results['load (mmap)'] = {'seconds': round(time.perf_counter() - started, 4)}
+
+            actor_ids = [rng.randint(1, actor_count) for _ in range(2 * query_count)]
+            results['top_costars'] = _time_queries(graph.top_costars, [(actor_id, ) for actor_id in actor_ids[:query_count]])
+            results['shortest_path'] = _time_queries(graph.shortest_path, list(zip(actor_ids[:query_count], actor_ids[query_count:])))
+            graph.close()
+
+            dm.insert_played_in((rng.randint(1, actor_count), rng.randint(1, movie_count)) for _ in range(changed_pairs))
+            started = time.perf_counter()
+            graph = costar_graph_module.load_graph()
+            results[f'load with {changed_pairs} logged changes'] = {'seconds': round(time.perf_counter() - started, 4)}
+            graph.close()
+            started = time.perf_counter()
+            costar_graph_module.update_graph()
+            results['incremental update and save'] = {'seconds': round(time.perf_counter() - started, 3)}
+    return results
+
+SERVER_QUERIES = ['{actor} --bio', '{actor} --movies --limit 20', '{actor} --topfive', '{actor} --ratings', '{actor} --genres --limit 5']
+
+def benchmark_server(request_count=500, process_count=10, workers=8):
+    '''
+        Latency of one lookup against the configured database: a fresh CLI process per lookup,
+        a fresh thin client process per lookup against the query server, and requests of one
+        keep-alive client (sequential and from as many threads as the server has workers).
+        Returns:
+            dict: {mode: {p50_ms, p99_ms}}
+    '''
+    actor_names = [actor_name for _, actor_name in dm.get_all_actors()]
+    rng = random.Random(0)
+    queries = [rng.choice(SERVER_QUERIES).format(actor=f'"{rng.choice(actor_names)}" ""') for _ in range(request_count)]
+    module_directory = os.path.dirname(os.path.abspath(__file__))
+    environment = {**os.environ, 'MOVIES_DB': dm.database_path()}
+    results = {}
+
+    def run_process(command, query_string):
+        subprocess.run(command, input=query_string, capture_output=True, text=True, check=True, cwd=module_directory, env=environment)
+
+    cli_command = [sys.executable, 'user_interface_module.py', '--batch', '-']
+    results['CLI process per lookup'] = _time_queries(run_process, [(cli_command, query_string) for query_string in queries[:process_count]])
+
+    with serve_queries(workers=workers) as base_url:
+        client_command = [sys.executable, 'query_client_module.py', '--url', base_url]
+        results['client process per lookup'] = _time_queries(lambda query_string: subprocess.run(client_command + [query_string], capture_output=True, check=True, cwd=module_directory), [(query_string, ) for query_string in queries[:process_count]])
+
+        client = QueryClient(base_url)
+        results['keep-alive client'] = _time_queries(client.query, [(query_string, ) for query_string in queries])
+        client.close()
+
+        timings = []
+        def run_client(client_queries):
+            thread_client = QueryClient(base_url)
+            for query_string in client_queries:
+                started = time.perf_counter()
+                thread_client.query(query_string)
+                timings.append(time.perf_counter() - started)
+            thread_client.close()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            started = time.perf_counter()
+            list(executor.map(run_client, [queries[index::workers] for index in range(workers)]))
+            elapsed = time.perf_counter() - started
+        results[f'{workers} keep-alive clients'] = {**_percentiles(timings), 'requests_per_second': round(len(queries) / elapsed)}
+        results['server'] = QueryClient(base_url).stats()['query_cache']
+    return results
+
+IMPORT_MODULES = ['extraction_module', 'database_module', 'costar_graph_module', 'user_interface_module', 'query_server_module', 'query_client_module', 'web_scraping_module']
+
+def benchmark_imports(modules=IMPORT_MODULES, repeats=5):
+    '''
+        Imports every module in a fresh interpreter with python -X importtime, from a temporary working directory
+        and with MOVIES_DB pointing to a file that does not exist, which must still not exist afterwards.
+        Returns:
+            dict: {module: {cumulative_ms, self_ms, process_ms, creates_database}} with the medians of repeats runs
+    '''
+    module_directory = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    with tempfile.TemporaryDirectory() as working_directory:
+        missing_database = os.path.join(working_directory, 'missing.db')
+        environment = {**os.environ, 'MOVIES_DB': missing_database, 'PYTHONPATH': module_directory}
+        for module in modules:
+            cumulative, own, process = [], [], []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True, cwd=working_directory, env=environment)
+                process.append(time.perf_counter() - started)
+                if completed.returncode != 0:
+                    raise RuntimeError(f'import {module} failed: {completed.stderr.strip().splitlines()[-1]}')
+                # "import time: self [us] | cumulative | imported package"
+                own_us, cumulative_us, _ = next(line for line in completed.stderr.splitlines() if line.endswith(f'| {module}')).split(':', 1)[1].split('|')
+                own.append(int(own_us) / 1000)
+                cumulative.append(int(cumulative_us) / 1000)
+            results[module] = {
+                'cumulative_ms': round(statistics.median(cumulative), 1),
+                'self_ms': round(statistics.median(own), 1),
+                'process_ms': round(1000 * statistics.median(process), 1),
+                'creates_database': os.path.exists(missing_database),
+            }
+    return results
+
+# Scales of the synthetic database, "large" is the size of the production corpus.
+SCALES = {
+    'small': {'actor_count': 1000, 'movie_count': 20000, 'played_in_count': 100000},
+    'medium': {'actor_count': 10000, 'movie_count': 200000, 'played_in_count': 1000000},
+    'large': {'actor_count': 10000, 'movie_count': 1000000, 'played_in_count': 10000000},
+}
+PAGE_SIZE = 100
+# CLI query lines of the process_* handlers, {actor} / {other_actor} are replaced by quoted first and last names.
+CLI_QUERIES = {
+    'actors': f'None None --actors --limit {PAGE_SIZE}',
+    'genre_stats': 'None None --genre-stats',
+    'search': 'None None --search "{word}" --limit 10',
+    'bio': '{actor} --bio',
+    'movies': f'{{actor}} --movies --limit {PAGE_SIZE}',
+    'awards': f'{{actor}} --awards --limit {PAGE_SIZE}',
+    'genres': '{actor} --genres',
+    'ratings': '{actor} --ratings',
+    'topfive': '{actor} --topfive',
+    'costars': '{actor} --costars',
+    'path': '{actor} --path "{other_actor}"',
+}
+
+def _quoted_name(actor_name):
+    first_name, _, last_name = actor_name.partition(' ')
+    return f'{shlex.quote(first_name)} {shlex.quote(last_name)}'
+
+def _getter_variants(function, sample, rng):
+    '''
+        Arguments of a database_module getter from its parameter names. Getters with a limit are timed
+        for one page and for the whole list (streamed), getters of one actor or movie with random ones.
+        Returns:
+            list[tuple]: [(name, keyed, make_arguments), ...], make_arguments() -> (args, kwargs)
+    '''
+    parameters = inspect.signature(function).parameters
+    values = {
+        'actor_id': lambda: rng.choice(sample['actor_ids']),
+        'actor_ids': lambda: rng.sample(sample['actor_ids'], min(20, len(sample['actor_ids']))),
+        'movie_ids': lambda: rng.sample(sample['movie_ids'], min(20, len(sample['movie_ids']))),
+        'movie_url': lambda: rng.choice(sample['movie_urls']),
+        'stage': lambda: 'movies',
+        'after_change_id': lambda: 0,
+        'table': lambda: 'played_in',
+    }
+    required = [name for name, parameter in parameters.items() if parameter.default is inspect.Parameter.empty]
+    unknown = [name for name in required if name not in values]
+    if len(unknown) > 0:
+        raise ValueError(f'No sample value for {function.__name__}({", ".join(unknown)})')
+    keyed = len(required) > 0 and required not in (['stage'], ['after_change_id'], ['table'])
+
+    def make_arguments(**kwargs):
+        return lambda: ([values[name]() for name in required], kwargs)
+
+    if 'limit' not in parameters:
+        return [(function.__name__, keyed, make_arguments())]
+    variants = [(function.__name__, keyed, make_arguments(limit=PAGE_SIZE))]
+    if 'stream' in parameters:
+        variants.append((f'{function.__name__}(full)', keyed, make_arguments(stream=True)))
+    return variants
+
+def _time_variant(call, make_arguments, repeats):
+    '''
+        Returns:
+            dict: {repeats, p50_ms, p99_ms, peak_alloc_kb}, the allocation peak of one extra traced call
+    '''
+    def consumed_call(args, kwargs):
+        result = call(*args, **kwargs)
+        # Streamed results are consumed, like a caller would.
+        if isinstance(result, collections.abc.Iterator):
+            collections.deque(result, maxlen=0)
+
+    timings = []
+    for _ in range(repeats):
+        args, kwargs = make_arguments()
+        started = time.perf_counter()
+        consumed_call(args, kwargs)
+        timings.append(time.perf_counter() - started)
+    args, kwargs = make_arguments()
+    tracemalloc.start()
+    consumed_call(args, kwargs)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'repeats': repeats, **_percentiles(timings), 'peak_alloc_kb': round(peak_bytes / 1024, 1)}
+
+def measure_database(path, repeats=100, full_repeats=5, seed=0):
+    '''
+        Times every get_* function of database_module and every CLI handler (query_* + format_*,
+        the former process_* functions) on the database at path, without the query cache.
+        Returns:
+            dict: {'functions': {name: {...}}, 'handlers': {name: {...}}, 'peak_rss_mb': float}
+    '''
+    rng = random.Random(seed)
+    ui.query_cache.max_entries = 0
+    results = {'functions': {}, 'handlers': {}}
+    with dm.open_database(path, readonly=True):
+        actors = dm.get_all_actors()
+        movie_ids = [movie_id for movie_id, _, _ in itertools.islice(dm.get_all_movies(stream=True), 0, None, 97)]
+        sample = {
+            'actor_ids': [actor_id for actor_id, _ in actors],
+            'movie_ids': movie_ids,
+            'movie_urls': [movie_url for _, _, _, _, _, movie_url in dm.get_movies(movie_ids[:200])],
+        }
+        for name, function in sorted(vars(dm).items()):
+            if not name.startswith('get_') or not inspect.isfunction(function) or function is dm.get_connection:
+                continue
+            for variant_name, keyed, make_arguments in _getter_variants(function, sample, rng):
+                results['functions'][variant_name] = _time_variant(function, make_arguments, repeats if keyed else full_repeats)
+
+        parser = ui.parse_arguments()
+        def make_query(template):
+            def make_arguments():
+                query_string = template.format(
+                    actor=_quoted_name(rng.choice(actors)[1]), other_actor=rng.choice(actors)[1], word=rng.choice(['night', 'city', 'love', 'king']),
+                )
+                return [ui.parse_query(parser, query_string)], {}
+            return make_arguments
+        def process(args):
+            for result in ui.run_query(args, ui.resolve_actor_ids([args])):
+                ui.FORMATTERS[result.command](args, result)
+        for command, template in CLI_QUERIES.items():
+            results['handlers'][f'process_{command}'] = _time_variant(process, make_query(template), repeats if '{actor}' in template else full_repeats)
+        if ui.costar_graph is not None:
+            ui.costar_graph.close()
+            ui.costar_graph = None
+    results['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return results
+
+def benchmark_database(scales=('small', 'medium'), data_directory=None, repeats=100, regenerate=False):
+    '''
+        Generates (or reuses) a synthetic database per scale and measures it in a fresh process,
+        so that the peak RSS belongs to that scale alone.
+        Returns:
+            dict: {scale: {'parameters', 'generation', 'database_mb', 'functions', 'handlers', 'peak_rss_mb'}}
+    '''
+    data_directory = data_directory if data_directory is not None else os.path.join(tempfile.gettempdir(), 'movies_benchmark')
+    os.makedirs(data_directory, exist_ok=True)
+    module_directory = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for scale in scales:
+        parameters = SCALES[scale]
+        path = os.path.join(data_directory, f'{scale}.db')
+        generation = None
+        if regenerate or not os.path.exists(path):
+            generation = generate_database(path, **parameters)
+        completed = subprocess.run(
+            [sys.executable, 'benchmark_module.py', 'database', '--measure', path, '--repeats', str(repeats)],
+            capture_output=True, text=True, check=True, cwd=module_directory,
+        )
+        results[scale] = {
+            'parameters': parameters,
+            'generation': generation,
+            'database_mb': round(os.path.getsize(path) / 1024 ** 2, 1),
+            **json.loads(completed.stdout),
+        }
+    return results
+
+# The statistics of analytics_module as one SQL GROUP BY each, for comparison.
+ANALYTICS_SQL = {
+    'rating_distribution_by_decade': f'''SELECT movie_year / 10 * 10, MIN(CAST(movie_rating AS INTEGER), 9), COUNT(*), AVG(movie_rating)
+        FROM movies WHERE movie_rating IS NOT NULL AND movie_rating <> {dm.UNRATED_MOVIE_RATING} AND movie_year > 0 GROUP BY 1, 2''',
+    'top_rated_actors': f'''SELECT actor_id, actor_name, AVG(movie_rating), COUNT(*)
+        FROM played_in INNER JOIN movies USING (movie_id) INNER JOIN actors USING (actor_id)
+        WHERE movie_rating IS NOT NULL AND movie_rating <> {dm.UNRATED_MOVIE_RATING}
+        GROUP BY actor_id HAVING COUNT(*) >= ? ORDER BY AVG(movie_rating) DESC, actor_id LIMIT ?''',
+    'awards_by_year': 'SELECT award_year, COUNT(*) FROM awards GROUP BY award_year ORDER BY award_year',
+}
+
+def benchmark_analytics(scale='small', data_directory=None, repeats=5, min_movies=10):
+    '''
+        Exports the snapshot of a synthetic database (see benchmark_database) and times every statistic of
+        analytics_module against the same GROUP BY in SQLite. The top rated actors are also computed the way
+        a caller of database_module would today, with get_actor_rating_profile for every actor.
+        Returns:
+            dict: {'snapshot': {...}, statistic: {'snapshot', 'sqlite', ...}}
+    '''
+    import analytics_module
+
+    data_directory = data_directory if data_directory is not None else os.path.join(tempfile.gettempdir(), 'movies_benchmark')
+    os.makedirs(data_directory, exist_ok=True)
+    path = os.path.join(data_directory, f'{scale}.db')
+    if not os.path.exists(path):
+        generate_database(path, **SCALES[scale])
+    results = {}
+    with dm.open_database(path, readonly=True):
+        started = time.perf_counter()
+        export_snapshot()
+        export_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        snapshot = load_snapshot()
+        load_seconds = time.perf_counter() - started
+        results['snapshot'] = {
+            'export_seconds': round(export_seconds, 2),
+            'load_ms': round(1000 * load_seconds, 3),
+            'snapshot_mb': round(sum(entry.stat().st_size for entry in os.scandir(snapshot_path())) / 1024 ** 2, 1),
+            'database_mb': round(os.path.getsize(path) / 1024 ** 2, 1),
+        }
+        statistics_arguments = {
+            'rating_distribution_by_decade': ((snapshot, ), ()),
+            'top_rated_actors': ((snapshot, min_movies, 10), (min_movies, 10)),
+            'awards_by_year': ((snapshot, ), ()),
+        }
+        cursor = dm.get_connection().cursor()
+        for name, (snapshot_arguments, sql_arguments) in statistics_arguments.items():
+            statistic = getattr(analytics_module, name)
+            results[name] = {
+                'snapshot': _time_queries(statistic, [snapshot_arguments] * repeats),
+                'sqlite': _time_queries(lambda *arguments: cursor.execute(ANALYTICS_SQL[name], arguments).fetchall(), [sql_arguments] * repeats),
+            }
+        expected = [actor_id for actor_id, _, _, _ in cursor.execute(ANALYTICS_SQL['top_rated_actors'], (min_movies, 10)).fetchall()]
+        results['top_rated_actors']['same_actors'] = [actor_id for actor_id, _, _, _ in analytics_module.top_rated_actors(snapshot, min_movies, 10)] == expected
+        started = time.perf_counter()
+        for actor_id, _ in dm.get_all_actors(stream=True):
+            dm.get_actor_rating_profile(actor_id)
+        results['top_rated_actors']['per_actor_queries_ms'] = round(1000 * (time.perf_counter() - started), 3)
+        snapshot.close()
+    return results
+
+def _print_results(title, results):
+    print(f'{title}:')
+    for name, result in results.items():
+        print(f'\t{name}: {json.dumps(result)}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks that run entirely on localhost.')
+    parser.add_argument('--output', type=str, default=None, help='Also write the results as JSON to this file.')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    fetch_parser = subparsers.add_parser('fetch', help='Pages per second of the requests and selenium fetch backends against a local fixture server.')
+    fetch_parser.add_argument('--pages', type=int, default=500, help='Number of fixture pages to fetch.')
+    fetch_parser.add_argument('--concurrency', type=int, default=8, help='Parallel HTTP requests of the requests backend.')
+    fetch_parser.add_argument('--browser-workers', type=int, default=2, help='Parallel browsers of the selenium backend.')
+
+    parse_parser = subparsers.add_parser('parse', help='Parse time and allocations per page of the legacy parsers and extraction_module on fixture pages.')
+    parse_parser.add_argument('--filmography', type=int, default=2000, help='Credits on each fixture actor page.')
+    parse_parser.add_argument('--awards', type=int, default=200, help='Awards on each fixture awards page.')
+    parse_parser.add_argument('--movie-pages', type=int, default=50, help='Number of fixture movie pages.')
+    parse_parser.add_argument('--repeats', type=int, default=5, help='Timed passes over the pages.')
+
+    graph_parser = subparsers.add_parser('graph', help='Build, load and query times of the co-star graph on a synthetic played_in table.')
+    graph_parser.add_argument('--actors', type=int, default=200000, help='Number of synthetic actors.')
+    graph_parser.add_argument('--movies', type=int, default=100000, help='Number of synthetic movies.')
+    graph_parser.add_argument('--average-cast', type=int, default=20, help='Average number of actors per movie.')
+    graph_parser.add_argument('--queries', type=int, default=200, help='Number of timed top co-star and shortest path queries.')
+
+    server_parser = subparsers.add_parser('server', help='Lookup latency of CLI processes, thin client processes and keep-alive clients of the query server.')
+    server_parser.add_argument('--requests', type=int, default=500, help='Number of keep-alive requests.')
+    server_parser.add_argument('--processes', type=int, default=10, help='Number of timed process starts per mode.')
+    server_parser.add_argument('--workers', type=int, default=8, help='Worker threads of the server and concurrent clients.')
+
+    imports_parser = subparsers.add_parser('imports', help='Import time of every module in a fresh interpreter (python -X importtime).')
+    imports_parser.add_argument('--repeats', type=int, default=5, help='Runs per module, the median is reported.')
+
+    database_parser = subparsers.add_parser('database', help='Latency and memory of every database getter and CLI handler on synthetic databases of several scales.')
+    database_parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small', 'medium'], help='Scales to measure.')
+    database_parser.add_argument('--data-dir', type=str, default=None, help='Directory of the generated databases, they are reused by later runs.')
+    database_parser.add_argument('--regenerate', action='store_true', help='Generate the databases even if they exist.')
+    database_parser.add_argument('--repeats', type=int, default=100, help='Timed calls of every keyed getter and handler.')
+    database_parser.add_argument('--measure', type=str, default=None, help=argparse.SUPPRESS)
+
+    analytics_parser = subparsers.add_parser('analytics', help='Statistics of analytics_module on the columnar snapshot against the same GROUP BY in SQLite.')
+    analytics_parser.add_argument('--scale', choices=list(SCALES), default='small', help='Scale of the synthetic database.')
+    analytics_parser.add_argument('--data-dir', type=str, default=None, help='Directory of the generated databases, shared with the database benchmark.')
+    analytics_parser.add_argument('--repeats', type=int, default=5, help='Timed runs of every statistic.')
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'fetch':
+        results = benchmark_fetch(args.pages, args.concurrency, args.browser_workers)
+        _print_results('Fetch backends', results)
+    elif args.benchmark == 'parse':
+        results = benchmark_parse(args.filmography, args.awards, args.movie_pages, args.repeats)
+        _print_results('HTML parsing', results)
+    elif args.benchmark == 'graph':
+        results = benchmark_graph(args.actors, args.movies, args.average_cast, args.queries)
+        _print_results('Co-star graph', results)
+    elif args.benchmark == 'server':
+        dm.configure(readonly=True)
+        results = benchmark_server(args.requests, args.processes, args.workers)
+        _print_results('Query server', results)
+    elif args.benchmark == 'imports':
+        results = benchmark_imports(repeats=args.repeats)
+        _print_results('Imports', results)
+    elif args.benchmark == 'analytics':
+        results = benchmark_analytics(args.scale, args.data_dir, args.repeats)
+        _print_results(f'Analytics ({args.scale})', results)
+    elif args.benchmark == 'database' and args.measure is not None:
+        # Child process of benchmark_database, reports on stdout.
+        print(json.dumps(measure_database(args.measure, args.repeats)))
+        raise SystemExit(0)
+    elif args.benchmark == 'database':
+        results = benchmark_database(args.scales, args.data_dir, args.repeats, args.regenerate)
+        for scale, scale_results in results.items():
+            _print_results(f'Database {scale} ({json.dumps(scale_results["parameters"])}, {scale_results["database_mb"]} MB, peak RSS {scale_results["peak_rss_mb"]} MB)', {**scale_results['functions'], **scale_results['handlers']})
+        results = {'python': sys.version.split()[0], 'sqlite': sqlite3.sqlite_version, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'scales': results}
+
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            json.dump({args.benchmark: results}, output_file, indent=4)
@@ -0,0 +1,347 @@
+import array
+import collections
+import mmap
+import os
+import struct
+import tempfile
+from typing import NamedTuple
+
+import database_module as dm
+
+# The actor-movie graph of played_in as two CSR (compressed sparse row) adjacency lists:
+# movies_of(actor) = actor_movies[actor_offsets[actor_id]:actor_offsets[actor_id + 1]] and
+# actors_in(movie) = movie_actors[movie_offsets[movie_id]:movie_offsets[movie_id + 1]].
+# Ids index the offsets directly. The arrays are saved next to the database and memory-mapped,
+# so loading the graph does not depend on its size.
+# Changes of played_in after the build are read from played_in_log and override the arrays
+# for the actors and movies they touch, until update_graph folds them into a new file.
+# update_graph then prunes the log up to the last change in the file, so a graph that has
+# not seen those changes yet reloads the file instead of reading the log.
+
+GRAPH_FILE_SUFFIX = '.costars'
+_MAGIC = b'COSTAR01'
+# magic, schema_version, last_change_id and the lengths of the four arrays
+_HEADER = struct.Struct('<8sqqqqqq')
+_ITEM_SIZE = array.array('q').itemsize
+
+def graph_path(database_path=None):
+    '''
+        Returns:
+            str: path of the co-star graph file of the database
+    '''
+    return (database_path if database_path is not None else dm.database_path()) + GRAPH_FILE_SUFFIX
+
+def _build_csr(pairs):
+    '''
+        pairs: iterable of (key, value) sorted by key
+        Returns:
+            tuple: (offsets, targets) arrays where offsets[key] is the start of key's values
+    '''
+    offsets = array.array('q')
+    targets = array.array('q')
+    for key, value in pairs:
+        while len(offsets) <= key:
+            offsets.append(len(targets))
+        targets.append(value)
+    offsets.append(len(targets))
+    return offsets, targets
+
+def _merge_csr(offsets, targets, overrides):
+    '''
+        Copies the arrays with the adjacency of every key in overrides replaced.
+        Returns:
+            tuple: (offsets, targets)
+    '''
+    key_count = max(len(offsets) - 1, max(overrides, default=-1) + 1)
+    new_offsets = array.array('q', [0])
+    new_targets = array.array('q')
+    for key in range(key_count):
+        if key in overrides:
+            new_targets.extend(overrides[key])
+        elif key < len(offsets) - 1:
+            new_targets.frombytes(targets[offsets[key]:offsets[key + 1]].tobytes())
+        new_offsets.append(len(new_targets))
+    return new_offsets, new_targets
+
+class _GraphState(NamedTuple):
+    '''
+        Everything a query reads, replaced as a whole so a query never sees half of an update.
+    '''
+    actor_offsets: object
+    actor_movies: object
+    movie_offsets: object
+    movie_actors: object
+    schema_version: int
+    last_change_id: int
+    actor_overrides: dict
+    movie_overrides: dict
+    # mmap the arrays are views of, None for arrays in memory
+    graph_mmap: object = None
+
+    def movies_of(self, actor_id):
+        if actor_id in self.actor_overrides:
+            return self.actor_overrides[actor_id]
+        if 0 <= actor_id < len(self.actor_offsets) - 1:
+            return self.actor_movies[self.actor_offsets[actor_id]:self.actor_offsets[actor_id + 1]]
+        return ()
+
+    def actors_in(self, movie_id):
+        if movie_id in self.movie_overrides:
+            return self.movie_overrides[movie_id]
+        if 0 <= movie_id < len(self.movie_offsets) - 1:
+            return self.movie_actors[self.movie_offsets[movie_id]:self.movie_offsets[movie_id + 1]]
+        return ()
+
+    def top_costars(self, actor_id, limit=10):
+        '''
+            Returns:
+                list[tuple]: [(costar_id, shared_movie_count), ...] most shared movies first, ties by actor_id
+        '''
+        shared_movies = collections.Counter()
+        for movie_id in self.movies_of(actor_id):
+            shared_movies.update(self.actors_in(movie_id))
+        del shared_movies[actor_id]
+        costars = sorted(shared_movies.items(), key=lambda item: (-item[1], item[0]))
+        return costars if limit is None else costars[:limit]
+
+    def shortest_path(self, source_actor_id, target_actor_id):
+        '''
+            Bidirectional breadth-first search, always expanding the smaller frontier by one level.
+            Every movie is expanded at most once per direction.
+            Returns:
+                list[int] | None: [actor_id, movie_id, actor_id, ..., actor_id], None if the actors are not connected
+        '''
+        if source_actor_id == target_actor_id:
+            return [source_actor_id]
+        # actor_id -> (previous actor_id, movie_id) towards the source (index 0) or the target (index 1)
+        parents = ({source_actor_id: None}, {target_actor_id: None})
+        expanded_movies = (set(), set())
+        frontiers = [[source_actor_id], [target_actor_id]]
+        while len(frontiers[0]) > 0 and len(frontiers[1]) > 0:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            next_frontier = []
+            for actor_id in frontiers[side]:
+                for movie_id in self.movies_of(actor_id):
+                    if movie_id in expanded_movies[side]:
+                        continue
+                    expanded_movies[side].add(movie_id)
+                    for costar_id in self.actors_in(movie_id):
+                        if costar_id in parents[side]:
+                            continue
+                        parents[side][costar_id] = (actor_id, movie_id)
+                        if costar_id in parents[1 - side]:
+                            return self._join_paths(parents, costar_id)
+                        next_frontier.append(costar_id)
+            frontiers[side] = next_frontier
+        return None
+
+    def _join_paths(self, parents, meeting_actor_id):
+        path = [meeting_actor_id]
+        step = parents[0][meeting_actor_id]
+        while step is not None:
+            previous_actor_id, movie_id = step
+            path[:0] = [previous_actor_id, movie_id]
+            step = parents[0][previous_actor_id]
+        step = parents[1][meeting_actor_id]
+        while step is not None:
+            next_actor_id, movie_id = step
+            path += [movie_id, next_actor_id]
+            step = parents[1][next_actor_id]
+        return path
+
+class CoStarGraph:
+    '''
+        Actor-movie graph answering co-star and shortest path queries without touching the database.
+        Build it with build_graph / load_graph, not directly.
+        Queries may run in several threads while one of them applies changes: the state is never
+        modified, apply_changes swaps in a new one and each query reads the state once.
+    '''
+
+    def __init__(self, actor_offsets, actor_movies, movie_offsets, movie_actors, schema_version, last_change_id, graph_mmap=None):
+        self._state = _GraphState(actor_offsets, actor_movies, movie_offsets, movie_actors, schema_version, last_change_id, {}, {}, graph_mmap)
+        # file the graph was loaded from or saved to, None for a graph that only lives in memory
+        self.path = None
+
+    @property
+    def schema_version(self):
+        return self._state.schema_version
+
+    @property
+    def last_change_id(self):
+        return self._state.last_change_id
+
+    @property
+    def actor_overrides(self):
+        return self._state.actor_overrides
+
+    @property
+    def movie_overrides(self):
+        return self._state.movie_overrides
+
+    @property
+    def edge_count(self):
+        return len(self._state.actor_movies)
+
+    def movies_of(self, actor_id):
+        return self._state.movies_of(actor_id)
+
+    def actors_in(self, movie_id):
+        return self._state.actors_in(movie_id)
+
+    def apply_changes(self):
+        '''
+            Reads played_in changes logged since the build and overrides the touched actors and movies.
+            If the file was saved again in the meantime (update_graph, a rebuild), the log may lack
+            changes the graph has not seen, so the graph reloads the file and applies the rest of the log.
+            Concurrent calls must be serialized by the caller, queries need not be.
+            Returns:
+                int: number of overridden actors and movies
+        '''
+        state = self._state
+        last_change_id, actor_ids, movie_ids = dm.get_played_in_changes(state.last_change_id)
+        # Checked after reading the log: update_graph saves the file before it prunes.
+        header = _read_header(self.path) if self.path is not None else None
+        if header is not None and (header[0] != state.schema_version or header[1] > state.last_change_id):
+            self._reload()
+            return self.apply_changes()
+        if last_change_id == state.last_change_id:
+            return 0
+        actor_overrides = dict(state.actor_overrides)
+        actor_overrides.update((actor_id, tuple(movie_ids)) for actor_id, movie_ids in dm.get_movie_ids_of_actors(actor_ids).items())
+        movie_overrides = dict(state.movie_overrides)
+        movie_overrides.update((movie_id, tuple(actor_ids)) for movie_id, actor_ids in dm.get_actor_ids_of_movies(movie_ids).items())
+        self._state = state._replace(last_change_id=last_change_id, actor_overrides=actor_overrides, movie_overrides=movie_overrides)
+        return len(actor_ids) + len(movie_ids)
+
+    def _reload(self):
+        '''
+            Takes over the state of a freshly loaded graph. The old map is not closed, other threads
+            may still read it, it is unmapped once they drop their views.
+        '''
+        self._state = load_graph(self.path)._state
+
+    def snapshot(self):
+        '''
+            Returns:
+                _GraphState: current state, answers top_costars / shortest_path consistently however
+                the graph changes meanwhile
+        '''
+        return self._state
+
+    def top_costars(self, actor_id, limit=10):
+        return self._state.top_costars(actor_id, limit)
+
+    def shortest_path(self, source_actor_id, target_actor_id):
+        return self._state.shortest_path(source_actor_id, target_actor_id)
+
+    def save(self, path):
+        '''
+            Writes the graph with the overrides folded in, atomically replacing path.
+        '''
+        state = self._state
+        actor_offsets, actor_movies = state.actor_offsets, state.actor_movies
+        movie_offsets, movie_actors = state.movie_offsets, state.movie_actors
+        if len(state.actor_overrides) > 0 or len(state.movie_overrides) > 0:
+            actor_offsets, actor_movies = _merge_csr(actor_offsets, actor_movies, state.actor_overrides)
+            movie_offsets, movie_actors = _merge_csr(movie_offsets, movie_actors, state.movie_overrides)
+        arrays = [actor_offsets, actor_movies, movie_offsets, movie_actors]
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(file_descriptor, 'wb') as graph_file:
+            graph_file.write(_HEADER.pack(_MAGIC, state.schema_version, state.last_change_id, *(len(values) for values in arrays)))
+            for values in arrays:
+                graph_file.write(memoryview(values).cast('B'))
+        os.replace(temporary_path, path)
+
+    def close(self):
+        state = self._state
+        if state.graph_mmap is not None:
+            for values in state[:4]:
+                values.release()
+            state.graph_mmap.close()
+            self._state = state._replace(graph_mmap=None)
+
+def build_graph():
+    '''
+        Builds the graph from all played_in rows, read in index order.
+        Returns:
+            CoStarGraph: graph
+    '''
+    schema_version = dm.get_schema_version()
+    last_change_id, _, _ = dm.get_played_in_changes(0)
+    actor_offsets, actor_movies = _build_csr(dm.get_played_in_pairs('actor_id'))
+    movie_offsets, movie_actors = _build_csr(dm.get_played_in_pairs('movie_id'))
+    return CoStarGraph(actor_offsets, actor_movies, movie_offsets, movie_actors, schema_version, last_change_id)
+
+def _read_header(path):
+    '''
+        Returns:
+            tuple | None: (schema_version, last_change_id) of the saved graph, None if there is no graph file
+    '''
+    try:
+        with open(path, 'rb') as graph_file:
+            header = graph_file.read(_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < _HEADER.size:
+        return None
+    magic, schema_version, last_change_id, *_ = _HEADER.unpack(header)
+    return (schema_version, last_change_id) if magic == _MAGIC else None
+
+def _read_graph(path):
+    with open(path, 'rb') as graph_file:
+        graph_mmap = mmap.mmap(graph_file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, schema_version, last_change_id, *lengths = _HEADER.unpack_from(graph_mmap)
+    if magic != _MAGIC:
+        graph_mmap.close()
+        raise ValueError(f'{path} is not a co-star graph file')
+    arrays = []
+    offset = _HEADER.size
+    for length in lengths:
+        arrays.append(memoryview(graph_mmap)[offset:offset + length * _ITEM_SIZE].cast('q'))
+        offset += length * _ITEM_SIZE
+    graph = CoStarGraph(*arrays, schema_version, last_change_id, graph_mmap)
+    graph.path = path
+    return graph
+
+def load_graph(path=None):
+    '''
+        Maps the saved graph and patches in the played_in changes logged since it was saved.
+        A missing file, or one saved before the schema changed (e.g. a reset), is rebuilt and saved.
+        Returns:
+            CoStarGraph: graph, close() it when done
+    '''
+    path = path if path is not None else graph_path()
+    graph = _read_graph(path) if os.path.exists(path) else None
+    if graph is not None and graph.schema_version != dm.get_schema_version():
+        graph.close()
+        graph = None
+    if graph is None:
+        graph = build_graph()
+        try:
+            graph.save(path)
+            graph.path = path
+        except OSError:
+            # A read-only location still gets a usable in-memory graph.
+            pass
+        return graph
+    graph.apply_changes()
+    return graph
+
+def update_graph(path=None):
+    '''
+        Folds the logged played_in changes into the saved graph file and prunes the log.
+        Only the touched actors and movies are read from the database.
+        Returns:
+            int: number of actors and movies that changed since the last update
+    '''
+    path = path if path is not None else graph_path()
+    graph = load_graph(path)
+    try:
+        changed = len(graph.actor_overrides) + len(graph.movie_overrides)
+        if changed > 0:
+            graph.save(path)
+        # Only changes that are in the file are pruned, graphs that missed them reload it.
+        dm.prune_played_in_log(graph.last_change_id)
+    finally:
+        graph.close()
+    return changed
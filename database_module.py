@@ -1,208 +1,1394 @@
+import argparse
+import base64
+import binascii
+import contextlib
+import json
+import os
+import pathlib
 import sqlite3
+import threading
+import time
+import unicodedata
+from typing import NamedTuple, Optional
+
+from page_cache_module import canonical_url
 
 # DB SETUP
-conn = sqlite3.connect('movies.db')
-cursor = conn.cursor()
+DEFAULT_DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'movies.db')
+# Applied to every connection. WAL lets readers run next to the single writer,
+# synchronous NORMAL is durable in WAL mode without an fsync per commit.
+CONNECTION_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+BUSY_TIMEOUT_SECONDS = 30
+# Rows per fetchmany call of the streaming (stream=True) form of the list getters.
+FETCH_BATCH_SIZE = 500
+# Movies without a rating on IMDb are stored with this rating and left out of rating statistics.
+UNRATED_MOVIE_RATING = 0
 
-def insert_actor_into_actors_table(actor_name, actor_bio, actor_link):
-    sql = f'SELECT MAX(actor_id) FROM actors'
-    cursor.execute(sql)
-    result = cursor.fetchone()
-    if result[0] is None:
-        actor_id = 0
+_settings = {'path': os.environ.get('MOVIES_DB', DEFAULT_DATABASE_PATH), 'readonly': False}
+_thread_state = threading.local()
+_write_lock = threading.RLock()
+_migrated_paths = set()
+
+def configure(path=None, readonly=None):
+    '''
+        Selects the database file and whether this process only reads from it.
+        Connections that are already open in a thread are closed on their next use.
+    '''
+    if path is not None:
+        _settings['path'] = os.path.abspath(path)
+    if readonly is not None:
+        _settings['readonly'] = readonly
+
+def database_path():
+    '''
+        Returns:
+            str: path of the configured database file
+    '''
+    return _settings['path']
+
+def connect(path, readonly=False, check_same_thread=True):
+    '''
+        Opens a new tuned connection. Read-only connections use a mode=ro URI and never create the file.
+        check_same_thread: False for a connection that several threads use under their own lock
+        Returns:
+            sqlite3.Connection: connection in autocommit mode, writes go through transaction()
+    '''
+    if readonly:
+        connection = sqlite3.connect(f'{pathlib.Path(path).resolve().as_uri()}?mode=ro', uri=True, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=check_same_thread)
     else:
-        actor_id = result[0] + 1
-    sql = f'INSERT INTO actors (actor_id, actor_name, actor_bio, actor_link) VALUES (?, ?, ?, ?)'
-    cursor.execute(sql, (actor_id, actor_name, actor_bio, actor_link))
-    conn.commit()
-    return actor_id
+        connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=check_same_thread)
+        connection.execute('PRAGMA journal_mode = WAL')
+    for pragma_name, pragma_value in CONNECTION_PRAGMAS.items():
+        connection.execute(f'PRAGMA {pragma_name} = {pragma_value}')
+    return connection
+
+def get_connection():
+    '''
+        Every thread gets its own connection to the configured database, opened on first use.
+        The first connection to a path in this process upgrades its schema, so read-only
+        connections never see an outdated database.
+        Returns:
+            sqlite3.Connection: connection owned by the calling thread
+    '''
+    path, readonly = _settings['path'], _settings['readonly']
+    connection = getattr(_thread_state, 'connection', None)
+    if connection is not None and _thread_state.key == (path, readonly):
+        return connection
+    close()
+    if readonly and not os.path.exists(path):
+        raise FileNotFoundError(f'No database at {path}, set MOVIES_DB or pass the path to configure().')
+
+    if path not in _migrated_paths:
+        migration_connection = connect(path) if not readonly or _needs_migration(path) else None
+        if migration_connection is not None:
+            migrate_database(migration_connection)
+            migration_connection.close()
+        _migrated_paths.add(path)
+
+    _thread_state.connection = connect(path, readonly)
+    _thread_state.key = (path, readonly)
+    return _thread_state.connection
+
+def close():
+    '''
+        Closes the connection of the calling thread, the next call to get_connection reopens it.
+    '''
+    connection = getattr(_thread_state, 'connection', None)
+    if connection is not None:
+        connection.close()
+        _thread_state.connection = None
+
+@contextlib.contextmanager
+def open_database(path=None, readonly=None):
+    '''
+        Uses the given database for the block and closes the calling thread's connection afterwards,
+        the previous configuration is restored. Nothing is opened before the first query.
+        Yields:
+            str: path of the database file
+    '''
+    previous_settings = dict(_settings)
+    configure(path=path, readonly=readonly)
+    try:
+        yield database_path()
+    finally:
+        close()
+        _settings.update(previous_settings)
+
+@contextlib.contextmanager
+def transaction():
+    '''
+        Runs the block as one write transaction on the calling thread's connection.
+        Only one thread of the process writes at a time, nested blocks join the outermost transaction.
+        Yields:
+            sqlite3.Cursor: cursor inside the transaction
+    '''
+    connection = get_connection()
+    with _write_lock:
+        if connection.in_transaction:
+            yield connection.cursor()
+            return
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection.cursor()
+        except BaseException:
+            connection.rollback()
+            raise
+        connection.commit()
+
+@contextlib.contextmanager
+def read_transaction():
+    '''
+        Runs the reads of the block on one consistent state of the database, commits of other
+        connections in the meantime are not seen. Works on read-only connections and takes no write lock.
+        Yields:
+            sqlite3.Cursor: cursor inside the transaction
+    '''
+    connection = get_connection()
+    if connection.in_transaction:
+        yield connection.cursor()
+        return
+    connection.execute('BEGIN')
+    try:
+        yield connection.cursor()
+    finally:
+        connection.rollback()
+
+def normalize_actor_name(actor_name):
+    '''
+        Folds case, whitespace and accents, e.g. "  PENÉLOPE   cruz" -> "penelope cruz".
+        Returns:
+            str: normalized_name
+    '''
+    decomposed = unicodedata.normalize('NFKD', actor_name)
+    without_accents = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(without_accents.casefold().split())
+
+def _insert_many(sql, rows):
+    '''
+        Writes all rows with a single executemany inside one explicit transaction.
+        Rows may be any iterable (including generators) and ids are assigned by SQLite.
+        Returns:
+            list[int]: [row_id, ...] of the inserted rows in input order
+    '''
+    with transaction() as insert_cursor:
+        insert_cursor.executemany(sql, rows)
+        inserted = max(insert_cursor.rowcount, 0)
+        insert_cursor.execute('SELECT last_insert_rowid()')
+        last_id = insert_cursor.fetchone()[0]
+    # The write lock is held for the whole batch, so the ids are contiguous.
+    return list(range(last_id - inserted + 1, last_id + 1))
+
+def insert_actors(rows):
+    '''
+        rows: iterable of (actor_name, actor_bio, actor_link)
+        Returns:
+            list[int]: [actor_id, ...]
+    '''
+    sql = 'INSERT INTO actors (actor_name, actor_name_normalized, actor_bio, actor_link) VALUES (?, ?, ?, ?)'
+    rows = ((actor_name, normalize_actor_name(actor_name), actor_bio, actor_link) for actor_name, actor_bio, actor_link in rows)
+    return _insert_many(sql, rows)
+
+def insert_awards(rows):
+    '''
+        rows: iterable of (actor_id, award_name, award_category, award_year)
+        Returns:
+            list[int]: [awards_id, ...]
+    '''
+    sql = 'INSERT INTO awards (actor_id, award_name, award_category, award_year) VALUES (?, ?, ?, ?)'
+    return _insert_many(sql, rows)
+
+def insert_movies(rows):
+    '''
+        rows: iterable of (movie_name, movie_rating, movie_year, movie_genres, movie_url)
+        Returns:
+            list[int]: [movie_id, ...]
+    '''
+    sql = 'INSERT INTO movies (movie_name, movie_rating, movie_year, movie_genres, movie_url) VALUES (?, ?, ?, ?, ?)'
+    rows = list(rows)
+    with transaction() as cursor:
+        movie_ids = _insert_many(sql, rows)
+        _link_movie_genres(cursor, ((movie_id, movie_genres) for movie_id, (_, _, _, movie_genres, _) in zip(movie_ids, rows)))
+    return movie_ids
+
+def split_genres(movie_genres):
+    '''
+        Returns:
+            list[str]: genre names of a comma-joined movies.movie_genres value
+    '''
+    if movie_genres is None:
+        return []
+    return [genre_name.strip() for genre_name in movie_genres.split(',') if genre_name.strip() != '']
+
+def _link_movie_genres(cursor, movies):
+    '''
+        Adds unknown genres to the genres table and links each movie to its genres.
+        movies: iterable of (movie_id, movie_genres) with the comma-joined genres of movies.movie_genres
+    '''
+    links = [(movie_id, genre_name) for movie_id, movie_genres in movies for genre_name in split_genres(movie_genres)]
+    cursor.executemany('INSERT OR IGNORE INTO genres (genre_name) VALUES (?)', sorted({(genre_name, ) for _, genre_name in links}))
+    cursor.executemany('INSERT OR IGNORE INTO movie_genres (movie_id, genre_id) SELECT ?, genre_id FROM genres WHERE genre_name = ?', links)
+
+def insert_played_in(pairs):
+    '''
+        pairs: iterable of (actor_id, movie_id)
+    '''
+    sql = 'INSERT OR IGNORE INTO played_in (actor_id, movie_id) VALUES (?, ?)'
+    _insert_many(sql, pairs)
+
+def insert_staging(rows):
+    '''
+        rows: iterable of (actor_id, movie_name, movie_url)
+    '''
+    sql = 'INSERT OR IGNORE INTO actor_movie_staging (actor_id, movie_name, movie_url) VALUES (?, ?, ?)'
+    _insert_many(sql, rows)
+
+def insert_actor_into_actors_table(actor_name, actor_bio, actor_link):
+    return insert_actors([(actor_name, actor_bio, actor_link)])[0]
 
 def insert_award_into_awards_table(actor_id, award_name, award_category, award_year):
-    sql = f'SELECT MAX(awards_id) FROM awards'
-    cursor.execute(sql)
-    result = cursor.fetchone()
-    if result[0] is None:
-        awards_id = 0
-    else:
-        awards_id = result[0] + 1
-    sql = f'INSERT INTO awards (awards_id, actor_id, award_name, award_category, award_year) VALUES (?, ?, ?, ?, ?)'
-    cursor.execute(sql, (awards_id, actor_id, award_name, award_category, award_year))
-    conn.commit()
+    insert_awards([(actor_id, award_name, award_category, award_year)])
 
 def insert_movie_into_movies_table(movie_name, movie_rating, movie_year, movie_genres, movie_url):
-    sql = f'SELECT MAX(movie_id) FROM movies'
-    cursor.execute(sql)
-    result = cursor.fetchone()
-    if result[0] is None:
-        movie_id = 0
-    else:
-        movie_id = result[0] + 1
-    sql = f'INSERT INTO movies (movie_id, movie_name, movie_rating, movie_year, movie_genres, movie_url) VALUES (?, ?, ?, ?, ?, ?)'
-    cursor.execute(sql, (movie_id, movie_name, movie_rating, movie_year, movie_genres, movie_url))
-    conn.commit()
-    return movie_id
+    return insert_movies([(movie_name, movie_rating, movie_year, movie_genres, movie_url)])[0]
 
 def insert_entry_in_played_in_table(actor_id, movie_id):
-    sql = f'INSERT INTO played_in (actor_id, movie_id) VALUES (?, ?)'
-    cursor.execute(sql, (actor_id, movie_id))
-    conn.commit()
+    insert_played_in([(actor_id, movie_id)])
 
 def insert_into_actor_movie_staging_table(actor_id, movie_name, movie_url):
-    sql = f'INSERT INTO actor_movie_staging (actor_id, movie_name, movie_url) VALUES (?, ?, ?)'
-    cursor.execute(sql, (actor_id, movie_name, movie_url))
-    conn.commit()
+    insert_staging([(actor_id, movie_name, movie_url)])
 
-def get_all_actors():
-    sql = f'SELECT actor_id, actor_name FROM actors'
-    cursor.execute(sql)
-    result = cursor.fetchall()
-    conn.commit()
-    return result
+def encode_cursor(key):
+    '''
+        Turns the key of the last row of a page into the opaque cursor of the next page.
+        Returns:
+            str: cursor
+    '''
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii').rstrip('=')
 
-def get_all_movies():
-    sql = f'SELECT movie_id, movie_name, movie_url FROM movies'
-    cursor.execute(sql)
-    result = cursor.fetchall()
-    conn.commit()
-    return result
+def decode_cursor(cursor):
+    '''
+        Returns:
+            key of the row the cursor points after
+        Raises:
+            ValueError: if the cursor was not made by encode_cursor
+    '''
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+
+def _limit_parameter(limit):
+    '''
+        Returns:
+            int: value for SQLite's LIMIT, -1 (no limit) for None
+        Raises:
+            ValueError: for limits below 1, an empty page would have no cursor to continue from
+    '''
+    if limit is None:
+        return -1
+    if limit < 1:
+        raise ValueError(f'limit must be at least 1, not {limit}')
+    return limit
+
+def _iter_fetchmany(cursor, batch_size=FETCH_BATCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if len(rows) == 0:
+            return
+        yield from rows
+
+def _list_query(sql, parameters, key, limit=None, after=None, stream=False):
+    '''
+        Runs a list query as one keyset page: rows with key > the cursor, ordered by key, at most limit rows.
+        key is a unique column or a tuple of columns, whose values the cursor then holds as a list.
+        sql has to end in its WHERE clause, the key condition, ORDER BY and LIMIT are appended.
+        Returns:
+            list[tuple]: rows, or a generator that fetches them in FETCH_BATCH_SIZE batches if stream is set
+    '''
+    parameters = list(parameters)
+    key_columns = (key, ) if isinstance(key, str) else key
+    if after is not None:
+        after_key = decode_cursor(after)
+        after_key = [after_key] if isinstance(key, str) else after_key
+        if not isinstance(after_key, list) or len(after_key) != len(key_columns) or not all(isinstance(value, (int, float, str)) for value in after_key):
+            raise ValueError(f'Invalid cursor: {after!r}')
+        sql += f' AND ({", ".join(key_columns)}) > ({", ".join("?" for _ in key_columns)})'
+        parameters += after_key
+    sql += f' ORDER BY {", ".join(key_columns)} LIMIT ?'
+    parameters.append(_limit_parameter(limit))
+    cursor = get_connection().cursor()
+    cursor.execute(sql, parameters)
+    if stream:
+        return _iter_fetchmany(cursor)
+    return cursor.fetchall()
+
+def get_all_actors(limit=None, after=None, stream=False):
+    '''
+        Pages are keyed on actor_id: pass encode_cursor(actor_id of the last row) as after for the next page.
+        With stream=True the rows are yielded in fetchmany batches instead of returned as a list.
+        Returns:
+            list[tuple]: [(actor_id, actor_name), ...]
+    '''
+    sql = 'SELECT actor_id, actor_name FROM actors WHERE 1'
+    return _list_query(sql, (), 'actor_id', limit, after, stream)
+
+def find_actor_id(actor_name):
+    '''
+        Looks up an actor through the unique index on the normalized name.
+        Returns:
+            int | None: actor_id
+    '''
+    sql = 'SELECT actor_id FROM actors WHERE actor_name_normalized = ?'
+    cursor = get_connection().cursor()
+    cursor.execute(sql, (normalize_actor_name(actor_name), ))
+    result = cursor.fetchone()
+    return result[0] if result is not None else None
+
+def find_actor_ids(actor_names):
+    '''
+        Looks up many actors at once, one query per 500 distinct normalized names.
+        Returns:
+            dict: {actor_name: actor_id} for every given name that belongs to an actor
+    '''
+    names_by_normalized = {}
+    for actor_name in actor_names:
+        names_by_normalized.setdefault(normalize_actor_name(actor_name), []).append(actor_name)
+    normalized_names = list(names_by_normalized)
+    actor_ids = {}
+    cursor = get_connection().cursor()
+    for start in range(0, len(normalized_names), 500):
+        chunk = normalized_names[start:start + 500]
+        cursor.execute(f'SELECT actor_name_normalized, actor_id FROM actors WHERE actor_name_normalized IN ({", ".join("?" for _ in chunk)})', chunk)
+        for normalized_name, actor_id in cursor.fetchall():
+            actor_ids.update((actor_name, actor_id) for actor_name in names_by_normalized[normalized_name])
+    return actor_ids
+
+def find_actors_by_prefix(prefix, limit=None):
+    '''
+        Returns all actors whose normalized name starts with the normalized prefix,
+        e.g. "Robert D" matches "Robert De Niro" and "Robert Downey Jr.".
+        The range condition lets SQLite answer this with a search on the name index.
+        Returns:
+            list[tuple]: [(actor_id, actor_name), ...]
+    '''
+    lower_bound = normalize_actor_name(prefix)
+    upper_bound = lower_bound + '\U0010ffff'
+    sql = 'SELECT actor_id, actor_name FROM actors WHERE actor_name_normalized >= ? AND actor_name_normalized < ? ORDER BY actor_name_normalized LIMIT ?'
+    cursor = get_connection().cursor()
+    cursor.execute(sql, (lower_bound, upper_bound, _limit_parameter(limit)))
+    return cursor.fetchall()
+
+def get_all_movies(limit=None, after=None, stream=False):
+    '''
+        Pages are keyed on movie_id: pass encode_cursor(movie_id of the last row) as after for the next page.
+        With stream=True the rows are yielded in fetchmany batches instead of returned as a list.
+        Returns:
+            list[tuple]: [(movie_id, movie_name, movie_url), ...]
+    '''
+    sql = 'SELECT movie_id, movie_name, movie_url FROM movies WHERE 1'
+    return _list_query(sql, (), 'movie_id', limit, after, stream)
 
 def get_movie_id(movie_url):
     sql = f'SELECT movie_id FROM movies WHERE movie_url = ?'
+    cursor = get_connection().cursor()
     cursor.execute(sql, (movie_url, ))
     result = cursor.fetchone()
-    conn.commit()
     return result
 
 def get_actor_bio(actor_id):
     sql = f'SELECT actor_bio FROM actors WHERE actor_id = ?'
+    cursor = get_connection().cursor()
     cursor.execute(sql, (actor_id,))
     result = cursor.fetchone()
-    conn.commit()
     return result
 
-def get_actor_links():
-    sql = f'SELECT actor_id, actor_name, actor_link FROM actors'
-    cursor.execute(sql)
-    result = cursor.fetchall()
-    conn.commit()
-    return result
+def get_actor_links(limit=None, after=None, stream=False):
+    '''
+        Pages are keyed on actor_id: pass encode_cursor(actor_id of the last row) as after for the next page.
+        With stream=True the rows are yielded in fetchmany batches instead of returned as a list.
+        Returns:
+            list[tuple]: [(actor_id, actor_name, actor_link), ...]
+    '''
+    sql = 'SELECT actor_id, actor_name, actor_link FROM actors WHERE 1'
+    return _list_query(sql, (), 'actor_id', limit, after, stream)
 
-def get_actor_movies(actor_id):
-    sql = f'SELECT * FROM played_in INNER JOIN movies USING (movie_id) WHERE actor_id = ?'
-    cursor.execute(sql, (actor_id, ))
-    result = cursor.fetchall()
-    conn.commit()
-    return result
+def get_actor_movies(actor_id, limit=None, after=None, stream=False):
+    '''
+        Pages are keyed on movie_id: pass encode_cursor(movie_id of the last row) as after for the next page.
+        With stream=True the rows are yielded in fetchmany batches instead of returned as a list.
+        Returns:
+            list[tuple]: [(actor_id, movie_id, movie_name, movie_rating, movie_year, movie_genres, movie_url), ...]
+    '''
+    sql = 'SELECT * FROM played_in INNER JOIN movies USING (movie_id) WHERE actor_id = ?'
+    return _list_query(sql, (actor_id, ), 'movie_id', limit, after, stream)
+
+def get_actor_awards(actor_id, limit=None, after=None, stream=False):
+    '''
+        Pages are keyed on awards_id: pass encode_cursor(awards_id of the last row) as after for the next page.
+        With stream=True the rows are yielded in fetchmany batches instead of returned as a list.
+        Returns:
+            list[tuple]: [(awards_id, actor_id, award_name, award_category, award_year), ...]
+    '''
+    sql = 'SELECT * FROM awards WHERE actor_id = ?'
+    return _list_query(sql, (actor_id, ), 'awards_id', limit, after, stream)
+
+def get_actors_in_awards(limit=None, after=None, stream=False):
+    '''
+        Pages are keyed on actor_name: pass encode_cursor(actor_name of the last row) as after for the next page.
+        With stream=True the rows are yielded in fetchmany batches instead of returned as a list.
+        Returns:
+            list[tuple]: [(actor_name, ), ...]
+    '''
+    sql = 'SELECT DISTINCT actor_name FROM awards INNER JOIN actors USING(actor_id) WHERE 1'
+    return _list_query(sql, (), 'actor_name', limit, after, stream)
+
+def get_actors_in_actor_movie_staging(limit=None, after=None, stream=False):
+    '''
+        Pages are keyed on actor_name: pass encode_cursor(actor_name of the last row) as after for the next page.
+        With stream=True the rows are yielded in fetchmany batches instead of returned as a list.
+        Returns:
+            list[tuple]: [(actor_name, ), ...]
+    '''
+    sql = 'SELECT DISTINCT actor_name FROM actor_movie_staging INNER JOIN actors USING(actor_id) WHERE 1'
+    return _list_query(sql, (), 'actor_name', limit, after, stream)
+
+def get_actor_genres(actor_id, limit=None, after=None, stream=False):
+    '''
+        Pages are keyed on movie_id: pass encode_cursor(movie_id of the last row) as after for the next page.
+        With stream=True the rows are yielded in fetchmany batches instead of returned as a list.
+        Returns:
+            list[tuple]: [(movie_id, movie_genres), ...]
+    '''
+    sql = 'SELECT movie_id, movie_genres FROM movies INNER JOIN played_in USING (movie_id) WHERE actor_id = ?'
+    return _list_query(sql, (actor_id, ), 'movie_id', limit, after, stream)
 
-def get_actor_awards(actor_id):
-    sql = f'SELECT * FROM awards WHERE actor_id = ?'
+def get_actor_movies_average_rating(actor_id):
+    sql = f'SELECT AVG(movie_rating) FROM movies INNER JOIN played_in USING (movie_id) WHERE actor_id = ?'
+    cursor = get_connection().cursor()
     cursor.execute(sql, (actor_id, ))
-    result = cursor.fetchall()
-    conn.commit()
+    result = cursor.fetchone()
     return result
 
-def get_actors_in_awards():
-    sql = f'SELECT DISTINCT actor_name FROM awards INNER JOIN actors USING(actor_id)'
-    cursor.execute(sql)
+def _query_rating_profile(cursor, actor_id, limit=None):
+    sql = '''SELECT movie_year, AVG(movie_rating), MIN(movie_rating), MAX(movie_rating), COUNT(*),
+            SUM(SUM(movie_rating)) OVER () / SUM(COUNT(*)) OVER (), SUM(COUNT(*)) OVER ()
+        FROM movies INNER JOIN played_in USING (movie_id)
+        WHERE actor_id = ? AND movie_rating IS NOT NULL AND movie_rating <> ?
+        GROUP BY movie_year
+        ORDER BY movie_year IS NULL, movie_year
+        LIMIT ?'''
+    cursor.execute(sql, (actor_id, UNRATED_MOVIE_RATING, _limit_parameter(limit)))
     result = cursor.fetchall()
-    conn.commit()
-    return result
+    if len(result) == 0:
+        return None, 0, []
+    average_rating, rated_movie_count = result[0][5], result[0][6]
+    return average_rating, rated_movie_count, [row[:5] for row in result]
 
-def get_actors_in_actor_movie_staging():
-    sql = f'SELECT DISTINCT actor_name FROM actor_movie_staging INNER JOIN actors USING(actor_id)'
-    cursor.execute(sql)
+def get_actor_rating_profile(actor_id, limit=None):
+    '''
+        Ratings of the actor's rated movies, overall and per year, from one GROUP BY.
+        The overall values are window sums over all year groups, so they are not affected by limit.
+        Years are sorted ascending, movies without a year come last.
+        Returns:
+            tuple: (average_rating | None, rated_movie_count, [(movie_year, average_rating, min_rating, max_rating, movie_count), ...])
+    '''
+    return _query_rating_profile(get_connection().cursor(), actor_id, limit)
+
+def get_actor_genre_counts(actor_id, limit=None):
+    '''
+        Genres of the actor's movies, most frequent first. The average skips unrated movies.
+        Returns:
+            list[tuple]: [(genre_name, movie_count, average_rating | None), ...]
+    '''
+    sql = '''SELECT genre_name, COUNT(*), AVG(CASE WHEN movie_rating <> ? THEN movie_rating END)
+        FROM played_in INNER JOIN movie_genres USING (movie_id) INNER JOIN genres USING (genre_id) INNER JOIN movies USING (movie_id)
+        WHERE actor_id = ?
+        GROUP BY genre_id
+        ORDER BY COUNT(*) DESC, genre_name
+        LIMIT ?'''
+    cursor = get_connection().cursor()
+    cursor.execute(sql, (UNRATED_MOVIE_RATING, actor_id, _limit_parameter(limit)))
     result = cursor.fetchall()
-    conn.commit()
     return result
 
-def get_actor_genres(actor_id):
-    sql = f'SELECT movie_genres FROM movies INNER JOIN played_in USING (movie_id) WHERE actor_id = ?'
-    cursor.execute(sql, (actor_id, ))
+def get_genre_stats(limit=None):
+    '''
+        Genres across all movies, most frequent first. The average skips unrated movies.
+        Returns:
+            list[tuple]: [(genre_name, movie_count, average_rating | None), ...]
+    '''
+    sql = '''SELECT genre_name, COUNT(*), AVG(CASE WHEN movie_rating <> ? THEN movie_rating END)
+        FROM movie_genres INNER JOIN genres USING (genre_id) INNER JOIN movies USING (movie_id)
+        GROUP BY genre_id
+        ORDER BY COUNT(*) DESC, genre_name
+        LIMIT ?'''
+    cursor = get_connection().cursor()
+    cursor.execute(sql, (UNRATED_MOVIE_RATING, _limit_parameter(limit)))
     result = cursor.fetchall()
-    conn.commit()
     return result
 
-def get_actor_movies_average_rating(actor_id):
-    sql = f'SELECT AVG(movie_rating) FROM movies INNER JOIN played_in USING (movie_id) WHERE actor_id = ?'
+def get_movies(movie_ids):
+    '''
+        Returns:
+            list[tuple]: [(movie_id, movie_name, movie_rating, movie_year, movie_genres, movie_url), ...] in the order of movie_ids
+    '''
+    movie_ids = list(movie_ids)
+    sql = f'SELECT * FROM movies WHERE movie_id IN ({", ".join("?" for _ in movie_ids)})'
+    cursor = get_connection().cursor()
+    cursor.execute(sql, movie_ids)
+    movies = {row[0]: row for row in cursor.fetchall()}
+    return [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
+
+def get_actors(actor_ids):
+    '''
+        Returns:
+            list[tuple]: [(actor_id, actor_name), ...] in the order of actor_ids
+    '''
+    actor_ids = list(actor_ids)
+    sql = f'SELECT actor_id, actor_name FROM actors WHERE actor_id IN ({", ".join("?" for _ in actor_ids)})'
+    cursor = get_connection().cursor()
+    cursor.execute(sql, actor_ids)
+    actors = {row[0]: row for row in cursor.fetchall()}
+    return [actors[actor_id] for actor_id in actor_ids if actor_id in actors]
+
+class ActorStats(NamedTuple):
+    movie_count: int
+    rated_movie_count: int
+    average_rating: Optional[float]
+    top_movie_ids: list
+    rating_histogram: list
+    yearly_ratings: list
+    award_count: int
+    first_year: Optional[int]
+    last_year: Optional[int]
+
+def get_actor_stats(actor_id):
+    '''
+        Reads the materialized statistics of an actor with one primary key lookup.
+        top_movie_ids are the five best-rated movies, rating_histogram counts rated movies per
+        whole rating point (index 9 holds 9.0 to 10.0), yearly_ratings is the per-year part
+        of get_actor_rating_profile.
+        Returns:
+            ActorStats | None: None if the actor has no statistics yet
+    '''
+    sql = '''SELECT movie_count, rated_movie_count, average_rating, top_movie_ids, rating_histogram,
+            yearly_ratings, award_count, first_year, last_year
+        FROM actor_stats WHERE actor_id = ?'''
+    cursor = get_connection().cursor()
     cursor.execute(sql, (actor_id, ))
     result = cursor.fetchone()
-    conn.commit()
-    return result
+    if result is None:
+        return None
+    movie_count, rated_movie_count, average_rating, top_movie_ids, rating_histogram, yearly_ratings, award_count, first_year, last_year = result
+    return ActorStats(
+        movie_count, rated_movie_count, average_rating, json.loads(top_movie_ids), json.loads(rating_histogram),
+        [tuple(yearly_rating) for yearly_rating in json.loads(yearly_ratings)], award_count, first_year, last_year,
+    )
 
 def get_actor_top_five_movies(actor_id):
     sql = f'SELECT * FROM movies INNER JOIN played_in USING(movie_id) WHERE actor_id = ? ORDER BY movie_rating DESC LIMIT 5'
+    cursor = get_connection().cursor()
     cursor.execute(sql, (actor_id, ))
     result = cursor.fetchall()
-    conn.commit()
     return result
 
-def get_all_actor_movie_staging_table():
-    sql = f'SELECT * FROM actor_movie_staging'
-    cursor.execute(sql)
+def get_all_actor_movie_staging_table(limit=None, after=None, stream=False):
+    '''
+        Pages are keyed on the primary key: pass encode_cursor([movie_url, movie_name, actor_id] of the last row) as after for the next page.
+        With stream=True the rows are yielded in fetchmany batches instead of returned as a list.
+        Returns:
+            list[tuple]: [(actor_id, movie_name, movie_url), ...]
+    '''
+    sql = 'SELECT * FROM actor_movie_staging WHERE 1'
+    return _list_query(sql, (), ('movie_url', 'movie_name', 'actor_id'), limit, after, stream)
+
+def _fts_query(query):
+    '''
+        Quotes every word of a free-text query, so that FTS5 syntax characters (e.g. - : ") are searched
+        as text. All words have to match.
+    '''
+    words = query.split()
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in words)
+
+def search(query, limit=10):
+    '''
+        Full-text search over actor names, actor bios and movie names, best matches first.
+        Hits in actor names weigh more than hits in bios. snippet shows the matched words in [brackets].
+        Returns:
+            list[tuple]: [(kind, entity_id, name, snippet, score), ...] with kind 'actor' or 'movie', lower scores are better
+    '''
+    if query.strip() == '':
+        return []
+    sql = '''SELECT 'actor', rowid, actor_name, snippet(actors_fts, -1, '[', ']', '...', 12), bm25(actors_fts, 5.0, 1.0) AS score
+        FROM actors_fts WHERE actors_fts MATCH ?
+        UNION ALL
+        SELECT 'movie', rowid, movie_name, snippet(movies_fts, -1, '[', ']', '...', 12), bm25(movies_fts) AS score
+        FROM movies_fts WHERE movies_fts MATCH ?
+        ORDER BY score
+        LIMIT ?'''
+    match_query = _fts_query(query)
+    cursor = get_connection().cursor()
+    cursor.execute(sql, (match_query, match_query, _limit_parameter(limit)))
     result = cursor.fetchall()
-    conn.commit()
     return result
 
-def reset_database():
-    sql = '''DROP TABLE IF EXISTS "actors";'''
-    cursor.execute(sql)
-    sql = '''CREATE TABLE "actors" (
-        "actor_id"	INTEGER NOT NULL UNIQUE,
-        "actor_name"	TEXT NOT NULL,
-        "actor_bio"	TEXT,
-        "actor_link" TEXT,
-        PRIMARY KEY("actor_id")
-    );'''
+def pending_movie_urls():
+    '''
+        Distinct staged movies that are not in the movies table yet, found with an anti-join
+        on the movie_url index instead of comparing url lists in Python.
+        Returns:
+            list[tuple]: [(movie_name, movie_url), ...]
+    '''
+    sql = '''SELECT MIN(staging.movie_name), staging.movie_url FROM actor_movie_staging AS staging
+        WHERE NOT EXISTS (SELECT 1 FROM movies WHERE movies.movie_url = staging.movie_url)
+        GROUP BY staging.movie_url'''
+    cursor = get_connection().cursor()
     cursor.execute(sql)
+    result = cursor.fetchall()
+    return result
 
-    sql = '''DROP TABLE IF EXISTS "awards";'''
-    cursor.execute(sql)
-    sql = '''CREATE TABLE "awards" (
-        "awards_id" INTEGER NOT NULL UNIQUE,
-        "actor_id"	INTEGER NOT NULL,
-        "award_name"	TEXT NOT NULL,
-        "award_category"	TEXT,
-        "award_year"	INTEGER NOT NULL,
-        PRIMARY KEY("awards_id")
-    );'''
-    cursor.execute(sql)
+def materialize_played_in():
+    '''
+        Fills played_in from the staging table with one INSERT ... SELECT join, relations that
+        already exist and staged movies that were not scraped yet are skipped.
+        Returns:
+            int: number of inserted relations
+    '''
+    sql = '''INSERT OR IGNORE INTO played_in (actor_id, movie_id)
+        SELECT staging.actor_id, movies.movie_id FROM actor_movie_staging AS staging
+        INNER JOIN movies ON movies.movie_url = staging.movie_url'''
+    with transaction() as cursor:
+        cursor.execute(sql)
+        return cursor.rowcount
+
+def materialize_actor_played_in(actor_id):
+    '''
+        Rebuilds the played_in relations of one actor from its staged movies.
+    '''
+    with transaction() as cursor:
+        cursor.execute('DELETE FROM played_in WHERE actor_id = ?', (actor_id, ))
+        sql = '''INSERT OR IGNORE INTO played_in (actor_id, movie_id)
+            SELECT staging.actor_id, movies.movie_id FROM actor_movie_staging AS staging
+            INNER JOIN movies ON movies.movie_url = staging.movie_url
+            WHERE staging.actor_id = ?'''
+        cursor.execute(sql, (actor_id, ))
+
+def _compute_actor_stats(cursor, actor_id):
+    cursor.execute('''SELECT COUNT(*), MIN(movie_year), MAX(movie_year)
+        FROM played_in INNER JOIN movies USING (movie_id) WHERE actor_id = ?''', (actor_id, ))
+    movie_count, first_year, last_year = cursor.fetchone()
+    average_rating, rated_movie_count, yearly_ratings = _query_rating_profile(cursor, actor_id)
+    cursor.execute('''SELECT movie_id FROM played_in INNER JOIN movies USING (movie_id)
+        WHERE actor_id = ? ORDER BY movie_rating DESC, movie_id LIMIT 5''', (actor_id, ))
+    top_movie_ids = [movie_id for movie_id, in cursor.fetchall()]
+    cursor.execute('''SELECT MIN(CAST(movie_rating AS INTEGER), 9), COUNT(*)
+        FROM played_in INNER JOIN movies USING (movie_id)
+        WHERE actor_id = ? AND movie_rating IS NOT NULL AND movie_rating <> ?
+        GROUP BY 1''', (actor_id, UNRATED_MOVIE_RATING))
+    rating_histogram = [0] * 10
+    for bucket, bucket_count in cursor.fetchall():
+        rating_histogram[max(bucket, 0)] += bucket_count
+    cursor.execute('SELECT COUNT(*) FROM awards WHERE actor_id = ?', (actor_id, ))
+    award_count = cursor.fetchone()[0]
+    return (
+        actor_id, movie_count, rated_movie_count, average_rating, json.dumps(top_movie_ids), json.dumps(rating_histogram),
+        json.dumps(yearly_ratings), award_count, first_year, last_year,
+    )
 
-    sql = '''DROP TABLE IF EXISTS "movies";'''
+def _refresh_actor_stats(cursor):
+    cursor.execute('SELECT actor_id FROM actor_stats_stale')
+    actor_ids = [actor_id for actor_id, in cursor.fetchall()]
+    cursor.execute('DELETE FROM actor_stats WHERE actor_id IN (SELECT actor_id FROM actor_stats_stale)')
+    cursor.execute('SELECT actor_id FROM actors WHERE actor_id IN (SELECT actor_id FROM actor_stats_stale)')
+    rows = [_compute_actor_stats(cursor, actor_id) for actor_id, in cursor.fetchall()]
+    cursor.executemany('''INSERT INTO actor_stats (actor_id, movie_count, rated_movie_count, average_rating, top_movie_ids,
+            rating_histogram, yearly_ratings, award_count, first_year, last_year)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+    cursor.execute('DELETE FROM actor_stats_stale')
+    return len(actor_ids)
+
+def refresh_actor_stats():
+    '''
+        Recomputes the actor_stats rows of every actor whose movies, ratings or awards changed since
+        the last refresh. Triggers on actors, played_in, movies and awards collect those actors in actor_stats_stale.
+        Returns:
+            int: number of refreshed actors
+    '''
+    with transaction() as cursor:
+        return _refresh_actor_stats(cursor)
+
+def get_schema_version():
+    '''
+        Returns:
+            int: SQLite's schema cookie, it changes with every schema change including a reset
+    '''
+    cursor = get_connection().cursor()
+    cursor.execute('PRAGMA schema_version')
+    return cursor.fetchone()[0]
+
+def get_data_version():
+    '''
+        Only comparable between calls on the same connection, i.e. the same thread.
+        Returns:
+            int: SQLite's data version, it changes whenever another connection commits a write
+    '''
+    cursor = get_connection().cursor()
+    cursor.execute('PRAGMA data_version')
+    return cursor.fetchone()[0]
+
+def get_played_in_pairs(order_by='actor_id'):
+    '''
+        Streams all played_in relations in index order, for building the co-star graph.
+        Yields:
+            tuple: (actor_id, movie_id) ordered by actor_id, or (movie_id, actor_id) ordered by movie_id
+    '''
+    if order_by == 'actor_id':
+        sql = 'SELECT actor_id, movie_id FROM played_in ORDER BY actor_id, movie_id'
+    elif order_by == 'movie_id':
+        sql = 'SELECT movie_id, actor_id FROM played_in ORDER BY movie_id, actor_id'
+    else:
+        raise ValueError(f'Cannot order played_in by {order_by!r}')
+    cursor = get_connection().cursor()
     cursor.execute(sql)
-    sql = ''' CREATE TABLE "movies" (
+    return _iter_fetchmany(cursor)
+
+# Tables of the columnar analytics snapshot (snapshot_module), read in primary key order.
+SNAPSHOT_QUERIES = {
+    'actors': 'SELECT actor_id, actor_name FROM actors ORDER BY actor_id',
+    'movies': 'SELECT movie_id, movie_name, movie_rating, movie_year FROM movies ORDER BY movie_id',
+    'movie_genres': 'SELECT movie_id, genre_name FROM movie_genres INNER JOIN genres USING (genre_id) ORDER BY movie_id, genre_id',
+    'played_in': 'SELECT actor_id, movie_id FROM played_in ORDER BY actor_id, movie_id',
+    'awards': 'SELECT awards_id, actor_id, award_name, award_category, award_year FROM awards ORDER BY awards_id',
+}
+
+def get_snapshot_rows(table):
+    '''
+        Streams all rows of a snapshot table, see SNAPSHOT_QUERIES for the columns.
+        Yields:
+            tuple: row
+    '''
+    if table not in SNAPSHOT_QUERIES:
+        raise ValueError(f'No snapshot table {table!r}')
+    cursor = get_connection().cursor()
+    cursor.execute(SNAPSHOT_QUERIES[table])
+    return _iter_fetchmany(cursor)
+
+def get_played_in_changes(after_change_id=0):
+    '''
+        Returns:
+            tuple: (last_change_id, {actor_id, ...}, {movie_id, ...}) of the played_in changes logged after after_change_id
+    '''
+    cursor = get_connection().cursor()
+    cursor.execute('SELECT change_id, actor_id, movie_id FROM played_in_log WHERE change_id > ? ORDER BY change_id', (after_change_id, ))
+    last_change_id, actor_ids, movie_ids = after_change_id, set(), set()
+    for change_id, actor_id, movie_id in _iter_fetchmany(cursor):
+        last_change_id = change_id
+        actor_ids.add(actor_id)
+        movie_ids.add(movie_id)
+    return last_change_id, actor_ids, movie_ids
+
+def _get_played_in_neighbors(key, value, keys):
+    neighbors = {key_id: [] for key_id in keys}
+    keys = sorted(keys)
+    cursor = get_connection().cursor()
+    # Chunks stay below SQLite's limit on bound parameters.
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        cursor.execute(f'SELECT {key}, {value} FROM played_in WHERE {key} IN ({", ".join("?" for _ in chunk)}) ORDER BY {key}, {value}', chunk)
+        for key_id, value_id in cursor.fetchall():
+            neighbors[key_id].append(value_id)
+    return neighbors
+
+def get_movie_ids_of_actors(actor_ids):
+    '''
+        Returns:
+            dict: {actor_id: [movie_id, ...]} for every given actor, sorted by movie_id
+    '''
+    return _get_played_in_neighbors('actor_id', 'movie_id', actor_ids)
+
+def get_actor_ids_of_movies(movie_ids):
+    '''
+        Returns:
+            dict: {movie_id: [actor_id, ...]} for every given movie, sorted by actor_id
+    '''
+    return _get_played_in_neighbors('movie_id', 'actor_id', movie_ids)
+
+def prune_played_in_log(up_to_change_id):
+    '''
+        Drops the logged played_in changes that the saved co-star graph already contains.
+    '''
+    with transaction() as cursor:
+        cursor.execute('DELETE FROM played_in_log WHERE change_id <= ?', (up_to_change_id, ))
+
+def get_scrape_jobs(stage):
+    '''
+        Returns:
+            dict: {entity: (status, attempts, fetched_at)} for one stage
+    '''
+    sql = 'SELECT entity, status, attempts, fetched_at FROM scrape_jobs WHERE stage = ?'
+    cursor = get_connection().cursor()
+    cursor.execute(sql, (stage, ))
+    result = {entity: (status, attempts, fetched_at) for entity, status, attempts, fetched_at in cursor.fetchall()}
+    return result
+
+def complete_scrape_job(entity, stage):
+    '''
+        Checkpoints a finished stage. Called inside the transaction that wrote the stage's data,
+        so data and checkpoint are committed together. attempts counts consecutive failures,
+        so a success resets it.
+    '''
+    sql = '''INSERT INTO scrape_jobs (entity, stage, status, attempts, last_error, fetched_at) VALUES (?, ?, 'done', 0, NULL, ?)
+        ON CONFLICT (entity, stage) DO UPDATE SET status = 'done', attempts = 0, last_error = NULL, fetched_at = excluded.fetched_at'''
+    with transaction() as cursor:
+        cursor.execute(sql, (entity, stage, time.time()))
+
+def fail_scrape_job(entity, stage, error):
+    sql = '''INSERT INTO scrape_jobs (entity, stage, status, attempts, last_error) VALUES (?, ?, 'failed', 1, ?)
+        ON CONFLICT (entity, stage) DO UPDATE SET status = 'failed', attempts = attempts + 1, last_error = excluded.last_error'''
+    with transaction() as cursor:
+        cursor.execute(sql, (entity, stage, error))
+
+def save_actor_bio(actor_name, actor_bio, actor_link):
+    '''
+        Inserts a new actor or refreshes the bio of a known one, together with the 'bio' checkpoint.
+        Returns:
+            int: actor_id
+    '''
+    sql = '''INSERT INTO actors (actor_name, actor_name_normalized, actor_bio, actor_link) VALUES (?, ?, ?, ?)
+        ON CONFLICT (actor_name_normalized) DO UPDATE SET actor_bio = excluded.actor_bio'''
+    with transaction() as cursor:
+        cursor.execute(sql, (actor_name, normalize_actor_name(actor_name), actor_bio, actor_link))
+        cursor.execute('SELECT actor_id FROM actors WHERE actor_name_normalized = ?', (normalize_actor_name(actor_name), ))
+        actor_id = cursor.fetchone()[0]
+        complete_scrape_job(actor_link, 'bio')
+    return actor_id
+
+def save_actor_awards(actor_id, actor_link, awards):
+    '''
+        Replaces all awards of an actor and checkpoints the 'awards' stage in one transaction.
+        awards: iterable of (award_name, award_category, award_year)
+    '''
+    with transaction() as cursor:
+        cursor.execute('DELETE FROM awards WHERE actor_id = ?', (actor_id, ))
+        insert_awards((actor_id, award_name, award_category, award_year) for award_name, award_category, award_year in awards)
+        complete_scrape_job(actor_link, 'awards')
+
+def save_actor_movies(actor_id, actor_link, movies):
+    '''
+        Replaces the staged filmography of an actor and checkpoints the 'movies' stage in one transaction.
+        movies: iterable of (movie_name, movie_url)
+    '''
+    with transaction() as cursor:
+        cursor.execute('DELETE FROM actor_movie_staging WHERE actor_id = ?', (actor_id, ))
+        insert_staging((actor_id, movie_name, movie_url) for movie_name, movie_url in movies)
+        materialize_actor_played_in(actor_id)
+        complete_scrape_job(actor_link, 'movies')
+
+def save_movie(movie_name, movie_rating, movie_year, movie_genres, movie_url):
+    '''
+        Inserts a new movie or refreshes the metadata of a known url, together with its genre links
+        and the 'metadata' checkpoint.
+    '''
+    sql = '''INSERT INTO movies (movie_name, movie_rating, movie_year, movie_genres, movie_url) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (movie_url) DO UPDATE SET movie_rating = excluded.movie_rating, movie_year = excluded.movie_year, movie_genres = excluded.movie_genres'''
+    with transaction() as cursor:
+        cursor.execute(sql, (movie_name, movie_rating, movie_year, movie_genres, movie_url))
+        cursor.execute('SELECT movie_id FROM movies WHERE movie_url = ?', (movie_url, ))
+        movie_id = cursor.fetchone()[0]
+        cursor.execute('DELETE FROM movie_genres WHERE movie_id = ?', (movie_id, ))
+        _link_movie_genres(cursor, [(movie_id, movie_genres)])
+        complete_scrape_job(movie_url, 'metadata')
+
+def reset_database():
+    with transaction() as cursor:
+        sql = '''DROP TABLE IF EXISTS "actors";'''
+        cursor.execute(sql)
+        sql = '''CREATE TABLE "actors" (
+            "actor_id"	INTEGER NOT NULL UNIQUE,
+            "actor_name"	TEXT NOT NULL,
+            "actor_name_normalized"	TEXT NOT NULL,
+            "actor_bio"	TEXT,
+            "actor_link" TEXT,
+            PRIMARY KEY("actor_id")
+        );'''
+        cursor.execute(sql)
+        sql = '''CREATE UNIQUE INDEX "actors_name_normalized_idx" ON "actors" ("actor_name_normalized");'''
+        cursor.execute(sql)
+
+        sql = '''DROP TABLE IF EXISTS "awards";'''
+        cursor.execute(sql)
+        sql = '''CREATE TABLE "awards" (
+            "awards_id" INTEGER NOT NULL UNIQUE,
+            "actor_id"	INTEGER NOT NULL,
+            "award_name"	TEXT NOT NULL,
+            "award_category"	TEXT,
+            "award_year"	INTEGER NOT NULL,
+            PRIMARY KEY("awards_id")
+        );'''
+        cursor.execute(sql)
+
+        sql = '''DROP TABLE IF EXISTS "movies";'''
+        cursor.execute(sql)
+        sql = ''' CREATE TABLE "movies" (
+            "movie_id"	INTEGER NOT NULL UNIQUE,
+            "movie_name"	TEXT NOT NULL,
+            "movie_rating"	REAL,
+            "movie_year"	INTEGER,
+            "movie_genres"	TEXT,
+            "movie_url" TEXT,
+            PRIMARY KEY("movie_id")
+        );'''
+        cursor.execute(sql)
+
+        sql = '''DROP TABLE IF EXISTS "played_in";'''
+        cursor.execute(sql)
+        sql = ''' CREATE TABLE "played_in" (
+            "actor_id"	INTEGER NOT NULL,
+            "movie_id"	INTEGER NOT NULL,
+            PRIMARY KEY("actor_id","movie_id")
+        );'''
+        cursor.execute(sql)
+
+        sql = ''' DROP TABLE IF EXISTS "actor_movie_staging";'''
+        cursor.execute(sql)
+        sql = ''' CREATE TABLE "actor_movie_staging" (
+            "actor_id"	INTEGER NOT NULL,
+            "movie_name"	TEXT NOT NULL,
+            "movie_url"	TEXT NOT NULL,
+            PRIMARY KEY("actor_id","movie_name","movie_url")
+        );'''
+        cursor.execute(sql)
+
+        _create_secondary_indexes(cursor)
+        cursor.execute('DROP TABLE IF EXISTS "scrape_jobs"')
+        _create_scrape_jobs_table(cursor)
+        cursor.execute('DROP TABLE IF EXISTS "movie_genres"')
+        cursor.execute('DROP TABLE IF EXISTS "genres"')
+        _create_genre_tables(cursor)
+        cursor.execute('DROP TABLE IF EXISTS "actor_stats"')
+        cursor.execute('DROP TABLE IF EXISTS "actor_stats_stale"')
+        _create_actor_stats_tables(cursor)
+        cursor.execute('DROP TABLE IF EXISTS "actors_fts"')
+        cursor.execute('DROP TABLE IF EXISTS "movies_fts"')
+        _create_search_index(cursor)
+        cursor.execute('DROP TABLE IF EXISTS "played_in_log"')
+        _create_played_in_log(cursor)
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+def _add_normalized_actor_names(cursor):
+    '''
+        Version 1: normalized actor name column with a unique index for find_actor_id.
+    '''
+    cursor.connection.create_function('normalize_actor_name', 1, normalize_actor_name, deterministic=True)
+    cursor.execute('ALTER TABLE "actors" ADD COLUMN "actor_name_normalized" TEXT')
+    cursor.execute('UPDATE "actors" SET "actor_name_normalized" = normalize_actor_name("actor_name")')
+    cursor.execute('CREATE UNIQUE INDEX "actors_name_normalized_idx" ON "actors" ("actor_name_normalized")')
+
+def _add_secondary_indexes_and_typed_columns(cursor):
+    '''
+        Version 2: REAL ratings, INTEGER years and indexes on awards(actor_id),
+        movies(movie_url) and played_in(movie_id).
+        Movies that were stored twice under the same url are merged into the lowest movie_id first.
+    '''
+    cursor.execute('''CREATE TEMP TABLE "movie_duplicates" AS
+        SELECT movie_id, (SELECT MIN(kept.movie_id) FROM movies AS kept WHERE kept.movie_url = movies.movie_url) AS kept_movie_id
+        FROM movies WHERE movie_url IS NOT NULL''')
+    cursor.execute('DELETE FROM movie_duplicates WHERE movie_id = kept_movie_id')
+    cursor.execute('''UPDATE OR IGNORE played_in
+        SET movie_id = (SELECT kept_movie_id FROM movie_duplicates WHERE movie_duplicates.movie_id = played_in.movie_id)
+        WHERE movie_id IN (SELECT movie_id FROM movie_duplicates)''')
+    cursor.execute('DELETE FROM played_in WHERE movie_id IN (SELECT movie_id FROM movie_duplicates)')
+    cursor.execute('DELETE FROM movies WHERE movie_id IN (SELECT movie_id FROM movie_duplicates)')
+    cursor.execute('DROP TABLE movie_duplicates')
+
+    cursor.execute('''CREATE TABLE "movies_typed" (
         "movie_id"	INTEGER NOT NULL UNIQUE,
         "movie_name"	TEXT NOT NULL,
-        "movie_rating"	TEXT,
+        "movie_rating"	REAL,
         "movie_year"	INTEGER,
         "movie_genres"	TEXT,
         "movie_url" TEXT,
         PRIMARY KEY("movie_id")
-    );'''
-    cursor.execute(sql)
+    );''')
+    cursor.execute('''INSERT INTO movies_typed (movie_id, movie_name, movie_rating, movie_year, movie_genres, movie_url)
+        SELECT movie_id, movie_name, CAST(movie_rating AS REAL), CAST(movie_year AS INTEGER), movie_genres, movie_url FROM movies''')
+    cursor.execute('DROP TABLE movies')
+    cursor.execute('ALTER TABLE movies_typed RENAME TO movies')
+    _create_secondary_indexes(cursor)
 
-    sql = '''DROP TABLE IF EXISTS "played_in";'''
-    cursor.execute(sql)
-    sql = ''' CREATE TABLE "played_in" (
-        "actor_id"	INTEGER NOT NULL,
+def _create_secondary_indexes(cursor):
+    cursor.execute('CREATE INDEX IF NOT EXISTS "awards_actor_id_idx" ON "awards" ("actor_id")')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS "movies_movie_url_idx" ON "movies" ("movie_url")')
+    cursor.execute('CREATE INDEX IF NOT EXISTS "played_in_movie_id_idx" ON "played_in" ("movie_id")')
+
+def _create_scrape_jobs_table(cursor):
+    cursor.execute('''CREATE TABLE "scrape_jobs" (
+        "entity"	TEXT NOT NULL,
+        "stage"	TEXT NOT NULL,
+        "status"	TEXT NOT NULL,
+        "attempts"	INTEGER NOT NULL DEFAULT 0,
+        "last_error"	TEXT,
+        "fetched_at"	REAL,
+        PRIMARY KEY("entity","stage")
+    );''')
+    cursor.execute('CREATE INDEX "scrape_jobs_stage_idx" ON "scrape_jobs" ("stage", "status", "fetched_at")')
+
+def _add_scrape_jobs(cursor):
+    '''
+        Version 3: per (entity, stage) checkpoints of the scraper. Data scraped before is marked done
+        with an unknown fetched_at, so an incremental refresh picks it up first.
+    '''
+    _create_scrape_jobs_table(cursor)
+    cursor.execute('''INSERT OR IGNORE INTO scrape_jobs (entity, stage, status, attempts)
+        SELECT actor_link, 'bio', 'done', 1 FROM actors WHERE actor_link IS NOT NULL''')
+    cursor.execute('''INSERT OR IGNORE INTO scrape_jobs (entity, stage, status, attempts)
+        SELECT actor_link, 'awards', 'done', 1 FROM actors WHERE actor_link IS NOT NULL AND actor_id IN (SELECT actor_id FROM awards)''')
+    cursor.execute('''INSERT OR IGNORE INTO scrape_jobs (entity, stage, status, attempts)
+        SELECT actor_link, 'movies', 'done', 1 FROM actors WHERE actor_link IS NOT NULL AND actor_id IN (SELECT actor_id FROM actor_movie_staging)''')
+    cursor.execute('''INSERT OR IGNORE INTO scrape_jobs (entity, stage, status, attempts)
+        SELECT movie_url, 'metadata', 'done', 1 FROM movies WHERE movie_url IS NOT NULL''')
+
+def _create_genre_tables(cursor):
+    cursor.execute('''CREATE TABLE "genres" (
+        "genre_id"	INTEGER NOT NULL UNIQUE,
+        "genre_name"	TEXT NOT NULL,
+        PRIMARY KEY("genre_id")
+    );''')
+    cursor.execute('CREATE UNIQUE INDEX "genres_genre_name_idx" ON "genres" ("genre_name")')
+    cursor.execute('''CREATE TABLE "movie_genres" (
         "movie_id"	INTEGER NOT NULL,
-        PRIMARY KEY("actor_id","movie_id")
-    );'''
-    cursor.execute(sql)
+        "genre_id"	INTEGER NOT NULL,
+        PRIMARY KEY("movie_id","genre_id")
+    ) WITHOUT ROWID;''')
+    cursor.execute('CREATE INDEX "movie_genres_genre_id_idx" ON "movie_genres" ("genre_id")')
 
-    sql = ''' DROP TABLE IF EXISTS "actor_movie_staging";'''
-    cursor.execute(sql)
-    sql = ''' CREATE TABLE "actor_movie_staging" (
+def _add_genres(cursor):
+    '''
+        Version 4: genres and movie_genres tables, backfilled from the comma-joined movies.movie_genres.
+    '''
+    _create_genre_tables(cursor)
+    cursor.execute('SELECT movie_id, movie_genres FROM movies')
+    _link_movie_genres(cursor, cursor.fetchall())
+
+def _create_actor_stats_tables(cursor):
+    '''
+        actor_stats is derived data, actor_stats_stale lists the actors whose row has to be recomputed.
+        Migrations that rebuild actors, played_in, movies or awards have to recreate the triggers.
+    '''
+    cursor.execute('''CREATE TABLE "actor_stats" (
         "actor_id"	INTEGER NOT NULL,
-        "movie_name"	TEXT NOT NULL,
-        "movie_url"	TEXT NOT NULL,
-        PRIMARY KEY("actor_id","movie_name","movie_url")
-    );'''
-    cursor.execute(sql)
+        "movie_count"	INTEGER NOT NULL,
+        "rated_movie_count"	INTEGER NOT NULL,
+        "average_rating"	REAL,
+        "top_movie_ids"	TEXT NOT NULL,
+        "rating_histogram"	TEXT NOT NULL,
+        "yearly_ratings"	TEXT NOT NULL,
+        "award_count"	INTEGER NOT NULL,
+        "first_year"	INTEGER,
+        "last_year"	INTEGER,
+        PRIMARY KEY("actor_id")
+    );''')
+    cursor.execute('''CREATE TABLE "actor_stats_stale" (
+        "actor_id"	INTEGER NOT NULL,
+        PRIMARY KEY("actor_id")
+    ) WITHOUT ROWID;''')
+    cursor.execute('''CREATE TRIGGER "actors_stats_insert" AFTER INSERT ON "actors" BEGIN
+        INSERT OR IGNORE INTO actor_stats_stale (actor_id) VALUES (NEW.actor_id);
+    END''')
+    cursor.execute('''CREATE TRIGGER "actors_stats_delete" AFTER DELETE ON "actors" BEGIN
+        INSERT OR IGNORE INTO actor_stats_stale (actor_id) VALUES (OLD.actor_id);
+    END''')
+    for table in ('played_in', 'awards'):
+        cursor.execute(f'''CREATE TRIGGER "{table}_stats_insert" AFTER INSERT ON "{table}" BEGIN
+            INSERT OR IGNORE INTO actor_stats_stale (actor_id) VALUES (NEW.actor_id);
+        END''')
+        cursor.execute(f'''CREATE TRIGGER "{table}_stats_delete" AFTER DELETE ON "{table}" BEGIN
+            INSERT OR IGNORE INTO actor_stats_stale (actor_id) VALUES (OLD.actor_id);
+        END''')
+        cursor.execute(f'''CREATE TRIGGER "{table}_stats_update" AFTER UPDATE ON "{table}" BEGIN
+            INSERT OR IGNORE INTO actor_stats_stale (actor_id) VALUES (OLD.actor_id), (NEW.actor_id);
+        END''')
+    cursor.execute('''CREATE TRIGGER "movies_stats_update" AFTER UPDATE OF movie_rating, movie_year ON "movies"
+        WHEN OLD.movie_rating IS NOT NEW.movie_rating OR OLD.movie_year IS NOT NEW.movie_year BEGIN
+        INSERT OR IGNORE INTO actor_stats_stale (actor_id) SELECT actor_id FROM played_in WHERE movie_id = NEW.movie_id;
+    END''')
+
+def _add_actor_stats(cursor):
+    '''
+        Version 5: materialized per-actor statistics, computed for every actor.
+    '''
+    _create_actor_stats_tables(cursor)
+    cursor.execute('INSERT INTO actor_stats_stale (actor_id) SELECT actor_id FROM actors')
+    _refresh_actor_stats(cursor)
 
-    conn.commit()
+def _create_search_index(cursor):
+    '''
+        External content FTS5 tables over actors and movies, the triggers keep them in sync with every write.
+        Migrations that rebuild actors or movies have to recreate the triggers.
+    '''
+    cursor.execute('''CREATE VIRTUAL TABLE "actors_fts" USING fts5(
+        actor_name, actor_bio, content='actors', content_rowid='actor_id', tokenize='unicode61 remove_diacritics 2'
+    )''')
+    cursor.execute('''CREATE VIRTUAL TABLE "movies_fts" USING fts5(
+        movie_name, content='movies', content_rowid='movie_id', tokenize='unicode61 remove_diacritics 2'
+    )''')
+    cursor.execute('''CREATE TRIGGER "actors_fts_insert" AFTER INSERT ON "actors" BEGIN
+        INSERT INTO actors_fts (rowid, actor_name, actor_bio) VALUES (NEW.actor_id, NEW.actor_name, NEW.actor_bio);
+    END''')
+    cursor.execute('''CREATE TRIGGER "actors_fts_delete" AFTER DELETE ON "actors" BEGIN
+        INSERT INTO actors_fts (actors_fts, rowid, actor_name, actor_bio) VALUES ('delete', OLD.actor_id, OLD.actor_name, OLD.actor_bio);
+    END''')
+    cursor.execute('''CREATE TRIGGER "actors_fts_update" AFTER UPDATE OF actor_name, actor_bio ON "actors" BEGIN
+        INSERT INTO actors_fts (actors_fts, rowid, actor_name, actor_bio) VALUES ('delete', OLD.actor_id, OLD.actor_name, OLD.actor_bio);
+        INSERT INTO actors_fts (rowid, actor_name, actor_bio) VALUES (NEW.actor_id, NEW.actor_name, NEW.actor_bio);
+    END''')
+    cursor.execute('''CREATE TRIGGER "movies_fts_insert" AFTER INSERT ON "movies" BEGIN
+        INSERT INTO movies_fts (rowid, movie_name) VALUES (NEW.movie_id, NEW.movie_name);
+    END''')
+    cursor.execute('''CREATE TRIGGER "movies_fts_delete" AFTER DELETE ON "movies" BEGIN
+        INSERT INTO movies_fts (movies_fts, rowid, movie_name) VALUES ('delete', OLD.movie_id, OLD.movie_name);
+    END''')
+    cursor.execute('''CREATE TRIGGER "movies_fts_update" AFTER UPDATE OF movie_name ON "movies" BEGIN
+        INSERT INTO movies_fts (movies_fts, rowid, movie_name) VALUES ('delete', OLD.movie_id, OLD.movie_name);
+        INSERT INTO movies_fts (rowid, movie_name) VALUES (NEW.movie_id, NEW.movie_name);
+    END''')
+
+def _add_search_index(cursor):
+    '''
+        Version 6: full-text search over actor names, bios and movie names, built from the existing rows.
+    '''
+    _create_search_index(cursor)
+    cursor.execute("INSERT INTO actors_fts (actors_fts) VALUES ('rebuild')")
+    cursor.execute("INSERT INTO movies_fts (movies_fts) VALUES ('rebuild')")
+
+def _create_played_in_log(cursor):
+    '''
+        Every change of played_in is logged, so that the co-star graph can patch in what changed since it was built.
+        Migrations that rebuild played_in have to recreate the triggers.
+    '''
+    cursor.execute('''CREATE TABLE "played_in_log" (
+        "change_id"	INTEGER NOT NULL,
+        "actor_id"	INTEGER NOT NULL,
+        "movie_id"	INTEGER NOT NULL,
+        PRIMARY KEY("change_id" AUTOINCREMENT)
+    );''')
+    cursor.execute('''CREATE TRIGGER "played_in_log_insert" AFTER INSERT ON "played_in" BEGIN
+        INSERT INTO played_in_log (actor_id, movie_id) VALUES (NEW.actor_id, NEW.movie_id);
+    END''')
+    cursor.execute('''CREATE TRIGGER "played_in_log_delete" AFTER DELETE ON "played_in" BEGIN
+        INSERT INTO played_in_log (actor_id, movie_id) VALUES (OLD.actor_id, OLD.movie_id);
+    END''')
+    cursor.execute('''CREATE TRIGGER "played_in_log_update" AFTER UPDATE ON "played_in" BEGIN
+        INSERT INTO played_in_log (actor_id, movie_id) VALUES (OLD.actor_id, OLD.movie_id), (NEW.actor_id, NEW.movie_id);
+    END''')
+
+def _add_played_in_log(cursor):
+    '''
+        Version 7: change log of played_in for incremental co-star graph updates. The graph is built
+        from scratch the first time, so nothing is backfilled.
+    '''
+    _create_played_in_log(cursor)
+
+def _canonicalize_movie_urls(cursor):
+    '''
+        Version 8: movie urls stored before the scraper dropped tracking parameters are rewritten to
+        their canonical_url in movies, actor_movie_staging and the 'metadata' checkpoints.
+        Movies that turn out to share a url are merged into the lowest movie_id, which takes over
+        missing metadata, genres and played_in relations of the others. Staged movies that now match
+        a stored one are materialized, and the unique movie_url index holds the canonical urls from here on.
+    '''
+    cursor.connection.create_function('canonical_url', 1, canonical_url, deterministic=True)
+    cursor.execute('''CREATE TEMP TABLE "movie_duplicates" AS
+        SELECT movie_id, kept_movie_id FROM (
+            SELECT movie_id, MIN(movie_id) OVER (PARTITION BY canonical_url(movie_url)) AS kept_movie_id
+            FROM movies WHERE movie_url IS NOT NULL
+        ) WHERE movie_id != kept_movie_id''')
+    for column in ('movie_rating', 'movie_year', 'movie_genres'):
+        cursor.execute(f'''UPDATE movies SET {column} = (
+                SELECT duplicates.{column} FROM movies AS duplicates INNER JOIN movie_duplicates USING (movie_id)
+                WHERE movie_duplicates.kept_movie_id = movies.movie_id AND duplicates.{column} IS NOT NULL
+                ORDER BY duplicates.movie_id LIMIT 1
+            )
+            WHERE {column} IS NULL AND movie_id IN (SELECT kept_movie_id FROM movie_duplicates)''')
+    for table in ('played_in', 'movie_genres'):
+        cursor.execute(f'''UPDATE OR IGNORE {table}
+            SET movie_id = (SELECT kept_movie_id FROM movie_duplicates WHERE movie_duplicates.movie_id = {table}.movie_id)
+            WHERE movie_id IN (SELECT movie_id FROM movie_duplicates)''')
+        cursor.execute(f'DELETE FROM {table} WHERE movie_id IN (SELECT movie_id FROM movie_duplicates)')
+    cursor.execute('DELETE FROM movies WHERE movie_id IN (SELECT movie_id FROM movie_duplicates)')
+    cursor.execute('DROP TABLE movie_duplicates')
+    cursor.execute('UPDATE movies SET movie_url = canonical_url(movie_url) WHERE movie_url != canonical_url(movie_url)')
+
+    # Rows whose canonical form is already there are duplicates, the update skips and the delete drops them.
+    cursor.execute('UPDATE OR IGNORE actor_movie_staging SET movie_url = canonical_url(movie_url) WHERE movie_url != canonical_url(movie_url)')
+    cursor.execute('DELETE FROM actor_movie_staging WHERE movie_url != canonical_url(movie_url)')
+    cursor.execute('''UPDATE OR IGNORE scrape_jobs SET entity = canonical_url(entity)
+        WHERE stage = 'metadata' AND entity != canonical_url(entity)''')
+    cursor.execute("DELETE FROM scrape_jobs WHERE stage = 'metadata' AND entity != canonical_url(entity)")
+    cursor.execute('''INSERT OR IGNORE INTO played_in (actor_id, movie_id)
+        SELECT staging.actor_id, movies.movie_id FROM actor_movie_staging AS staging
+        INNER JOIN movies ON movies.movie_url = staging.movie_url''')
+    _create_secondary_indexes(cursor)
+    _refresh_actor_stats(cursor)
+
+def _reset_done_scrape_attempts(cursor):
+    '''
+        Version 9: attempts counts consecutive failures. Finished stages used to count their successful
+        runs as well, which let a single failure after enough refreshes exceed --max-attempts.
+    '''
+    cursor.execute("UPDATE scrape_jobs SET attempts = 0 WHERE status = 'done'")
+
+# Every entry upgrades the schema by one PRAGMA user_version. Append only, never reorder.
+MIGRATIONS = [
+    _add_normalized_actor_names,
+    _add_secondary_indexes_and_typed_columns,
+    _add_scrape_jobs,
+    _add_genres,
+    _add_actor_stats,
+    _add_search_index,
+    _add_played_in_log,
+    _canonicalize_movie_urls,
+    _reset_done_scrape_attempts,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def _needs_migration(path):
+    if not os.path.exists(path):
+        return False
+    connection = connect(path, readonly=True)
+    try:
+        current_version = connection.execute('PRAGMA user_version').fetchone()[0]
+        has_tables = connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'actors'").fetchone() is not None
+    finally:
+        connection.close()
+    return has_tables and current_version < SCHEMA_VERSION
+
+def migrate_database(connection=None):
+    '''
+        Upgrades an existing database in place to SCHEMA_VERSION. Each migration runs in its own
+        transaction together with the user_version bump, so an interrupted upgrade resumes cleanly.
+        The version is read again inside every write transaction, so processes that open an old
+        database at the same time apply each migration once and skip what another one applied.
+        Empty databases are left alone, reset_database creates the current schema directly.
+        Returns:
+            list[int]: [applied_version, ...] applied by this call
+    '''
+    connection = connection if connection is not None else get_connection()
+    cursor = connection.cursor()
+    cursor.execute('PRAGMA user_version')
+    current_version = cursor.fetchone()[0]
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'actors'")
+    if current_version >= SCHEMA_VERSION or cursor.fetchone() is None:
+        return []
+
+    applied_versions = []
+    while True:
+        with _write_lock:
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.execute('PRAGMA user_version')
+                current_version = cursor.fetchone()[0]
+                if current_version >= SCHEMA_VERSION:
+                    connection.rollback()
+                    break
+                MIGRATIONS[current_version](cursor)
+                cursor.execute(f'PRAGMA user_version = {current_version + 1}')
+            except BaseException:
+                connection.rollback()
+                raise
+            connection.commit()
+        applied_versions.append(current_version + 1)
+    if len(applied_versions) > 0:
+        cursor.execute('ANALYZE')
+    return applied_versions
+
+def _sample_query_arguments():
+    cursor = get_connection().cursor()
+    cursor.execute('SELECT MIN(actor_id) FROM actors')
+    actor_id = cursor.fetchone()[0]
+    cursor.execute('SELECT movie_url FROM movies ORDER BY movie_id LIMIT 1')
+    result = cursor.fetchone()
+    movie_url = result[0] if result is not None else ''
+    return actor_id, movie_url
+
+def explain_query_plans():
+    '''
+        Runs every keyed lookup with sample arguments, captures the statements it sends to SQLite
+        and asks SQLite how it plans them.
+        Returns:
+            dict: {function_name: [plan_detail, ...]}
+    '''
+    actor_id, movie_url = _sample_query_arguments()
+    keyed_queries = [
+        (find_actor_id, ('Robert De Niro', )),
+        (find_actor_ids, (['Robert De Niro', 'Al Pacino'], )),
+        (find_actors_by_prefix, ('Robert D', )),
+        (get_movie_id, (movie_url, )),
+        (get_actor_bio, (actor_id, )),
+        (get_actor_movies, (actor_id, )),
+        (get_actor_awards, (actor_id, )),
+        (get_actor_genres, (actor_id, )),
+        (get_actor_movies_average_rating, (actor_id, )),
+        (get_actor_rating_profile, (actor_id, )),
+        (get_actor_genre_counts, (actor_id, )),
+        (get_actor_top_five_movies, (actor_id, )),
+        (get_actor_stats, (actor_id, )),
+    ]
+    connection = get_connection()
+    cursor = connection.cursor()
+    query_plans = {}
+    for function, arguments in keyed_queries:
+        statements = []
+        connection.set_trace_callback(statements.append)
+        try:
+            function(*arguments)
+        finally:
+            connection.set_trace_callback(None)
+        statements = [statement for statement in statements if statement.lstrip().upper().startswith('SELECT')]
+        query_plans[function.__name__] = []
+        for statement in statements:
+            cursor.execute(f'EXPLAIN QUERY PLAN {statement}')
+            query_plans[function.__name__] += [detail for _, _, _, detail in cursor.fetchall()]
+    return query_plans
+
+def check_query_plans():
+    '''
+        Returns:
+            dict: {function_name: [plan_detail, ...]} for every keyed lookup that still scans a whole table
+    '''
+    return {
+        function_name: plan_details for function_name, plan_details in explain_query_plans().items()
+        # Scans of intermediate results, e.g. "SCAN (subquery-2)" for window functions, are fine.
+        if any(detail.startswith('SCAN ') and not detail.startswith('SCAN (') for detail in plan_details)
+    }
 
 if __name__ == '__main__':
-    reset_database()
+    parser = argparse.ArgumentParser(description='Create, upgrade or inspect the movies database.')
+    parser.add_argument('--database', type=str, default=None, help='Path of the SQLite database file (default: movies.db next to this module or $MOVIES_DB).')
+    parser.add_argument('--migrate', action='store_true', help='Upgrade the existing database in place instead of resetting it.')
+    parser.add_argument('--explain', action='store_true', help='Print the query plan of every keyed lookup and fail if one scans a whole table.')
+    args = parser.parse_args()
+    configure(path=args.database)
+
+    if args.explain:
+        query_plans = explain_query_plans()
+        for function_name, plan_details in query_plans.items():
+            print(f'{function_name}:')
+            for detail in plan_details:
+                print(f'\t{detail}')
+        full_scans = check_query_plans()
+        if len(full_scans) > 0:
+            raise SystemExit(f'Full table scans in: {", ".join(full_scans)}')
+    elif args.migrate:
+        connection = connect(_settings['path'])
+        print(f'Applied migrations: {migrate_database(connection)}')
+        connection.close()
+    else:
+        reset_database()
 
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    close()
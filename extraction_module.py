@@ -0,0 +1,295 @@
+import html
+import re
+from html.parser import HTMLParser
+from typing import NamedTuple, Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from page_cache_module import canonical_url
+
+# One pure function per IMDb page type: html in, typed records out.
+# Small pages are parsed into a tree of only the elements that are read (SoupStrainer).
+# The actor page, which is mostly filmography, is scanned by streaming parsers that build
+# no tree at all and stop as soon as they have what they need.
+# Elements are selected by attribute, nothing is re-serialized to be searched.
+# Text fields keep the markup escaping of the page (as decode_contents did), as stored so far.
+
+IMDB_BASE_URL = "https://www.imdb.com"
+
+class ActorListEntry(NamedTuple):
+    actor_name: str
+    actor_link: str
+
+class MovieCredit(NamedTuple):
+    movie_name: str
+    movie_url: str
+
+class MovieMetadata(NamedTuple):
+    movie_year: Optional[int]
+    movie_rating: float
+    movie_genres: list
+
+class Award(NamedTuple):
+    award_name: str
+    award_tag: str
+    award_category: str
+    award_year: int
+
+ACTOR_CREDIT_PATTERN = re.compile(r'^cred_act(or|ress)')
+AWARDS_HREF_PATTERN = re.compile(r'^/name/.*/awards/.*')
+RELEASE_INFO_HREF_PATTERN = re.compile(r'^/title/.*/releaseinfo/.*')
+
+ACTOR_LIST_STRAINER = SoupStrainer('a', class_='ipc-title-link-wrapper')
+AWARDS_STRAINER = SoupStrainer('li', attrs={'data-testid': 'list-item'})
+
+MOVIE_METADATA_TEST_IDS = {'hero-rating-bar__aggregate-rating__score', 'interests'}
+# elements without an end tag
+VOID_ELEMENTS = frozenset({'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'})
+
+def _is_movie_metadata_tag(name, attrs):
+    '''
+        Keeps the rating and the genres, the year is read by _TitleYearExtractor.
+    '''
+    return attrs.get('data-testid') in MOVIE_METADATA_TEST_IDS
+
+MOVIE_METADATA_STRAINER = SoupStrainer(_is_movie_metadata_tag)
+
+def _parse(html, strainer):
+    return BeautifulSoup(html, 'html.parser', parse_only=strainer)
+
+def extract_actor_list(list_html):
+    '''
+        Returns:
+            list[ActorListEntry]: [(actor_name, actor_link), ...]
+    '''
+    actors = []
+    for anchor in _parse(list_html, ACTOR_LIST_STRAINER).find_all('a'):
+        name_heading = anchor.find('h3', class_='ipc-title__text')
+        name = name_heading.get_text(strip=True) if name_heading else "Unknown Actor"
+        # Drop the list position, e.g. "1. "
+        name = ' '.join(name.split(' ')[1:])
+        if 'href' in anchor.attrs:
+            actors.append(ActorListEntry(name, f"{IMDB_BASE_URL}{anchor['href']}"))
+        else:
+            print(f"Skipping actor '{name}' because link is not found.")
+    return actors
+
+class _StreamingExtractor(HTMLParser):
+    '''
+        Base of the streaming extractors: the page is fed in chunks until the subclass sets done.
+    '''
+    CHUNK_SIZE = 16 * 1024
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.done = False
+
+    def run(self, page_html):
+        for offset in range(0, len(page_html), self.CHUNK_SIZE):
+            self.feed(page_html[offset:offset + self.CHUNK_SIZE])
+            if self.done:
+                return self
+        self.close()
+        return self
+
+def _has_class(attrs, class_name):
+    return class_name in (attrs.get('class') or '').split()
+
+class _BioExtractor(_StreamingExtractor):
+    '''
+        Collects the text nodes of the first bio div, like get_text(strip=True).
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.div_depth = 0
+        self.texts = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if self.texts is None:
+            if tag != 'div' or not _has_class(dict(attrs), 'ipc-html-content-inner-div'):
+                return
+            self.texts = ['']
+        # A tag ends the current text node, a chunk boundary does not.
+        self.texts.append('')
+        if tag == 'div':
+            self.div_depth += 1
+
+    def handle_endtag(self, tag):
+        if self.texts is None or self.done:
+            return
+        self.texts.append('')
+        if tag == 'div':
+            self.div_depth -= 1
+            self.done = self.div_depth == 0
+
+    def handle_data(self, data):
+        if self.texts is not None and not self.done:
+            self.texts[-1] += data
+
+def extract_actor_bio(actor_html):
+    '''
+        Returns:
+            str: actor_bio
+    '''
+    bio = _BioExtractor().run(actor_html)
+    if bio.texts is None:
+        return "Biography not available."
+    return ''.join(text.strip() for text in bio.texts)
+
+class _AwardUrlExtractor(_StreamingExtractor):
+
+    def __init__(self):
+        super().__init__()
+        self.href = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a' and not self.done:
+            href = dict(attrs).get('href') or ''
+            if AWARDS_HREF_PATTERN.match(href):
+                self.href = href
+                self.done = True
+
+def extract_award_url(actor_html):
+    '''
+        Returns:
+            str: url of the actor's awards page
+    '''
+    award_href = _AwardUrlExtractor().run(actor_html).href
+    if award_href is None:
+        raise LookupError('The actor page has no awards link.')
+    return f"{IMDB_BASE_URL}{award_href}"
+
+class _FilmographyExtractor(_StreamingExtractor):
+    '''
+        Collects the title anchor of every filmography list item that carries an acting
+        credit (data-testid="cred_actor..." or "cred_actress...") on itself or a descendant.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.movies = []
+        self.li_depth = 0
+        self.is_actor_credit = False
+        self.title_href = None
+        self.title_texts = None
+        self.in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if self.li_depth == 0:
+            if tag != 'li' or not _has_class(attrs, 'ipc-metadata-list-summary-item'):
+                return
+            self.is_actor_credit = False
+            self.title_href = None
+            self.title_texts = None
+        if tag == 'li':
+            self.li_depth += 1
+        if ACTOR_CREDIT_PATTERN.match(attrs.get('data-testid') or ''):
+            self.is_actor_credit = True
+        if tag == 'a' and self.title_href is None and _has_class(attrs, 'ipc-metadata-list-summary-item__t'):
+            self.title_href = attrs.get('href') or ''
+            self.title_texts = []
+            self.in_title = True
+
+    def handle_endtag(self, tag):
+        if self.li_depth == 0:
+            return
+        if tag == 'a' and self.in_title:
+            self.in_title = False
+        elif tag == 'li':
+            self.li_depth -= 1
+            if self.li_depth == 0 and self.is_actor_credit and self.title_href is not None:
+                # Without the per-actor ref_ parameter a movie shared by several actors is staged under one url.
+                self.movies.append(MovieCredit(
+                    html.escape(''.join(self.title_texts), quote=False),
+                    canonical_url(f"{IMDB_BASE_URL}{self.title_href}"),
+                ))
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title_texts.append(data)
+
+def extract_actor_movies(actor_html):
+    '''
+        Expects the actor page with the filmography already expanded.
+        Only acting credits are returned, other credits (producer, writer, ...) share the list markup.
+        Returns:
+            list[MovieCredit]: [(movie_name, movie_url), ...]
+    '''
+    return _FilmographyExtractor().run(actor_html).movies
+
+class _TitleYearExtractor(_StreamingExtractor):
+    '''
+        Collects the text of the first release info link in the title block: the hero title h1 and
+        the elements after it up to the end of the h1's parent, the element the legacy parser searched.
+        depth counts the elements opened since the h1, it drops below 0 when the parent ends.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.depth = None
+        self.year_texts = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done or tag in VOID_ELEMENTS:
+            return
+        attrs = dict(attrs)
+        if self.depth is None:
+            if tag != 'h1' or attrs.get('data-testid') != 'hero__pageTitle':
+                return
+            self.depth = 0
+        self.depth += 1
+        if tag == 'a' and self.year_texts is None and RELEASE_INFO_HREF_PATTERN.match(attrs.get('href') or ''):
+            self.year_texts = []
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing tags open nothing.
+        pass
+
+    def handle_endtag(self, tag):
+        if self.depth is None or self.done or tag in VOID_ELEMENTS:
+            return
+        self.depth -= 1
+        self.done = self.depth < 0 or (tag == 'a' and self.year_texts is not None)
+
+    def handle_data(self, data):
+        if self.year_texts is not None and not self.done:
+            self.year_texts.append(data)
+
+def extract_movie_metadata(movie_html):
+    '''
+        Returns:
+            MovieMetadata: (movie_year, movie_rating, [movie_genre, ...]), movie_rating is 0.0 for unrated movies
+    '''
+    movie_soup = _parse(movie_html, MOVIE_METADATA_STRAINER)
+
+    genres_div = movie_soup.find('div', attrs={'data-testid': 'interests'})
+    movie_genres = [anchor.find('span').decode_contents() for anchor in genres_div.find_all('a')] if genres_div is not None else []
+
+    year_texts = _TitleYearExtractor().run(movie_html).year_texts
+    year_text = ''.join(year_texts)[:4] if year_texts is not None else ''
+    movie_year = int(year_text) if year_text.isdigit() else None
+
+    rating_div = movie_soup.find('div', attrs={'data-testid': 'hero-rating-bar__aggregate-rating__score'})
+    rating_span = rating_div.find('span') if rating_div is not None else None
+    movie_rating = float(rating_span.get_text()) if rating_span is not None else 0.0
+
+    return MovieMetadata(movie_year, movie_rating, movie_genres)
+
+def extract_actor_awards(award_html):
+    '''
+        Returns:
+            list[Award]: [(award_name, award_tag, award_category, award_year), ...]
+    '''
+    awards = []
+    for award_li in _parse(award_html, AWARDS_STRAINER).find_all('li', attrs={'data-testid': 'list-item'}):
+        award_anchor = award_li.find('a', class_='ipc-metadata-list-summary-item__t')
+        # The anchor starts with "<year> <tag>" followed by the award name in a span.
+        award_year, award_tag = award_anchor.find(string=True, recursive=False).split(' ')[:2]
+        award_name = award_anchor.find('span').decode_contents()
+        award_category = award_li.find('span', class_='awardCategoryName')
+        awards.append(Award(award_name, award_tag, award_category.decode_contents() if award_category is not None else "No Category", int(award_year)))
+    return awards
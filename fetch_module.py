@@ -0,0 +1,110 @@
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scrape_metrics_module import record_sleep, timed
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+def create_driver(page_load_timeout=5):
+    '''
+        Starts a headless Chrome configured like every scraping worker.
+        Returns:
+            webdriver.Chrome: driver
+    '''
+    # selenium.webdriver imports the drivers of every browser, only processes that start one pay for it.
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument(f"user-agent={USER_AGENT}")
+    driver = webdriver.Chrome(options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+class HostRateLimiter:
+    '''
+        Spaces out requests to the same host so that at most requests_per_second start per second.
+        None disables the limit.
+    '''
+
+    def __init__(self, requests_per_second=None):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        if self.interval == 0.0:
+            return
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+            record_sleep('rate_limit', slot - now)
+
+class RequestsFetcher:
+    '''
+        Fetches static pages over one pooled keep-alive requests.Session.
+        The session is shared by all worker threads, concurrency sizes its connection pool.
+    '''
+
+    def __init__(self, concurrency=8, rate_limiter=None, timeout=10):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter if rate_limiter is not None else HostRateLimiter()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'User-Agent': USER_AGENT, 'Accept-Language': 'en-US,en;q=0.9'})
+
+    def fetch(self, url, interact=None):
+        '''
+            Returns:
+                str: html of the page
+        '''
+        if interact is not None:
+            raise ValueError(f'{url} needs JS interaction, fetch it with a SeleniumFetcher.')
+        self.rate_limiter.wait(url)
+        with timed('fetch'):
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            return response.text
+
+    def close(self):
+        self.session.close()
+
+class SeleniumFetcher:
+    '''
+        Fetches pages through a WebDriver. Only needed for pages that require JS interaction,
+        callers reach the driver through the driver attribute for that.
+        Workers that each own a driver share one rate_limiter to keep the per-host limit global.
+    '''
+
+    def __init__(self, driver, rate_limiter=None):
+        self.driver = driver
+        self.rate_limiter = rate_limiter if rate_limiter is not None else HostRateLimiter()
+
+    def fetch(self, url, interact=None):
+        '''
+            interact: optional function(driver) run after the page load, e.g. to expand lists.
+            Returns:
+                str: html of the rendered page
+        '''
+        self.rate_limiter.wait(url)
+        with timed('fetch'):
+            self.driver.get(url)
+        with timed('render'):
+            if interact is not None:
+                interact(self.driver)
+            return self.driver.page_source
+
+    def close(self):
+        self.driver.quit()
@@ -0,0 +1,140 @@
+import argparse
+import contextlib
+import functools
+import html
+import http.server
+import os
+import random
+import threading
+
+# Offline stand-in for imdb.com: writes IMDb-like pages that carry the same markup the
+# scrapers select on and serves them from a local static HTTP server.
+
+LIST_PATH = '/list/ls053501318/'
+GENRES = ['Drama', 'Comedy', 'Crime', 'Thriller', 'Action', 'Romance', 'Biography', 'Adventure', 'Fantasy', 'Music']
+
+def _write_page(directory, url_path, body):
+    page_directory = os.path.join(directory, *url_path.strip('/').split('/'))
+    os.makedirs(page_directory, exist_ok=True)
+    with open(os.path.join(page_directory, 'index.html'), 'w', encoding='utf-8') as page_file:
+        page_file.write(f'<!DOCTYPE html>\n<html><head><title>IMDb</title></head><body>\n{body}\n</body></html>\n')
+
+def _list_page(actors):
+    items = '\n'.join(
+        f'<li class="ipc-metadata-list-summary-item"><a class="ipc-title-link-wrapper" href="{actor_path}?ref_=ls_t_{index + 1}">'
+        f'<h3 class="ipc-title__text">{index + 1}. {html.escape(actor_name)}</h3></a></li>'
+        for index, (actor_name, actor_path, _) in enumerate(actors)
+    )
+    return f'<button data-testid="accept-button">Accept</button>\n<ul class="ipc-metadata-list">\n{items}\n</ul>'
+
+def _actor_page(actor_name, actor_path, movies, rng):
+    credits = []
+    for index, (movie_name, movie_path) in enumerate(movies):
+        credits.append(
+            f'<li class="ipc-metadata-list-summary-item"><div class="ipc-metadata-list-summary-item__tc">'
+            f'<a class="ipc-metadata-list-summary-item__t" href="{movie_path}?ref_=nm_flmg_job_1_cdt_t_{index + 1}">{html.escape(movie_name)}</a>'
+            f'<ul class="ipc-inline-list"><li data-testid="cred_actor_{index}"><span>{rng.randint(1950, 2024)}</span></li></ul>'
+            f'</div></li>'
+        )
+    # Other credits (e.g. producer) share the list markup but must not be picked up.
+    credits.append(
+        '<li class="ipc-metadata-list-summary-item"><div class="ipc-metadata-list-summary-item__tc">'
+        '<a class="ipc-metadata-list-summary-item__t" href="/title/tt9999999/?ref_=nm_flmg_job_2">Produced Title</a>'
+        '<ul class="ipc-inline-list"><li data-testid="cred_producer_0"><span>2001</span></li></ul></div></li>'
+    )
+    bio = ' '.join(f'{actor_name} appeared in {movie_name}.' for movie_name, _ in movies[:20])
+    return (
+        f'<h1 data-testid="hero__pageTitle"><span>{html.escape(actor_name)}</span></h1>\n'
+        f'<section data-testid="overview"><div class="ipc-html-content ipc-html-content--base">'
+        f'<div class="ipc-html-content-inner-div">{html.escape(bio)}</div></div></section>\n'
+        f'<a href="{actor_path}awards/?ref_=nm_awd">Awards</a>\n'
+        f'<div id="actor-previous-projects" class="ipc-accordion__item"><ul class="ipc-metadata-list">\n'
+        + '\n'.join(credits) +
+        '\n</ul></div>'
+    )
+
+def _awards_page(awards):
+    items = '\n'.join(
+        f'<li data-testid="list-item" class="ipc-metadata-list-summary-item"><div class="ipc-metadata-list-summary-item__tc">'
+        f'<a class="ipc-metadata-list-summary-item__t" href="/event/ev0000003/{award_year}/1">{award_year} {award_tag}<span class="ipc-metadata-list-summary-item__tst"> {html.escape(award_name)}</span></a>'
+        f'<ul class="ipc-inline-list"><li><span class="ipc-metadata-list-summary-item__li awardCategoryName">{html.escape(award_category)}</span></li></ul>'
+        f'</div></li>'
+        for award_name, award_tag, award_category, award_year in awards
+    )
+    return f'<ul class="ipc-metadata-list">\n{items}\n</ul>'
+
+def _movie_page(movie_name, movie_path, movie_year, movie_rating, movie_genres):
+    genre_anchors = ''.join(f'<a class="ipc-chip" href="/interest/in{index}/"><span class="ipc-chip__text">{genre}</span></a>' for index, genre in enumerate(movie_genres))
+    rating = (
+        f'<div data-testid="hero-rating-bar__aggregate-rating__score"><span class="sc-rating">{movie_rating}</span><span>/10</span></div>'
+        if movie_rating is not None else ''
+    )
+    return (
+        f'<div class="sc-hero"><h1 data-testid="hero__pageTitle"><span class="hero__primary-text">{html.escape(movie_name)}</span></h1>'
+        f'<ul class="ipc-inline-list"><li><a href="{movie_path}releaseinfo/?ref_=tt_ov_rdat">{movie_year}</a></li><li>2h 10m</li></ul></div>\n'
+        f'{rating}\n'
+        f'<div data-testid="interests" class="ipc-chip-list">{genre_anchors}</div>'
+    )
+
+def write_fixture_site(directory, actor_count=10, movie_count=200, movies_per_actor=40, awards_per_actor=8, seed=0):
+    '''
+        Writes a deterministic IMDb-like site: one actor list, an actor page and an awards page
+        per actor and one page per movie. Movies are shared between actors like real filmographies.
+        Returns:
+            str: url path of the actor list, relative to the served directory
+    '''
+    rng = random.Random(seed)
+    movies = [(f'Movie {movie_index}', f'/title/tt{1000000 + movie_index}/') for movie_index in range(movie_count)]
+    actors = [(f'Actor {actor_index} Example', f'/name/nm{1000000 + actor_index}/', rng.sample(movies, min(movies_per_actor, movie_count))) for actor_index in range(actor_count)]
+
+    _write_page(directory, LIST_PATH, _list_page(actors))
+    for actor_name, actor_path, actor_movies in actors:
+        _write_page(directory, actor_path, _actor_page(actor_name, actor_path, actor_movies, rng))
+        awards = [
+            (f'Award {award_index}', rng.choice(['Winner', 'Nominee']), rng.choice(['Best Actor', 'Best Supporting Actor', 'No Category']), rng.randint(1970, 2024))
+            for award_index in range(awards_per_actor)
+        ]
+        _write_page(directory, f'{actor_path}awards/', _awards_page(awards))
+    for movie_name, movie_path in movies:
+        movie_rating = round(rng.uniform(3, 9.5), 1) if rng.random() > 0.05 else None
+        _write_page(directory, movie_path, _movie_page(movie_name, movie_path, rng.randint(1950, 2024), movie_rating, rng.sample(GENRES, rng.randint(1, 4))))
+    return LIST_PATH
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+@contextlib.contextmanager
+def serve_directory(directory, port=0):
+    '''
+        Serves directory on localhost from a background thread. Query strings such as ?ref_=... are ignored.
+        Yields:
+            str: base_url, e.g. "http://127.0.0.1:8123"
+    '''
+    handler = functools.partial(_QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write and serve an offline IMDb-like fixture site.')
+    parser.add_argument('directory', type=str, help='Directory the fixture pages are written to.')
+    parser.add_argument('--actors', type=int, default=10, help='Number of actors.')
+    parser.add_argument('--movies', type=int, default=200, help='Number of distinct movies.')
+    parser.add_argument('--port', type=int, default=8000, help='Port to serve on.')
+    args = parser.parse_args()
+
+    list_path = write_fixture_site(args.directory, actor_count=args.actors, movie_count=args.movies)
+    with serve_directory(args.directory, port=args.port) as base_url:
+        print(f'Serving {base_url}{list_path} (Ctrl+C to stop)')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from scrape_metrics_module import timed
+
+class PageNotCachedError(LookupError):
+    pass
+
+def canonical_url(url):
+    '''
+        IMDb appends tracking parameters (?ref_=...) that differ per referring page,
+        they are dropped so that every page has one url.
+        Returns:
+            str: url without tracking parameters and fragment
+    '''
+    parts = urllib.parse.urlsplit(url)
+    query = [(name, value) for name, value in urllib.parse.parse_qsl(parts.query) if name != 'ref_']
+    return urllib.parse.urlunsplit((parts.scheme, parts.netloc, parts.path, urllib.parse.urlencode(query), ''))
+
+def cache_key(url, variant=None):
+    '''
+        variant: name of the interaction the page was loaded with, None for the plain page
+        Returns:
+            str: sha256 hex digest of the canonical url and the variant
+    '''
+    key = canonical_url(url) if variant is None else f'{canonical_url(url)} {variant}'
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+class PageCache:
+    '''
+        On-disk HTML cache keyed by url and variant (the interaction the page was loaded with,
+        e.g. an expanded filmography). Files are named after the hash of both,
+        their mtime is the fetch time (for the TTL) and their atime the last use (for LRU eviction
+        once the cache grows beyond max_bytes).
+        The TTL is measured from the creation of the cache, pages fetched during a run stay valid for that run.
+    '''
+
+    def __init__(self, directory, ttl_seconds=None, max_bytes=1024 ** 3):
+        self.directory = directory
+        self.fresh_after = time.time() - ttl_seconds if ttl_seconds is not None else None
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._sizes = {}
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith('.html'):
+                self._sizes[entry.path] = entry.stat().st_size
+        self._total_bytes = sum(self._sizes.values())
+
+    def _path(self, url, variant=None):
+        return os.path.join(self.directory, f'{cache_key(url, variant)}.html')
+
+    def get(self, url, variant=None, ignore_ttl=False):
+        '''
+            Returns:
+                str | None: cached html, None if the page is missing or older than the TTL
+        '''
+        path = self._path(url, variant)
+        try:
+            fetched_at = os.stat(path).st_mtime
+            if not ignore_ttl and self.fresh_after is not None and fetched_at < self.fresh_after:
+                html = None
+            else:
+                with open(path, encoding='utf-8') as page_file:
+                    html = page_file.read()
+                os.utime(path, (time.time(), fetched_at))
+        except FileNotFoundError:
+            html = None
+        with self._lock:
+            if html is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return html
+
+    def put(self, url, html, variant=None):
+        path = self._path(url, variant)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as page_file:
+            page_file.write(html)
+        os.replace(temporary_path, path)
+        with self._lock:
+            self._total_bytes += os.path.getsize(path) - self._sizes.get(path, 0)
+            self._sizes[path] = os.path.getsize(path)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        '''
+            Removes least recently used pages until the cache is at 90% of max_bytes.
+        '''
+        def last_used(path):
+            try:
+                return os.stat(path).st_atime
+            except FileNotFoundError:
+                return 0.0
+
+        for path in sorted(self._sizes, key=last_used):
+            if self._total_bytes <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._total_bytes -= self._sizes.pop(path)
+
+def _variant(interact):
+    return interact.__qualname__ if interact is not None else None
+
+class CachingFetcher:
+    '''
+        Serves pages from a PageCache and only asks the wrapped fetcher on a miss.
+        With a fetcher_factory the wrapped fetcher (e.g. a browser) is only started on the first miss.
+        In replay mode there is no wrapped fetcher and a miss raises PageNotCachedError.
+        A page loaded with an interaction is cached apart from the plain page.
+    '''
+
+    def __init__(self, fetcher, cache, replay=False, fetcher_factory=None):
+        self.fetcher = fetcher
+        self.cache = cache
+        self.replay = replay
+        self.fetcher_factory = fetcher_factory
+
+    def cached(self, url, interact=None):
+        '''
+            Returns:
+                str | None: the cached page, None on a miss (nothing is fetched)
+        '''
+        with timed('cache'):
+            return self.cache.get(url, _variant(interact), ignore_ttl=self.replay)
+
+    def fetch(self, url, interact=None):
+        html = self.cached(url, interact)
+        if html is not None:
+            return html
+        if self.replay:
+            raise PageNotCachedError(url)
+        if self.fetcher is None:
+            self.fetcher = self.fetcher_factory()
+        html = self.fetcher.fetch(url, interact=interact)
+        with timed('cache'):
+            self.cache.put(url, html, _variant(interact))
+        return html
+
+    def close(self):
+        if self.fetcher is not None:
+            self.fetcher.close()
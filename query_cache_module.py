@@ -0,0 +1,133 @@
+import collections
+import threading
+
+import database_module as dm
+
+# Results of database_module read functions, keyed by database, function and arguments.
+# Before a result is served the cache asks SQLite for its data_version, which changes whenever
+# another connection (e.g. the scraper) has committed, and drops all results if it did.
+# data_version is only comparable on one connection, so the cache asks on a connection of its own
+# that all threads share: a thread started after a write still sees that the data changed, and
+# writes of the process's own threads count as well.
+# The file mtime would miss writes that are still in the WAL file, so it is not used.
+
+_SCALAR_TYPES = (str, int, float, bool, bytes, type(None))
+
+class _Uncacheable(Exception):
+    pass
+
+def _freeze(value):
+    '''
+        Returns:
+            hashable: value with lists turned into tuples and sets into frozensets
+        Raises:
+            _Uncacheable: for values without a stable key, e.g. generators
+    '''
+    if isinstance(value, _SCALAR_TYPES):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+    raise _Uncacheable()
+
+class QueryCache:
+    '''
+        Bounded LRU cache for read functions of database_module, shared by all threads.
+        Results with more than max_rows rows are not kept, and neither are stream=True calls.
+        Cached results are shared between callers and must not be modified.
+    '''
+
+    def __init__(self, max_entries=1024, max_rows=10000):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = collections.OrderedDict()
+        # Bumped by every clear, results of queries that started before a clear are not stored.
+        self._generation = 0
+        self._lock = threading.Lock()
+        # (database path, connection) only used for PRAGMA data_version, and the last version it returned
+        self._version_connection = None
+        self._data_version = None
+        self._version_lock = threading.Lock()
+
+    def _check_data_version(self):
+        '''
+            Drops all results if the database changed since the last check of any thread.
+        '''
+        path = dm.database_path()
+        if self._version_connection is None or self._version_connection[0] != path:
+            # Creates or upgrades the database before the read-only connection opens it.
+            dm.get_connection()
+        with self._version_lock:
+            if self._version_connection is None or self._version_connection[0] != path:
+                self._close_version_connection()
+                self._version_connection = (path, dm.connect(path, readonly=True, check_same_thread=False))
+            data_version = (path, self._version_connection[1].execute('PRAGMA data_version').fetchone()[0])
+            changed = self._data_version is not None and self._data_version != data_version
+            self._data_version = data_version
+        if changed:
+            with self._lock:
+                self.invalidations += 1
+                self._clear()
+
+    def _close_version_connection(self):
+        if self._version_connection is not None:
+            self._version_connection[1].close()
+            self._version_connection = None
+
+    def _clear(self):
+        self._entries.clear()
+        self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def close(self):
+        '''
+            Closes the connection used for the data_version checks, the next call opens it again.
+        '''
+        with self._version_lock:
+            self._close_version_connection()
+
+    def call(self, function, *args, **kwargs):
+        '''
+            Returns:
+                the cached result of function(*args, **kwargs), calling it on a miss
+        '''
+        if self.max_entries <= 0 or kwargs.get('stream', False):
+            return function(*args, **kwargs)
+        try:
+            key = (dm.database_path(), function.__module__, function.__qualname__, _freeze(args), _freeze(sorted(kwargs.items())))
+        except _Uncacheable:
+            return function(*args, **kwargs)
+
+        self._check_data_version()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            generation = self._generation
+
+        result = function(*args, **kwargs)
+        if isinstance(result, (list, tuple, dict)) and len(result) > self.max_rows:
+            return result
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = result
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        '''
+            Returns:
+                dict: {entries, hits, misses, invalidations}
+        '''
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations}
@@ -0,0 +1,94 @@
+import argparse
+import http.client
+import json
+import sys
+import urllib.parse
+
+# Thin client of query_server_module. It only needs the standard library, so a lookup costs
+# one interpreter start and one request, the database stays open and warm in the server.
+
+DEFAULT_URL = 'http://127.0.0.1:8765'
+
+class QueryServerError(RuntimeError):
+    pass
+
+class QueryClient:
+    '''
+        Sends requests over one keep-alive connection, reconnecting once if the server closed it.
+    '''
+
+    def __init__(self, base_url=DEFAULT_URL, timeout=30):
+        parts = urllib.parse.urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port
+        self.timeout = timeout
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        '''
+            Returns:
+                dict: response body
+            Raises:
+                QueryServerError: if the server answers with an error
+        '''
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.connection.request(method, path, body=payload, headers=headers)
+                response = self.connection.getresponse()
+                response_body = json.loads(response.read())
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self.close()
+                if attempt == 1:
+                    raise
+        if response.status != 200:
+            raise QueryServerError(f'{response.status}: {response_body.get("error")}')
+        return response_body
+
+    def query(self, query_string):
+        '''
+            query_string: query line in the syntax of the interactive CLI, e.g. "Al Pacino --movies --limit 5"
+            Returns:
+                list[dict]: [result, ...]
+        '''
+        return self.request('POST', '/query', {'query': query_string})['results']
+
+    def command(self, command, **parameters):
+        '''
+            e.g. client.command('movies', actor_name='Al Pacino', limit=5)
+            Returns:
+                list[dict]: [result, ...]
+        '''
+        return self.request('POST', f'/{command}', parameters)['results']
+
+    def stats(self):
+        return self.request('GET', '/stats')
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run queries on a running query_server_module, one JSON result per line.')
+    parser.add_argument('queries', nargs='*', help='Query lines in the syntax of the interactive CLI, e.g. "Al Pacino --movies".')
+    parser.add_argument('--url', type=str, default=DEFAULT_URL, help='Base url of the query server.')
+    parser.add_argument('--stats', action='store_true', help='Print the latency percentiles and cache counters of the server.')
+    args = parser.parse_args()
+
+    client = QueryClient(args.url)
+    try:
+        for query_string in args.queries:
+            for result in client.query(query_string):
+                print(json.dumps(result, ensure_ascii=False))
+        if args.stats:
+            print(json.dumps(client.stats(), indent=4))
+    except QueryServerError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        client.close()
@@ -0,0 +1,409 @@
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import http.server
+import io
+import json
+import selectors
+import socket
+import threading
+import time
+
+import database_module as dm
+import user_interface_module as ui
+
+# Local JSON query server: the CLI commands of user_interface_module over HTTP on 127.0.0.1.
+# Requests run on a fixed pool of threads, each with its own read-only connection that stays
+# open (and warm) for the life of the server, and share the CLI's query cache and co-star graph.
+# A selector thread reads every request until it is complete and only then hands it to a worker,
+# so idle keep-alive connections and slow or stalled clients cannot take all the workers.
+#
+#   POST /query      {"query": "Al Pacino --movies --limit 5"}         CLI query syntax
+#   POST /<command>  {"actor_name": "Al Pacino", "limit": 5, ...}       command of COMMAND_FLAGS
+#   GET  /stats      per-endpoint latency percentiles and query cache counters
+#   GET  /health
+#
+# Successful queries answer {"results": [result, ...]} with the records of ui.result_record,
+# failures {"error": message} with status 400, 404 or 500.
+
+DEFAULT_PORT = 8765
+# Idle keep-alive connections are closed after this, they do not hold a worker meanwhile.
+IDLE_TIMEOUT_SECONDS = 30
+# A client that has started a request has to send the rest of it within this.
+REQUEST_TIMEOUT_SECONDS = 10
+# Connections whose request line and headers, or body, exceed these are closed.
+MAX_HEADER_BYTES = 65536
+MAX_BODY_BYTES = 1024 ** 2
+LATENCY_SAMPLES = 10000
+
+# command -> (parser attribute, required parameter or None)
+COMMAND_FLAGS = {
+    'actors': ('actors', None),
+    'genre_stats': ('genre_stats', None),
+    'search': ('search', 'search'),
+    'bio': ('bio', 'actor_name'),
+    'movies': ('movies', 'actor_name'),
+    'awards': ('awards', 'actor_name'),
+    'genres': ('genres', 'actor_name'),
+    'ratings': ('ratings', 'actor_name'),
+    'topfive': ('topfive', 'actor_name'),
+    'costars': ('costars', 'actor_name'),
+    'path': ('path', 'path'),
+}
+
+class BadRequest(ValueError):
+    pass
+
+class NotFound(LookupError):
+    pass
+
+class LatencyRecorder:
+    '''
+        Keeps the latest LATENCY_SAMPLES request durations of every endpoint.
+    '''
+
+    def __init__(self):
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_SAMPLES))
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            self._samples[endpoint].append(seconds)
+            self._counts[endpoint] += 1
+
+    def percentiles(self):
+        '''
+            Returns:
+                dict: {endpoint: {count, p50_ms, p90_ms, p99_ms, max_ms}}
+        '''
+        with self._lock:
+            samples = {endpoint: sorted(durations) for endpoint, durations in self._samples.items()}
+            counts = dict(self._counts)
+        report = {}
+        for endpoint, durations in sorted(samples.items()):
+            def percentile(fraction):
+                return round(1000 * durations[min(len(durations) - 1, int(len(durations) * fraction))], 3)
+            report[endpoint] = {'count': counts[endpoint], 'p50_ms': percentile(0.5), 'p90_ms': percentile(0.9), 'p99_ms': percentile(0.99), 'max_ms': round(1000 * durations[-1], 3)}
+        return report
+
+def command_arguments(parser, command, parameters):
+    '''
+        Builds the parsed CLI arguments of one command from JSON parameters.
+        Returns:
+            argparse.Namespace: arguments for ui.run_query
+        Raises:
+            BadRequest: for unknown commands and missing or malformed parameters
+    '''
+    if command not in COMMAND_FLAGS:
+        raise BadRequest(f'Unknown command: {command}')
+    flag, required = COMMAND_FLAGS[command]
+    if required is not None and not isinstance(parameters.get(required), str):
+        raise BadRequest(f'{command} needs the string parameter {required}')
+    if command == 'path' and not isinstance(parameters.get('actor_name'), str):
+        raise BadRequest('path needs the string parameter actor_name')
+    limit = parameters.get('limit')
+    if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 1):
+        raise BadRequest('limit must be a positive integer')
+    if parameters.get('after') is not None and not isinstance(parameters['after'], str):
+        raise BadRequest('after must be a string')
+    args = parser.parse_args(['None', 'None'])
+    # run_query joins first and last name with a space, so any name survives the split.
+    args.first_name, _, args.last_name = parameters.get('actor_name', 'None None').partition(' ')
+    args.limit = limit
+    args.after = parameters.get('after')
+    setattr(args, flag, parameters[required] if flag == required else True)
+    if args.after is not None:
+        try:
+            dm.decode_cursor(args.after)
+        except ValueError as e:
+            raise BadRequest(str(e))
+    return args
+
+def request_length(buffer):
+    '''
+        buffer: bytes received on a connection that are not part of an answered request
+        Returns:
+            int | None: length of the first request in buffer, None while it is incomplete
+        Raises:
+            ValueError: for requests the server does not read (too large, malformed Content-Length)
+    '''
+    header_end = buffer.find(b'\r\n\r\n')
+    if header_end < 0:
+        if len(buffer) > MAX_HEADER_BYTES:
+            raise ValueError('Request header too large')
+        return None
+    header_end += 4
+    content_length = 0
+    for line in buffer[:header_end].split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            content_length = int(value)
+    if not 0 <= content_length <= MAX_BODY_BYTES:
+        raise ValueError('Request body too large')
+    return header_end + content_length if len(buffer) >= header_end + content_length else None
+
+class _Connection:
+    '''
+        A client connection and the bytes received on it that were not answered yet.
+    '''
+
+    def __init__(self, socket, client_address):
+        self.socket = socket
+        self.client_address = client_address
+        self.buffer = b''
+        # The request a worker answers next, split off the buffer.
+        self.request_bytes = b''
+        # When the selector thread closes the connection if no complete request arrived.
+        self.deadline = time.monotonic() + IDLE_TIMEOUT_SECONDS
+
+class _QueryHandler(http.server.BaseHTTPRequestHandler):
+    '''
+        Answers one request that the server has already received completely (request is a _Connection).
+        The response goes out in one sendall, the server then reuses or closes the connection.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        self.connection = self.request.socket
+        self.rfile = io.BytesIO(self.request.request_bytes)
+        self.wfile = io.BytesIO()
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+
+    def finish(self):
+        self.connection.sendall(self.wfile.getvalue())
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self):
+        # The server has split off exactly Content-Length bytes of body.
+        try:
+            parameters = json.loads(self.rfile.read() or b'{}')
+        except ValueError:
+            raise BadRequest('The request body is not valid JSON.')
+        if not isinstance(parameters, dict):
+            raise BadRequest('The request body must be a JSON object.')
+        return parameters
+
+    def _answer(self, method):
+        started = time.perf_counter()
+        endpoint = self.path.split('?')[0]
+        try:
+            status, body = 200, self.server.dispatch(method, endpoint, self._read_json() if method == 'POST' else {})
+        except BadRequest as e:
+            status, body = 400, {'error': str(e)}
+        except NotFound as e:
+            status, body, endpoint = 404, {'error': str(e)}, 'unknown'
+        except Exception as e:
+            status, body = 500, {'error': f'{type(e).__name__}: {e}'}
+        self._send_json(status, body)
+        self.server.latencies.record(f'{method} {endpoint}', time.perf_counter() - started)
+
+    def do_GET(self):
+        self._answer('GET')
+
+    def do_POST(self):
+        self._answer('POST')
+
+class QueryServer(http.server.HTTPServer):
+    '''
+        HTTP server whose requests run on a fixed pool of worker threads instead of a thread per connection,
+        so the read-only connections of the workers (one per thread, see dm.get_connection) are reused.
+        Connections are read by a selector thread, workers only get complete requests.
+    '''
+
+    def __init__(self, server_address, workers=8):
+        super().__init__(server_address, _QueryHandler)
+        self.parser = ui.parse_arguments()
+        self.latencies = LatencyRecorder()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='query', initializer=dm.get_connection)
+        self._selector = selectors.DefaultSelector()
+        # New and answered connections reach the selector thread through _ready,
+        # the wakeup socket interrupts its select.
+        self._ready = []
+        self._ready_lock = threading.Lock()
+        self._closed = False
+        self._wakeup_receiver, self._wakeup_sender = socket.socketpair()
+        self._selector.register(self._wakeup_receiver, selectors.EVENT_READ)
+        self._selector_thread = threading.Thread(target=self._watch_connections, name='query-selector', daemon=True)
+        self._selector_thread.start()
+
+    def dispatch(self, method, endpoint, parameters):
+        '''
+            Returns:
+                dict: response body
+            Raises:
+                BadRequest: for invalid parameters
+                NotFound: for unknown endpoints
+        '''
+        if method == 'GET' and endpoint == '/health':
+            return {'status': 'ok'}
+        if method == 'GET' and endpoint == '/stats':
+            return {'endpoints': self.latencies.percentiles(), 'query_cache': ui.query_cache.stats()}
+        if method == 'POST' and endpoint == '/query':
+            if not isinstance(parameters.get('query'), str):
+                raise BadRequest('query needs the string parameter query')
+            try:
+                args = ui.parse_query(self.parser, parameters['query'])
+            except ValueError as e:
+                raise BadRequest(str(e))
+        elif method == 'POST' and endpoint.lstrip('/') in COMMAND_FLAGS:
+            args = command_arguments(self.parser, endpoint.lstrip('/'), parameters)
+        else:
+            raise NotFound(f'No endpoint {method} {endpoint}')
+        results = ui.run_query(args, ui.resolve_actor_ids([args]))
+        return {'results': [ui.result_record(result) for result in results]}
+
+    def process_request(self, request, client_address):
+        # Responses are sent in one piece, TCP_NODELAY keeps the last segment from waiting for a delayed ACK.
+        request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+        # Sends of a worker give up after this, the selector thread only receives what has arrived.
+        request.settimeout(REQUEST_TIMEOUT_SECONDS)
+        self._hand_back(_Connection(request, client_address))
+
+    def _hand_back(self, connection):
+        with self._ready_lock:
+            if not self._closed:
+                self._ready.append(connection)
+                self._wakeup_sender.send(b'\0')
+                return
+        self.shutdown_request(connection.socket)
+
+    def _answer(self, connection):
+        try:
+            handler = self.RequestHandlerClass(connection, connection.client_address, self)
+        except Exception:
+            self.handle_error(connection.socket, connection.client_address)
+            self.shutdown_request(connection.socket)
+            return
+        if handler.close_connection:
+            self.shutdown_request(connection.socket)
+            return
+        connection.deadline = time.monotonic() + (IDLE_TIMEOUT_SECONDS if len(connection.buffer) == 0 else REQUEST_TIMEOUT_SECONDS)
+        self._hand_back(connection)
+
+    def _dispatch_complete_request(self, connection):
+        '''
+            Hands the first buffered request of connection to a worker.
+            Returns:
+                bool: True if it was complete, False if the connection has to wait for more bytes
+            Raises:
+                ValueError: for requests the server does not read
+        '''
+        length = request_length(connection.buffer)
+        if length is None:
+            return False
+        connection.request_bytes, connection.buffer = connection.buffer[:length], connection.buffer[length:]
+        self.executor.submit(self._answer, connection)
+        return True
+
+    def _watch_connections(self):
+        '''
+            Receives on every connection that no worker is answering, hands complete requests to the
+            workers (pipelined ones without waiting for the socket), and closes connections that stay
+            idle or stall in the middle of a request past their deadline.
+        '''
+        waiting = set()
+        while True:
+            with self._ready_lock:
+                closed = self._closed
+                ready, self._ready = self._ready, []
+            if closed:
+                waiting.update(ready)
+                break
+            for connection in ready:
+                try:
+                    if self._dispatch_complete_request(connection):
+                        continue
+                except ValueError:
+                    self.shutdown_request(connection.socket)
+                    continue
+                self._selector.register(connection.socket, selectors.EVENT_READ, connection)
+                waiting.add(connection)
+            for key, _ in self._selector.select(timeout=1.0):
+                if key.fileobj is self._wakeup_receiver:
+                    self._wakeup_receiver.recv(4096)
+                    continue
+                connection = key.data
+                try:
+                    data = connection.socket.recv(65536)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    data = b''
+                try:
+                    if len(data) > 0:
+                        if len(connection.buffer) == 0:
+                            connection.deadline = time.monotonic() + REQUEST_TIMEOUT_SECONDS
+                        connection.buffer += data
+                        if not self._dispatch_complete_request(connection):
+                            continue
+                except ValueError:
+                    data = b''
+                self._selector.unregister(connection.socket)
+                waiting.discard(connection)
+                if len(data) == 0:
+                    self.shutdown_request(connection.socket)
+            now = time.monotonic()
+            for connection in [connection for connection in waiting if connection.deadline < now]:
+                self._selector.unregister(connection.socket)
+                waiting.discard(connection)
+                self.shutdown_request(connection.socket)
+        for connection in waiting:
+            self.shutdown_request(connection.socket)
+        self._selector.close()
+        self._wakeup_receiver.close()
+        self._wakeup_sender.close()
+
+    def server_close(self):
+        super().server_close()
+        with self._ready_lock:
+            self._closed = True
+            self._wakeup_sender.send(b'\0')
+        self._selector_thread.join()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+@contextlib.contextmanager
+def serve_queries(port=0, workers=8):
+    '''
+        Serves queries against the configured database on localhost from a background thread.
+        Yields:
+            str: base_url, e.g. "http://127.0.0.1:8765"
+    '''
+    server = QueryServer(('127.0.0.1', port), workers=workers)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the CLI queries as JSON over HTTP on localhost.')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to serve on.')
+    parser.add_argument('--workers', type=int, default=8, help='Number of worker threads, each with its own read-only connection.')
+    parser.add_argument('--cache-size', type=int, default=1024, help='Number of query results kept in memory, 0 disables the query cache.')
+    args = parser.parse_args()
+
+    dm.configure(readonly=True)
+    ui.query_cache.max_entries = args.cache_size
+    with serve_queries(port=args.port, workers=args.workers) as base_url:
+        print(f'Serving queries on {base_url} (Ctrl+C to stop)')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
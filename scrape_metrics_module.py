@@ -0,0 +1,256 @@
+import collections
+import contextlib
+import cProfile
+import json
+import pstats
+import threading
+import time
+
+# Where a scrape spends its time. Every worker thread runs its tasks inside ScrapeMetrics.task,
+# which marks the stage and url the thread works on. Fetchers, parsers and wait helpers only call
+# the module functions timed, record_sleep, record_wait and record_retry, which add to the
+# task of the calling thread and do nothing outside a task.
+#
+# Phases of a task:
+#   cache     page cache reads and writes
+#   fetch     page loads (HTTP request or driver.get)
+#   render    browser interaction after the load (scrolling, clicks, their waits) and reading the page source
+#   parse     extraction_module calls
+#   db_write  saving the result with its checkpoint
+
+PHASES = ('cache', 'fetch', 'render', 'parse', 'db_write')
+SLOWEST_URLS = 10
+
+_current = threading.local()
+
+def _active_task():
+    return getattr(_current, 'task', None)
+
+@contextlib.contextmanager
+def timed(phase):
+    '''
+        Adds the duration of the block to phase of the calling thread's task.
+    '''
+    task = _active_task()
+    if task is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        task[0]._add_phase(task[1], task[2], phase, time.perf_counter() - started)
+
+def record_sleep(reason, seconds):
+    '''
+        reason: 'rate_limit' or 'wait'
+    '''
+    task = _active_task()
+    if task is not None and seconds > 0:
+        task[0]._add_sleep(task[1], task[2], reason, seconds)
+
+def record_wait(name, seconds, slept_seconds, replaced_seconds, timed_out):
+    '''
+        Records one condition-based wait.
+        replaced_seconds: fixed sleep the wait stands in for, the report shows the difference as saved time
+    '''
+    record_sleep('wait', slept_seconds)
+    task = _active_task()
+    if task is not None:
+        task[0]._add_wait(name, seconds, slept_seconds, replaced_seconds, timed_out)
+
+def record_retry(error):
+    task = _active_task()
+    if task is not None:
+        task[0]._add_retry(task[1], task[2], type(error).__name__)
+
+def _new_stage():
+    return {
+        'tasks': 0,
+        'failures': 0,
+        'wall_seconds': 0.0,
+        'phases': collections.defaultdict(lambda: {'calls': 0, 'seconds': 0.0}),
+        'sleep_seconds': collections.Counter(),
+        'retries': collections.Counter(),
+    }
+
+def _new_url():
+    return {'seconds': collections.Counter(), 'sleep_seconds': 0.0, 'retries': 0, 'error': None}
+
+class ScrapeMetrics:
+    '''
+        Thread-safe totals of one scrape run, per stage and per (stage, url).
+        With profile=True every thread that enters profiled() runs under its own cProfile.Profile,
+        cProfile alone would only see the thread that started it and miss the workers.
+        Python 3.12+ allows one active cProfile per process: there the profiler of the first thread
+        to enter profiled() (the main thread of a scrape run) records the calls of all threads in one
+        call stack, so the times of functions running in several threads at once are approximate.
+    '''
+
+    def __init__(self, profile=False):
+        self.started_at = time.time()
+        self.profile = profile
+        self._started = time.perf_counter()
+        self._stages = collections.defaultdict(_new_stage)
+        self._urls = collections.defaultdict(_new_url)
+        self._waits = collections.defaultdict(lambda: {'count': 0, 'timeouts': 0, 'seconds': 0.0, 'slept_seconds': 0.0, 'replaced_seconds': 0.0})
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def task(self, stage, key):
+        '''
+            Attributes the work of the calling thread to stage and url inside the block.
+            key: url, or a pool task key whose first item is the url
+        '''
+        url = key[0] if isinstance(key, tuple) else key
+        previous_task = _active_task()
+        _current.task = (self, stage, url)
+        try:
+            yield
+        finally:
+            _current.task = previous_task
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        '''
+            Adds the wall time of the block to stage.
+        '''
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._stages[stage]['wall_seconds'] += time.perf_counter() - started
+
+    @contextlib.contextmanager
+    def profiled(self):
+        '''
+            Profiles the calling thread inside the block if profiling is on.
+        '''
+        if not self.profile:
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: the profiler another thread enabled already records this one
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+
+    def record_result(self, stage, key, error=None):
+        url = key[0] if isinstance(key, tuple) else key
+        with self._lock:
+            self._stages[stage]['tasks'] += 1
+            if error is not None:
+                self._stages[stage]['failures'] += 1
+                self._urls[stage, url]['error'] = repr(error)
+
+    def _add_phase(self, stage, url, phase, seconds):
+        with self._lock:
+            totals = self._stages[stage]['phases'][phase]
+            totals['calls'] += 1
+            totals['seconds'] += seconds
+            self._urls[stage, url]['seconds'][phase] += seconds
+
+    def _add_sleep(self, stage, url, reason, seconds):
+        with self._lock:
+            self._stages[stage]['sleep_seconds'][reason] += seconds
+            self._urls[stage, url]['sleep_seconds'] += seconds
+
+    def _add_wait(self, name, seconds, slept_seconds, replaced_seconds, timed_out):
+        with self._lock:
+            totals = self._waits[name]
+            totals['count'] += 1
+            totals['timeouts'] += int(timed_out)
+            totals['seconds'] += seconds
+            totals['slept_seconds'] += slept_seconds
+            totals['replaced_seconds'] += replaced_seconds
+
+    def _add_retry(self, stage, url, error_name):
+        with self._lock:
+            self._stages[stage]['retries'][error_name] += 1
+            self._urls[stage, url]['retries'] += 1
+
+    def report(self):
+        '''
+            Returns:
+                dict: {started_at, wall_seconds, stages, waits, saved_wait_seconds, slowest_urls, urls}
+        '''
+        def rounded(seconds):
+            return round(seconds, 4)
+
+        with self._lock:
+            stages = {
+                stage: {
+                    'tasks': totals['tasks'],
+                    'failures': totals['failures'],
+                    'wall_seconds': rounded(totals['wall_seconds']),
+                    'phases': {phase: {'calls': phase_totals['calls'], 'seconds': rounded(phase_totals['seconds'])} for phase, phase_totals in totals['phases'].items()},
+                    'sleep_seconds': {reason: rounded(seconds) for reason, seconds in totals['sleep_seconds'].items()},
+                    'retries': dict(totals['retries']),
+                }
+                for stage, totals in self._stages.items()
+            }
+            waits = {
+                name: {**{field: rounded(value) for field, value in totals.items()}, 'saved_seconds': rounded(totals['replaced_seconds'] - totals['seconds']) or 0.0}
+                for name, totals in self._waits.items()
+            }
+            urls = [
+                {
+                    'stage': stage,
+                    'url': url,
+                    'seconds': {phase: rounded(seconds) for phase, seconds in totals['seconds'].items()},
+                    'sleep_seconds': rounded(totals['sleep_seconds']),
+                    'retries': totals['retries'],
+                    'error': totals['error'],
+                }
+                for (stage, url), totals in self._urls.items()
+            ]
+        urls.sort(key=lambda url: url['seconds'].get('fetch', 0.0) + url['seconds'].get('render', 0.0), reverse=True)
+        return {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+            'wall_seconds': rounded(time.perf_counter() - self._started),
+            'stages': stages,
+            'waits': waits,
+            'saved_wait_seconds': rounded(sum(wait['saved_seconds'] for wait in waits.values())),
+            'slowest_urls': urls[:SLOWEST_URLS],
+            'urls': urls,
+        }
+
+    def write_report(self, path):
+        with open(path, 'w', encoding='utf-8') as report_file:
+            json.dump(self.report(), report_file, indent=4)
+
+    def write_profile(self, path):
+        '''
+            Writes the merged profiles of all threads in pstats format, e.g. for python -m pstats or snakeviz.
+        '''
+        with self._lock:
+            profiles = list(self._profiles)
+        if len(profiles) > 0:
+            pstats.Stats(*profiles).dump_stats(path)
+
+    def summary_lines(self):
+        '''
+            Returns:
+                list[str]: one line per stage and one for the waits
+        '''
+        report = self.report()
+        lines = []
+        for stage, totals in report['stages'].items():
+            phases = [f'{phase} {totals["phases"][phase]["seconds"]:.1f}s' for phase in PHASES if phase in totals['phases']]
+            sleeps = [f'{reason} sleep {seconds:.1f}s' for reason, seconds in totals['sleep_seconds'].items()]
+            retries = sum(totals['retries'].values())
+            details = ', '.join(phases + sleeps + [f'{retries} retries', f'{totals["failures"]} failed'])
+            lines.append(f'{stage}: {totals["tasks"]} tasks in {totals["wall_seconds"]:.1f}s ({details})')
+        if len(report['waits']) > 0:
+            lines.append(f'Condition-based waits: {report["saved_wait_seconds"]:.1f}s less than the fixed sleeps they replace')
+        return lines
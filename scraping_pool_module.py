@@ -0,0 +1,146 @@
+import queue
+import threading
+
+import requests
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+
+import scrape_metrics_module
+from scrape_metrics_module import ScrapeMetrics
+
+# Page loads that time out, dropped connections and elements that go stale while IMDb
+# re-renders are transient, every other exception is reported to the caller right away.
+RETRYABLE_EXCEPTIONS = (TimeoutException, StaleElementReferenceException, requests.Timeout, requests.ConnectionError)
+
+_NO_MORE_TASKS = object()
+_WORKER_DONE = object()
+
+class ScrapeWorkerPool:
+    '''
+        Runs scrape functions on worker threads that each own one reusable fetcher
+        (a SeleniumFetcher with its own WebDriver, or a shared RequestsFetcher).
+        Tasks are fed through a bounded queue, results are streamed back to the calling
+        thread which stays the only one writing to the database.
+        Every task runs inside metrics.task, so its phases and retries are attributed to its stage and url.
+        A task that still fails with a retryable error after max_retries is reported failed and its
+        worker asks fetcher_factory for a new fetcher (e.g. in place of a crashed browser) for the next task.
+
+        with ScrapeWorkerPool(worker_count=4, fetcher_factory=create_browser_fetcher) as pool:
+            for key, result, error in pool.run(tasks):
+                ...
+    '''
+
+    def __init__(self, worker_count, fetcher_factory, queue_size=None, max_retries=3, metrics=None):
+        self.worker_count = worker_count
+        self.fetcher_factory = fetcher_factory
+        self.queue_size = queue_size if queue_size is not None else 2 * worker_count
+        self.max_retries = max_retries
+        self.metrics = metrics if metrics is not None else ScrapeMetrics()
+        self.fetchers = []
+        self._fetchers_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        '''
+            Closes every fetcher that a worker has started.
+        '''
+        with self._fetchers_lock:
+            fetchers, self.fetchers = self.fetchers, []
+        for fetcher in set(fetchers):
+            fetcher.close()
+
+    def run(self, tasks, stage=None):
+        '''
+            tasks: iterable of (key, scrape_function, arguments), consumed lazily.
+            stage: name the tasks are reported under in metrics
+            Every scrape_function is called as scrape_function(*arguments, fetcher=fetcher).
+            Yields:
+                tuple: (key, result, error) in completion order, error is None on success
+        '''
+        task_queue = queue.Queue(maxsize=self.queue_size)
+        result_queue = queue.Queue()
+        stop_event = threading.Event()
+        feed_errors = []
+
+        feeder = threading.Thread(target=self._feed, args=(tasks, task_queue, stop_event, feed_errors), daemon=True)
+        workers = [
+            threading.Thread(target=self._work, args=(task_queue, result_queue, stop_event, stage), daemon=True)
+            for _ in range(self.worker_count)
+        ]
+        feeder.start()
+        for worker in workers:
+            worker.start()
+
+        running_workers = len(workers)
+        try:
+            while running_workers > 0:
+                result = result_queue.get()
+                if result is _WORKER_DONE:
+                    running_workers -= 1
+                    continue
+                yield result
+            if len(feed_errors) > 0:
+                raise feed_errors[0]
+        finally:
+            # When the caller stops early the remaining tasks are skipped, not scraped.
+            stop_event.set()
+            while running_workers > 0:
+                if result_queue.get() is _WORKER_DONE:
+                    running_workers -= 1
+
+    def _feed(self, tasks, task_queue, stop_event, feed_errors):
+        try:
+            for task in tasks:
+                if stop_event.is_set():
+                    break
+                task_queue.put(task)
+        except Exception as e:
+            feed_errors.append(e)
+        finally:
+            for _ in range(self.worker_count):
+                task_queue.put(_NO_MORE_TASKS)
+
+    def _work(self, task_queue, result_queue, stop_event, stage):
+        fetcher = None
+        try:
+            with self.metrics.profiled():
+                while True:
+                    task = task_queue.get()
+                    if task is _NO_MORE_TASKS:
+                        break
+                    if stop_event.is_set():
+                        continue
+                    if fetcher is None:
+                        try:
+                            fetcher = self.fetcher_factory()
+                        except Exception as e:
+                            result_queue.put((task[0], None, e))
+                            continue
+                        with self._fetchers_lock:
+                            self.fetchers.append(fetcher)
+                    key, result, error = self._run_task(fetcher, task, stage)
+                    result_queue.put((key, result, error))
+                    if isinstance(error, RETRYABLE_EXCEPTIONS):
+                        # The next task gets a new fetcher, the old one is closed with the pool
+                        # since the factory may hand the same fetcher to other workers.
+                        fetcher = None
+        finally:
+            result_queue.put(_WORKER_DONE)
+
+    def _run_task(self, fetcher, task, stage):
+        key, scrape_function, arguments = task
+        with self.metrics.task(stage, key):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return key, scrape_function(*arguments, fetcher=fetcher), None
+                except RETRYABLE_EXCEPTIONS as e:
+                    error = e
+                    if attempt < self.max_retries:
+                        scrape_metrics_module.record_retry(e)
+                except Exception as e:
+                    return key, None, e
+        return key, None, error
@@ -0,0 +1,221 @@
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import database_module as dm
+
+# Columnar copy of the tables that corpus-wide statistics read (analytics_module): one .npy file
+# per column in a directory next to the database, memory-mapped on load, so opening a snapshot
+# does not depend on its size and repeated runs share the page cache.
+# Strings are dictionary-encoded: <table>.<column>.codes.npy indexes the distinct values of the
+# column, stored as concatenated UTF-8 (.dictionary.npy) with start offsets (.offsets.npy).
+# NULL strings are stored as '', unknown years as 0, and movies without a rating (NULL or
+# dm.UNRATED_MOVIE_RATING) get NaN, so NaN-aware numpy code leaves them out like the SQL does.
+# A snapshot is a copy at export time. load_snapshot exports again when the schema changed.
+
+SNAPSHOT_DIRECTORY_SUFFIX = '.snapshot'
+MANIFEST_FILE = 'manifest.json'
+FORMAT_VERSION = 1
+# Rows converted to arrays at once while exporting.
+CHUNK_ROWS = 100000
+# Columns of the tables of dm.SNAPSHOT_QUERIES in query order, 'str' columns are dictionary-encoded.
+COLUMN_TYPES = {
+    'actors': [('actor_id', 'int32'), ('actor_name', 'str')],
+    'movies': [('movie_id', 'int32'), ('movie_name', 'str'), ('movie_rating', 'float32'), ('movie_year', 'int16')],
+    'movie_genres': [('movie_id', 'int32'), ('genre_name', 'str')],
+    'played_in': [('actor_id', 'int32'), ('movie_id', 'int32')],
+    'awards': [('awards_id', 'int32'), ('actor_id', 'int32'), ('award_name', 'str'), ('award_category', 'str'), ('award_year', 'int16')],
+}
+
+def snapshot_path(database_path=None):
+    '''
+        Returns:
+            str: path of the snapshot directory of the database
+    '''
+    return (database_path if database_path is not None else dm.database_path()) + SNAPSHOT_DIRECTORY_SUFFIX
+
+class StringDictionary:
+    '''
+        Distinct values of a dictionary-encoded column, decoded on access.
+    '''
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+        self._codes = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, code):
+        return bytes(self.data[self.offsets[code]:self.offsets[code + 1]]).decode('utf-8')
+
+    def code_of(self, value):
+        '''
+            Returns:
+                int | None: code of value, None if the column never contains it
+        '''
+        if self._codes is None:
+            self._codes = {self[code]: code for code in range(len(self))}
+        return self._codes.get(value)
+
+    def decode(self, codes):
+        return [self[code] for code in codes]
+
+class Snapshot:
+    '''
+        Read-only columns of one snapshot, memory-mapped on first access.
+        Build it with export_snapshot / load_snapshot, not directly.
+    '''
+
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self._arrays = {}
+
+    @property
+    def schema_version(self):
+        return self.manifest['schema_version']
+
+    @property
+    def exported_at(self):
+        return self.manifest['exported_at']
+
+    def row_count(self, table):
+        return self.manifest['tables'][table]['rows']
+
+    def _array(self, file_name):
+        if file_name not in self._arrays:
+            self._arrays[file_name] = np.load(os.path.join(self.directory, file_name), mmap_mode='r')
+        return self._arrays[file_name]
+
+    def column(self, table, column):
+        '''
+            Returns:
+                numpy.ndarray: values of the column in primary key order, codes for string columns
+        '''
+        if self.manifest['tables'][table]['columns'][column] == 'str':
+            return self._array(f'{table}.{column}.codes.npy')
+        return self._array(f'{table}.{column}.npy')
+
+    def dictionary(self, table, column):
+        '''
+            Returns:
+                StringDictionary: values of the codes of a string column
+        '''
+        return StringDictionary(self._array(f'{table}.{column}.dictionary.npy'), self._array(f'{table}.{column}.offsets.npy'))
+
+    def close(self):
+        # The maps are closed once the arrays are no longer referenced.
+        self._arrays.clear()
+
+def _convert(values, column_type):
+    if column_type == 'float32':
+        return np.array([value if value is not None and value != dm.UNRATED_MOVIE_RATING else np.nan for value in values], dtype=np.float32)
+    return np.array([value if value is not None else 0 for value in values], dtype=column_type)
+
+def _write_table(directory, table):
+    '''
+        Returns:
+            dict: {rows, columns: {column: type}}
+    '''
+    columns = COLUMN_TYPES[table]
+    chunks = [[] for _ in columns]
+    dictionaries = [{} if column_type == 'str' else None for _, column_type in columns]
+    rows = dm.get_snapshot_rows(table)
+    row_count = 0
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK_ROWS))
+        if len(chunk) == 0:
+            break
+        row_count += len(chunk)
+        for index, values in enumerate(zip(*chunk)):
+            column_type = columns[index][1]
+            if column_type == 'str':
+                dictionary = dictionaries[index]
+                chunks[index].append(np.array([dictionary.setdefault(value if value is not None else '', len(dictionary)) for value in values], dtype=np.uint32))
+            else:
+                chunks[index].append(_convert(values, column_type))
+
+    for (column, column_type), column_chunks, dictionary in zip(columns, chunks, dictionaries):
+        if column_type != 'str':
+            np.save(os.path.join(directory, f'{table}.{column}.npy'), np.concatenate(column_chunks) if len(column_chunks) > 0 else np.zeros(0, dtype=column_type))
+            continue
+        codes = np.concatenate(column_chunks) if len(column_chunks) > 0 else np.zeros(0, dtype=np.uint32)
+        np.save(os.path.join(directory, f'{table}.{column}.codes.npy'), codes.astype(np.min_scalar_type(max(len(dictionary) - 1, 0))))
+        encoded = [value.encode('utf-8') for value in dictionary]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        np.save(os.path.join(directory, f'{table}.{column}.dictionary.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        np.save(os.path.join(directory, f'{table}.{column}.offsets.npy'), offsets)
+    return {'rows': row_count, 'columns': dict(columns)}
+
+def export_snapshot(path=None):
+    '''
+        Writes all snapshot tables of the configured database from one read transaction,
+        replacing the snapshot at path once it is complete.
+        Returns:
+            Snapshot: the new snapshot
+    '''
+    path = path if path is not None else snapshot_path()
+    temporary_directory = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with dm.read_transaction():
+            manifest = {
+                'format_version': FORMAT_VERSION,
+                'schema_version': dm.get_schema_version(),
+                'exported_at': time.time(),
+                'tables': {table: _write_table(temporary_directory, table) for table in COLUMN_TYPES},
+            }
+        with open(os.path.join(temporary_directory, MANIFEST_FILE), 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=4)
+        # Readers keep their maps of the old files, which are only unlinked.
+        stale_path = path + '.old'
+        shutil.rmtree(stale_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, stale_path)
+        os.rename(temporary_directory, path)
+        shutil.rmtree(stale_path, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+        raise
+    return Snapshot(path, manifest)
+
+def _read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        return None
+    return manifest if manifest.get('format_version') == FORMAT_VERSION else None
+
+def load_snapshot(path=None, refresh=False):
+    '''
+        Maps the saved snapshot. A missing one, one of another format, or one exported before the schema
+        changed (e.g. a reset) is exported first, refresh=True always exports.
+        Returns:
+            Snapshot: snapshot
+    '''
+    path = path if path is not None else snapshot_path()
+    manifest = None if refresh else _read_manifest(path)
+    if manifest is None or manifest['schema_version'] != dm.get_schema_version():
+        return export_snapshot(path)
+    return Snapshot(path, manifest)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export actors, movies, genres, played_in and awards to a memory-mappable columnar snapshot.')
+    parser.add_argument('--database', type=str, default=None, help='Path of the database file (default: movies.db or MOVIES_DB).')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with dm.open_database(args.database, readonly=True):
+        snapshot = export_snapshot()
+    snapshot_bytes = sum(entry.stat().st_size for entry in os.scandir(snapshot.directory))
+    row_counts = ', '.join(f'{snapshot.row_count(table)} {table}' for table in COLUMN_TYPES)
+    print(f'Exported {row_counts} to {snapshot.directory} ({snapshot_bytes / 1024 ** 2:.1f} MB) in {time.perf_counter() - started:.1f}s')
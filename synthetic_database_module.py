@@ -0,0 +1,162 @@
+import argparse
+import itertools
+import os
+import random
+import shutil
+import time
+
+import costar_graph_module
+import database_module as dm
+from extraction_module import IMDB_BASE_URL
+import snapshot_module
+
+# Builds a database with the current schema and synthetic data at any scale, through the same
+# insert functions the scraper uses, so triggers, statistics, search index and co-star graph are
+# all filled as after a real scrape.
+# The skew follows the scraped movies.db: a few actors appear in far more movies (and win far more
+# awards) than the rest, movies have about 4 genres out of a long tail with Drama and Comedy on top,
+# ratings center around 6.4 with about 1% unrated, and most movies are from the last 40 years.
+
+FIRST_NAMES = [
+    'Anna', 'Ben', 'Carla', 'David', 'Elena', 'Frank', 'Grace', 'Henry', 'Iris', 'Jack', 'Kate', 'Leo', 'Maria', 'Nick',
+    'Olivia', 'Paul', 'Quinn', 'Rosa', 'Sam', 'Tina', 'Umar', 'Vera', 'Will', 'Xena', 'Yusuf', 'Zoe', 'Penélope', 'José',
+]
+LAST_NAMES = [
+    'Adams', 'Baker', 'Cruz', 'Diaz', 'Evans', 'Fischer', 'García', 'Hughes', 'Ito', 'Jensen', 'Kowalski', 'Lopez', 'Müller',
+    'Novak', "O'Brien", 'Patel', 'Quinn', 'Rossi', 'Smith', 'Tanaka', 'Underwood', 'Varga', 'Walsh', 'Young', 'Zhang',
+]
+TITLE_WORDS = [
+    'Night', 'City', 'Last', 'Return', 'Dark', 'Love', 'Killer', 'House', 'King', 'Dream', 'Road', 'Blood', 'Summer', 'Ghost',
+    'Secret', 'Lost', 'New', 'York', 'Wild', 'Heart', 'Fire', 'Game', 'Day', 'River', 'Star', 'War', 'Family', 'Money',
+]
+BIO_WORDS = [
+    'born', 'raised', 'studied', 'acting', 'theatre', 'film', 'career', 'role', 'award', 'director', 'family', 'school',
+    'debut', 'television', 'series', 'critics', 'audiences', 'stage', 'comedy', 'drama', 'moved', 'city', 'famous', 'known',
+]
+# Genre popularity falls off like in the scraped data, a long tail of sub-genres follows the main ones.
+GENRES = [
+    'Drama', 'Comedy', 'Thriller', 'Action', 'Crime', 'Adventure', 'Romance', 'Mystery', 'Fantasy', 'Sci-Fi', 'Short', 'Family',
+    'Horror', 'Biography', 'History', 'Music', 'War', 'Sport', 'Animation', 'Western', 'Documentary', 'Musical',
+    'Psychological Drama', 'Dark Comedy', 'Gangster', 'Epic', 'Tragedy', 'Docudrama', 'True Crime', 'Period Drama',
+    'Satire', 'Slasher Horror', 'Space Sci-Fi', 'Buddy Comedy', 'Heist', 'Legal Drama', 'Political Thriller', 'Spy',
+]
+AWARDS = ['NBR Award', 'Golden Globe', 'Oscar', 'BAFTA Film Award', 'Saturn Award', 'Blockbuster Entertainment Award', 'ACCA', 'Emmy']
+AWARD_CATEGORIES = ['Best Actor', 'Best Actress', 'Best Supporting Actor', 'Best Supporting Actress', 'Best Cast', 'Favorite Actor', 'No Category']
+
+# Actor k (0-based) is picked with weight 1 / (k + 1) ** POPULARITY_EXPONENT.
+POPULARITY_EXPONENT = 0.8
+UNRATED_SHARE = 0.01
+UNKNOWN_YEAR_SHARE = 0.01
+# Movies per insert transaction, bounds the memory of large scales.
+CHUNK_SIZE = 50000
+
+def popularity_weights(count, exponent=POPULARITY_EXPONENT):
+    '''
+        Returns:
+            list[float]: cumulative weights of ranks 0..count-1 for random.choices(cum_weights=...)
+    '''
+    return list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+def skewed_cast(actor_count, movie_count, average_cast, rng):
+    '''
+        Casts drawn by actor popularity, sizes uniform between 1 and 2 * average_cast - 1.
+        Yields:
+            tuple: (movie_number, [actor_id, ...]) with numbers and ids starting at 1, every actor at most once per movie
+    '''
+    cumulative_weights = popularity_weights(actor_count)
+    actor_ids = range(1, actor_count + 1)
+    for movie_number in range(1, movie_count + 1):
+        cast_size = rng.randint(1, max(1, 2 * average_cast - 1))
+        yield movie_number, list(dict.fromkeys(rng.choices(actor_ids, cum_weights=cumulative_weights, k=cast_size)))
+
+def actor_name(index):
+    '''
+        Returns:
+            str: unique name of the index-th actor, e.g. "Anna Adams" or "Anna Adams 2"
+    '''
+    first_name = FIRST_NAMES[index % len(FIRST_NAMES)]
+    last_name = LAST_NAMES[(index // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    generation = index // (len(FIRST_NAMES) * len(LAST_NAMES))
+    return f'{first_name} {last_name}' if generation == 0 else f'{first_name} {last_name} {generation + 1}'
+
+def _sentence(rng, words, length):
+    sentence = ' '.join(rng.choice(words) for _ in range(length))
+    return sentence[0].upper() + sentence[1:] + '.'
+
+def _actor_rows(actor_count, rng):
+    for index in range(actor_count):
+        # Popular actors (low index) have longer biographies.
+        sentence_count = 2 + int(12 / (1 + index / 50))
+        actor_bio = ' '.join(_sentence(rng, BIO_WORDS, rng.randint(6, 16)) for _ in range(sentence_count))
+        yield actor_name(index), actor_bio, f'{IMDB_BASE_URL}/name/nm{index + 1:07d}/'
+
+def _movie_row(movie_number, rng, genre_weights):
+    movie_name = ' '.join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(1, 4)))
+    movie_rating = dm.UNRATED_MOVIE_RATING if rng.random() < UNRATED_SHARE else round(min(9.8, max(1.0, rng.gauss(6.4, 1.1))), 1)
+    movie_year = None if rng.random() < UNKNOWN_YEAR_SHARE else 1920 + int(105 * rng.betavariate(5, 1.5))
+    movie_genres = ', '.join(dict.fromkeys(rng.choices(GENRES, cum_weights=genre_weights, k=rng.randint(1, 7))))
+    return movie_name, movie_rating, movie_year, movie_genres, f'{IMDB_BASE_URL}/title/tt{movie_number:07d}/'
+
+def _award_rows(actor_count, award_count, rng):
+    cumulative_weights = popularity_weights(actor_count)
+    for actor_id in rng.choices(range(1, actor_count + 1), cum_weights=cumulative_weights, k=award_count):
+        yield actor_id, rng.choice(AWARDS), rng.choice(AWARD_CATEGORIES), rng.randint(1950, 2024)
+
+def generate_database(path, actor_count=1000, movie_count=20000, played_in_count=100000, award_count=None, seed=0):
+    '''
+        Replaces the database at path with synthetic data. played_in_count is reached on average,
+        duplicate picks within a cast are dropped. award_count defaults to 20 awards per actor.
+        Returns:
+            dict: {table: row_count, ..., 'seconds': generation time}
+    '''
+    rng = random.Random(seed)
+    award_count = award_count if award_count is not None else 20 * actor_count
+    average_cast = max(1, round(played_in_count / movie_count))
+    genre_weights = popularity_weights(len(GENRES), exponent=1.0)
+    started = time.perf_counter()
+    for suffix in ('', '-wal', '-shm', costar_graph_module.GRAPH_FILE_SUFFIX):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    shutil.rmtree(snapshot_module.snapshot_path(path), ignore_errors=True)
+
+    with dm.open_database(path, readonly=False):
+        dm.reset_database()
+        dm.insert_actors(_actor_rows(actor_count, rng))
+        dm.insert_awards(_award_rows(actor_count, award_count, rng))
+        casts = skewed_cast(actor_count, movie_count, average_cast, rng)
+        for _ in range(0, movie_count, CHUNK_SIZE):
+            chunk = list(itertools.islice(casts, CHUNK_SIZE))
+            movies = [_movie_row(movie_number, rng, genre_weights) for movie_number, _ in chunk]
+            with dm.transaction():
+                movie_ids = dm.insert_movies(movies)
+                # Staged like by the scraper, and in played_in as after materialize_played_in.
+                dm.insert_staging((actor_id, movie_name, movie_url) for (_, cast), (movie_name, _, _, _, movie_url) in zip(chunk, movies) for actor_id in cast)
+                dm.insert_played_in((actor_id, movie_id) for movie_id, (_, cast) in zip(movie_ids, chunk) for actor_id in cast)
+        with dm.transaction():
+            for actor_id, _, actor_link in dm.get_actor_links(stream=True):
+                for stage in ('bio', 'awards', 'movies'):
+                    dm.complete_scrape_job(actor_link, stage)
+            for _, _, movie_url in dm.get_all_movies(stream=True):
+                dm.complete_scrape_job(movie_url, 'metadata')
+        dm.refresh_actor_stats()
+        costar_graph_module.update_graph()
+        cursor = dm.get_connection().cursor()
+        counts = {}
+        for table in ('actors', 'movies', 'played_in', 'awards', 'actor_movie_staging', 'movie_genres'):
+            cursor.execute(f'SELECT COUNT(*) FROM {table}')
+            counts[table] = cursor.fetchone()[0]
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    counts['seconds'] = round(time.perf_counter() - started, 1)
+    return counts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a movies database with synthetic data at a given scale.')
+    parser.add_argument('database', type=str, help='Path of the database file, an existing file is replaced.')
+    parser.add_argument('--actors', type=int, default=1000, help='Number of actors.')
+    parser.add_argument('--movies', type=int, default=20000, help='Number of movies.')
+    parser.add_argument('--played-in', type=int, default=100000, help='Number of actor-movie relations.')
+    parser.add_argument('--awards', type=int, default=None, help='Number of awards (default: 20 per actor).')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed, the same seed writes the same data.')
+    args = parser.parse_args()
+
+    print(generate_database(args.database, args.actors, args.movies, args.played_in, args.awards, args.seed))
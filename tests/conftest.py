@@ -0,0 +1,45 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The modules live flat in the repository root and import each other by name.
+sys.path.insert(0, REPOSITORY_DIRECTORY)
+
+import database_module as dm
+
+REPOSITORY_DATABASE = os.path.join(REPOSITORY_DIRECTORY, 'movies.db')
+
+@pytest.fixture
+def scratch_database(tmp_path):
+    '''
+        Copy of the repository's movies.db, used as the configured database for the test.
+        Yields:
+            str: path of the copy
+    '''
+    path = str(tmp_path / 'movies.db')
+    shutil.copyfile(REPOSITORY_DATABASE, path)
+    with dm.open_database(path) as database_path:
+        yield database_path
+
+@pytest.fixture(scope='session')
+def _migrated_database_template(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('template') / 'movies.db')
+    shutil.copyfile(REPOSITORY_DATABASE, path)
+    with dm.open_database(path):
+        dm.get_connection()
+    return path
+
+@pytest.fixture
+def migrated_database(tmp_path, _migrated_database_template):
+    '''
+        Like scratch_database, but already upgraded to the current schema.
+        Yields:
+            str: path of the copy
+    '''
+    path = str(tmp_path / 'movies.db')
+    shutil.copyfile(_migrated_database_template, path)
+    with dm.open_database(path) as database_path:
+        yield database_path
@@ -0,0 +1,13 @@
+import database_module as dm
+import synthetic_database_module
+
+def test_migrated_database_uses_indexes(scratch_database):
+    connection = dm.get_connection()
+    assert connection.execute('PRAGMA user_version').fetchone()[0] == dm.SCHEMA_VERSION
+    assert dm.check_query_plans() == {}
+
+def test_generated_database_uses_indexes(tmp_path):
+    path = str(tmp_path / 'synthetic.db')
+    synthetic_database_module.generate_database(path, actor_count=50, movie_count=200, played_in_count=1000)
+    with dm.open_database(path):
+        assert dm.check_query_plans() == {}
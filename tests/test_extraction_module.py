@@ -0,0 +1,24 @@
+import extraction_module
+
+TITLE_BLOCK = (
+    '<div class="sc-hero"><h1 data-testid="hero__pageTitle"><span class="hero__primary-text">Heat</span></h1>'
+    '<ul class="ipc-inline-list"><li><img src="poster.png"><br/></li>'
+    '<li><a href="/title/tt0113277/releaseinfo/?ref_=tt_ov_rdat">1995</a></li><li>2h 50m</li></ul></div>'
+)
+OTHER_RELEASE_LINK = '<section data-testid="more-like-this"><a href="/title/tt0110912/releaseinfo/">1994</a></section>'
+
+def test_year_comes_from_the_title_block():
+    metadata = extraction_module.extract_movie_metadata(OTHER_RELEASE_LINK + TITLE_BLOCK + OTHER_RELEASE_LINK)
+    assert metadata.movie_year == 1995
+
+def test_no_year_when_the_title_block_has_none():
+    title_block = '<div class="sc-hero"><h1 data-testid="hero__pageTitle"><span>Heat</span></h1><ul><li>2h 50m</li></ul></div>'
+    metadata = extraction_module.extract_movie_metadata(title_block + OTHER_RELEASE_LINK)
+    assert metadata.movie_year is None
+
+def test_rating_and_genres():
+    movie_html = TITLE_BLOCK + (
+        '<div data-testid="hero-rating-bar__aggregate-rating__score"><span>8.3</span><span>/10</span></div>'
+        '<div data-testid="interests"><a href="/interest/in1/"><span>Crime</span></a><a href="/interest/in2/"><span>Drama</span></a></div>'
+    )
+    assert extraction_module.extract_movie_metadata(movie_html) == (1995, 8.3, ['Crime', 'Drama'])
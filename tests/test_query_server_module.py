@@ -0,0 +1,78 @@
+import http.client
+import json
+import socket
+import time
+
+import pytest
+
+import query_server_module
+
+@pytest.fixture
+def server_port(migrated_database):
+    with query_server_module.serve_queries(workers=2) as base_url:
+        yield int(base_url.rsplit(':', 1)[1])
+
+def post(connection, path, body):
+    connection.request('POST', path, json.dumps(body), {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+def test_unknown_endpoint_is_404_and_bad_arguments_are_400(server_port):
+    connection = http.client.HTTPConnection('127.0.0.1', server_port, timeout=5)
+    assert post(connection, '/nope', {})[0] == 404
+    assert post(connection, '/query', {'query': 'Al Pacino --bogus'})[0] == 400
+    assert post(connection, '/movies', {'actor_name': 'Al Pacino', 'limit': 0})[0] == 400
+    status, body = post(connection, '/movies', {'actor_name': 'Al Pacino', 'after': 5})
+    assert status == 400
+    assert 'after' in json.dumps(body)
+    assert post(connection, '/movies', {'actor_name': 'Al Pacino', 'limit': 1})[0] == 200
+
+def test_idle_and_partial_connections_do_not_hold_workers(server_port):
+    idle_connections = [http.client.HTTPConnection('127.0.0.1', server_port, timeout=5) for _ in range(5)]
+    for connection in idle_connections:
+        assert post(connection, '/bio', {'actor_name': 'Al Pacino'})[0] == 200
+    partial_sockets = [socket.create_connection(('127.0.0.1', server_port)) for _ in range(3)]
+    for partial_socket in partial_sockets:
+        partial_socket.sendall(b'POST /bio HTTP/1.1\r\nHost: localhost\r\nContent-Length: 40\r\n\r\n{"actor')
+    try:
+        # More idle and stalled connections than workers, a new client is still served right away.
+        started = time.perf_counter()
+        connection = http.client.HTTPConnection('127.0.0.1', server_port, timeout=5)
+        assert post(connection, '/movies', {'actor_name': 'Al Pacino', 'limit': 1})[0] == 200
+        assert time.perf_counter() - started < 1
+        assert all(post(connection, '/bio', {'actor_name': 'Al Pacino'})[0] == 200 for connection in idle_connections)
+    finally:
+        for partial_socket in partial_sockets:
+            partial_socket.close()
+
+def read_responses(client_socket, count):
+    '''
+        Returns:
+            list[tuple]: [(status_line, body), ...] of the next count responses on the socket
+    '''
+    buffer = b''
+    responses = []
+    while len(responses) < count:
+        header_end = buffer.find(b'\r\n\r\n')
+        if header_end >= 0:
+            header_lines = buffer[:header_end].split(b'\r\n')
+            headers = dict(line.split(b': ', 1) for line in header_lines[1:])
+            body_end = header_end + 4 + int(headers[b'Content-Length'])
+            if len(buffer) >= body_end:
+                responses.append((header_lines[0], buffer[header_end + 4:body_end]))
+                buffer = buffer[body_end:]
+                continue
+        data = client_socket.recv(65536)
+        assert data != b'', 'connection closed early'
+        buffer += data
+    return responses
+
+def test_pipelined_requests_are_answered_in_order(server_port):
+    body = b'{"actor_name": "Al Pacino"}'
+    requests = b'GET /health HTTP/1.1\r\nHost: localhost\r\n\r\n' * 3
+    requests += b'POST /bio HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body)
+    with socket.create_connection(('127.0.0.1', server_port), timeout=5) as client_socket:
+        client_socket.sendall(requests)
+        responses = read_responses(client_socket, 4)
+    assert [status_line for status_line, _ in responses] == [b'HTTP/1.1 200 OK'] * 4
+    assert json.loads(responses[3][1])['results'][0]['command'] == 'bio'
@@ -0,0 +1,75 @@
+import requests
+from selenium.common.exceptions import TimeoutException
+
+from scraping_pool_module import ScrapeWorkerPool
+
+class FakeFetcher:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class FlakyTask:
+    '''
+        Raises the given errors on its first calls, then returns the fetcher it ran on.
+    '''
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, fetcher=None):
+        self.calls += 1
+        if len(self.errors) > 0:
+            raise self.errors.pop(0)
+        return fetcher
+
+def run_tasks(pool, *scrape_functions):
+    return {key: (result, error) for key, result, error in pool.run((index, scrape_function, ()) for index, scrape_function in enumerate(scrape_functions))}
+
+def test_retryable_errors_are_retried_on_the_same_fetcher():
+    fetchers = []
+    task = FlakyTask(requests.Timeout(), TimeoutException())
+    with ScrapeWorkerPool(1, lambda: fetchers.append(FakeFetcher()) or fetchers[-1], max_retries=2) as pool:
+        results = run_tasks(pool, task)
+    assert results == {0: (fetchers[0], None)}
+    assert task.calls == 3
+    assert len(fetchers) == 1
+
+def test_retries_are_capped_and_the_worker_replaces_its_fetcher():
+    fetchers = []
+    failing_task = FlakyTask(*(requests.ConnectionError() for _ in range(3)))
+    next_task = FlakyTask()
+    with ScrapeWorkerPool(1, lambda: fetchers.append(FakeFetcher()) or fetchers[-1], max_retries=1) as pool:
+        results = run_tasks(pool, failing_task, next_task)
+        assert failing_task.calls == 2
+        assert isinstance(results[0][1], requests.ConnectionError)
+        # The next task ran on a new fetcher.
+        assert results[1] == (fetchers[1], None)
+    assert all(fetcher.closed for fetcher in fetchers)
+
+def test_shared_fetcher_is_closed_only_with_the_pool():
+    shared_fetcher = FakeFetcher()
+    with ScrapeWorkerPool(2, lambda: shared_fetcher, max_retries=0) as pool:
+        results = run_tasks(pool, FlakyTask(TimeoutException()), *(FlakyTask() for _ in range(4)))
+        assert isinstance(results[0][1], TimeoutException)
+        assert all(results[index] == (shared_fetcher, None) for index in range(1, 5))
+        assert not shared_fetcher.closed
+    assert shared_fetcher.closed
+
+def test_other_errors_are_not_retried():
+    task = FlakyTask(ValueError('no such element'))
+    with ScrapeWorkerPool(1, FakeFetcher, max_retries=3) as pool:
+        results = run_tasks(pool, task)
+    assert isinstance(results[0][1], ValueError)
+    assert task.calls == 1
+
+def test_fetcher_factory_errors_are_reported_per_task():
+    def broken_factory():
+        raise RuntimeError('no browser')
+    with ScrapeWorkerPool(2, broken_factory) as pool:
+        results = run_tasks(pool, FlakyTask(), FlakyTask())
+    assert sorted(results) == [0, 1]
+    assert all(isinstance(error, RuntimeError) for _, error in results.values())
@@ -0,0 +1,71 @@
+import pytest
+
+import database_module as dm
+import extraction_module
+import web_scraping_module
+from fetch_module import RequestsFetcher
+from fixture_server_module import serve_directory, write_fixture_site
+from scraping_pool_module import ScrapeWorkerPool
+
+class FixtureBrowser(RequestsFetcher):
+    '''
+        Stands in for a SeleniumFetcher, the fixture pages are already scrolled and expanded.
+        Records every url it fetches.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.fetched_urls = []
+
+    def fetch(self, url, interact=None):
+        self.fetched_urls.append(url)
+        return super().fetch(url)
+
+@pytest.fixture
+def fixture_site(tmp_path, monkeypatch):
+    '''
+        Yields:
+            str: url of the actor list of a 5-actor fixture site, served on localhost
+    '''
+    list_path = write_fixture_site(str(tmp_path / 'site'), actor_count=5, movie_count=50, movies_per_actor=15, awards_per_actor=4)
+    with serve_directory(str(tmp_path / 'site')) as base_url:
+        monkeypatch.setattr(extraction_module, 'IMDB_BASE_URL', base_url)
+        with dm.open_database(str(tmp_path / 'movies.db')):
+            dm.reset_database()
+            yield base_url + list_path
+
+def run_pipeline(list_url):
+    '''
+        Runs every stage like web_scraping_module's main, without refreshes.
+        Returns:
+            list[str]: fetched urls
+    '''
+    fetcher = FixtureBrowser()
+    with ScrapeWorkerPool(2, lambda: fetcher) as pool:
+        listed_actors = web_scraping_module.scrape_actors(list_url, fetcher=fetcher)
+        web_scraping_module.run_bio_stage(pool, listed_actors, None, 5)
+        actors = dm.get_actor_links()
+        web_scraping_module.run_awards_stage(pool, actors, None, 5)
+        web_scraping_module.run_movies_stage(pool, actors, None, 5)
+        web_scraping_module.run_metadata_stage(pool, None, 5)
+    dm.materialize_played_in()
+    dm.refresh_actor_stats()
+    return fetcher.fetched_urls
+
+def table_counts():
+    connection = dm.get_connection()
+    return {table: connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in ('actors', 'movies', 'played_in', 'awards')}
+
+def test_pipeline_scrapes_the_fixture_site(fixture_site):
+    run_pipeline(fixture_site)
+    assert table_counts() == {'actors': 5, 'movies': 42, 'played_in': 75, 'awards': 11}
+    jobs = dm.get_connection().execute('SELECT stage, status, COUNT(*) FROM scrape_jobs GROUP BY stage, status ORDER BY stage').fetchall()
+    assert jobs == [('awards', 'done', 5), ('bio', 'done', 5), ('metadata', 'done', 42), ('movies', 'done', 5)]
+
+def test_second_run_is_a_no_op(fixture_site):
+    run_pipeline(fixture_site)
+    counts = table_counts()
+    fetched_urls = run_pipeline(fixture_site)
+    assert table_counts() == counts
+    # Only the actor list is read again, every stage is done.
+    assert fetched_urls == [fixture_site]
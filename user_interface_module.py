@@ -1,10 +1,40 @@
 import argparse
+import concurrent.futures
+import csv
+import itertools
+import json
 import shlex
+import sys
+import threading
+from typing import NamedTuple, Optional
 
+import costar_graph_module
 import database_module as dm
+import query_cache_module
+
+class QueryParser(argparse.ArgumentParser):
+    '''
+        Parser of query lines. Errors and --help raise ValueError with argparse's text instead of printing
+        it and exiting, so the interactive mode, the batch output and the query server report it themselves.
+    '''
+
+    def error(self, message):
+        raise ValueError(f'Invalid query: {message}')
+
+    def print_help(self, file=None):
+        raise ValueError(self.format_help().rstrip())
+
+def positive_int(value):
+    '''
+        argparse type of --limit: a page has at least one row.
+    '''
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive number')
+    return number
 
 def parse_arguments():
-    parser = argparse.ArgumentParser(
+    parser = QueryParser(
         description='''General command line structure: [first_name] [last_name] [argument] [--limit n] -
                     Note that in order to use --actor you have to provide "None" for first and last name.'''
     )
@@ -15,133 +45,496 @@ def parse_arguments():
     parser.add_argument('--bio', action='store_true', help='Retrieve biography information for a given actor. ~ [first_name] [last_name] --bio')
     parser.add_argument('--movies', action='store_true', help='Retrieve all movies for a given actor. ~ [first_name] [last_name] --movies')
     parser.add_argument('--awards', action='store_true', help='Retrieve all awards for a given actor. ~ [first_name] [last_name] --awards')
-    parser.add_argument('--genres', action='store_true', help='Retrieve the genre for a given actor. ~ [first_name] [last_name] --genres')
+    parser.add_argument('--genres', action='store_true', help='Retrieve the genres of a given actor, most frequent first. ~ [first_name] [last_name] --genres')
+    parser.add_argument('--genre-stats', action='store_true', help='Retrieve movie count and average rating of every genre. ~ None None --genre-stats')
     parser.add_argument('--ratings', action='store_true', help='Retrieve avg and overall movie rating for a given actor. ~ [first_name] [last_name] --ratings')
     parser.add_argument('--topfive', action='store_true', help='Retrieve top 5 movies for a given actor. ~ [first_name] [last_name] --topfive')
-    parser.add_argument('--limit', type=int, default=None, help='Limit the number of items to retrieve. ~ [first_name] [last_name] [argument] --limit n')
+    parser.add_argument('--costars', action='store_true', help='Retrieve the actors a given actor shared the most movies with. ~ [first_name] [last_name] --costars')
+    parser.add_argument('--path', type=str, default=None, help='Retrieve the shortest chain of shared movies to another actor. ~ [first_name] [last_name] --path "Other Actor"')
+    parser.add_argument('--search', type=str, default=None, help='Full-text search over actor names, biographies and movie titles. ~ None None --search "words"')
+    parser.add_argument('--limit', type=positive_int, default=None, help='Limit the number of items to retrieve. ~ [first_name] [last_name] [argument] --limit n')
+    parser.add_argument('--after', type=str, default=None, help='Continue --actors, --movies or --awards after the cursor printed with the previous page. ~ [first_name] [last_name] [argument] --limit n --after cursor')
 
     return parser
 
-def process_actors(args):
-    print('\nAll available actors:')
-    result = dm.get_all_actors()
-    for index, (_, name) in enumerate(result):
-        print(f'\t{index + 1}. {name}')
-
-def get_actor_id(args):
-    result = dm.get_all_actors()
-    actor_ids = [actor_id for actor_id, actor_name in result if actor_name == f'{args.first_name} {args.last_name}']
-    if len(actor_ids) < 1:
-        print(f'\t{args.first_name} {args.last_name} is not a valid actor or actress.')
-        return None
-    actor_id = actor_ids[0]
-    return actor_id
-
-def process_bio(args):
-    print(f'\nBiography of {args.first_name} {args.last_name}:')
-    actor_id = get_actor_id(args)
-    if actor_id is None:
-        return
+# Sessions ask about the same few actors again and again, their reads are served from here
+# until the database changes.
+query_cache = query_cache_module.QueryCache()
 
-    result = dm.get_actor_bio(actor_id)
-    print(result[0])
+class QueryResult(NamedTuple):
+    '''
+        Result of one command of a query line: rows are dicts with the fields of ROW_FIELDS[command],
+        summary holds per-command values that are not rows (e.g. the overall rating).
+    '''
+    command: str
+    actor_name: Optional[str]
+    rows: list
+    summary: Optional[dict] = None
+    next_after: Optional[str] = None
+    error: Optional[str] = None
 
-def process_movies(args):
-    print(f'\nMovies of {args.first_name} {args.last_name}:')
-    actor_id = get_actor_id(args)
-    if actor_id is None:
-        return
+ROW_FIELDS = {
+    'unknown_actor': ('actor_id', 'actor_name'),
+    'actors': ('actor_id', 'actor_name'),
+    'genre_stats': ('movie_genre', 'movie_count', 'average_rating'),
+    'search': ('kind', 'entity_id', 'name', 'snippet', 'score'),
+    'bio': ('actor_bio', ),
+    'movies': ('movie_id', 'movie_name', 'movie_year'),
+    'awards': ('awards_id', 'award_name', 'award_year'),
+    'genres': ('movie_genre', 'movie_count'),
+    'ratings': ('movie_year', 'average_rating', 'min_rating', 'max_rating', 'movie_count'),
+    'topfive': ('movie_id', 'movie_name', 'movie_rating', 'movie_year', 'movie_genre'),
+    'costars': ('actor_id', 'actor_name', 'shared_movie_count'),
+    'path': ('actor_id', 'actor_name', 'movie_id', 'movie_name', 'movie_year', 'costar_id', 'costar_name'),
+}
 
-    result = dm.get_actor_movies(actor_id)
-    for index, (_, _, movie_name, _, movie_year, _, _) in enumerate(result):
-        if args.limit is not None and index >= args.limit:
-            break
-        print(f'\t{index + 1}. {movie_name} ({movie_year})')
+def actor_name_of(args):
+    return f'{args.first_name} {args.last_name}'
 
-def process_awards(args):
-    print(f'\nAwards of {args.first_name} {args.last_name}:')
-    actor_id = get_actor_id(args)
-    if actor_id is None:
-        return
+def needs_actor(args):
+    return any([args.bio, args.movies, args.awards, args.genres, args.ratings, args.topfive, args.costars, args.path is not None])
 
-    result = dm.get_actor_awards(actor_id)
-    for index, (_, _, award_name, _, award_year) in enumerate(result):
-        if args.limit is not None and index >= args.limit:
-            break
-        print(f'\t{index + 1}. {award_name} ({award_year})')
+def next_page_cursor(args, row_count, last_key):
+    '''
+        Returns:
+            str | None: cursor of the next page, None after the last page (or an empty one)
+    '''
+    if args.limit is not None and row_count > 0 and row_count == args.limit:
+        return dm.encode_cursor(last_key)
+    return None
 
-def process_genres(args):
-    print(f'\nGenres of {args.first_name} {args.last_name}:')
-    actor_id = get_actor_id(args)
-    if actor_id is None:
-        return
+def next_page_lines(args, result):
+    if result.next_after is not None:
+        return [f'\tMore results: --limit {args.limit} --after {result.next_after}']
+    return []
 
-    result = dm.get_actor_genres(actor_id)
-    movie_genres = []
-    for index, (movie_genre, ) in enumerate(result):
-        movie_genres += movie_genre.split(', ')
-    movie_genres = list(set(movie_genres))
+# Data functions: one per command, they query the database and return a QueryResult.
 
-    for index, movie_genre in enumerate(movie_genres):
-        if args.limit is not None and index >= args.limit:
-            break
-        print(f'\t{index + 1}. {movie_genre}')
+def query_actors(args):
+    rows = [{'actor_id': actor_id, 'actor_name': name} for actor_id, name in query_cache.call(dm.get_all_actors, limit=args.limit, after=args.after)]
+    return QueryResult('actors', None, rows, next_after=next_page_cursor(args, len(rows), rows[-1]['actor_id'] if rows else None))
 
-def process_ratings(args):
-    print(f'\nMovie Ratings (Overall and Yearly) of {args.first_name} {args.last_name}:')
-    actor_id = get_actor_id(args)
-    if actor_id is None:
-        return
+def query_unknown_actor(command, actor_name):
+    '''
+        Returns:
+            QueryResult: error result whose rows are up to 5 actors with a similar name
+    '''
+    suggestions = query_cache.call(dm.find_actors_by_prefix, actor_name, limit=5)
+    rows = [{'actor_id': actor_id, 'actor_name': suggested_name} for actor_id, suggested_name in suggestions]
+    return QueryResult(command, actor_name, rows, error=f'{actor_name} is not a valid actor or actress.')
+
+def query_bio(args, actor_id):
+    return QueryResult('bio', actor_name_of(args), [{'actor_bio': query_cache.call(dm.get_actor_bio, actor_id)[0]}])
+
+def query_movies(args, actor_id):
+    rows = [
+        {'movie_id': movie_id, 'movie_name': movie_name, 'movie_year': movie_year}
+        for _, movie_id, movie_name, _, movie_year, _, _ in query_cache.call(dm.get_actor_movies, actor_id, limit=args.limit, after=args.after)
+    ]
+    return QueryResult('movies', actor_name_of(args), rows, next_after=next_page_cursor(args, len(rows), rows[-1]['movie_id'] if rows else None))
+
+def query_awards(args, actor_id):
+    rows = [
+        {'awards_id': awards_id, 'award_name': award_name, 'award_year': award_year}
+        for awards_id, _, award_name, _, award_year in query_cache.call(dm.get_actor_awards, actor_id, limit=args.limit, after=args.after)
+    ]
+    return QueryResult('awards', actor_name_of(args), rows, next_after=next_page_cursor(args, len(rows), rows[-1]['awards_id'] if rows else None))
+
+def query_genres(args, actor_id):
+    rows = [{'movie_genre': movie_genre, 'movie_count': movie_count} for movie_genre, movie_count, _ in query_cache.call(dm.get_actor_genre_counts, actor_id, limit=args.limit)]
+    return QueryResult('genres', actor_name_of(args), rows)
 
-    result = dm.get_actor_movies_average_rating(actor_id)
-    avg_movie_rating = result[0]
-    print(f'\tAverage overall movie rating: {round(avg_movie_rating, 2)}')
+def query_genre_stats(args):
+    rows = [
+        {'movie_genre': movie_genre, 'movie_count': movie_count, 'average_rating': avg_movie_rating}
+        for movie_genre, movie_count, avg_movie_rating in query_cache.call(dm.get_genre_stats, limit=args.limit)
+    ]
+    return QueryResult('genre_stats', None, rows)
 
-    result = dm.get_actor_movies(actor_id)
-    year_to_rating_map = {}
-    for index, (_, _, movie_name, movie_rating, movie_year, _, _) in enumerate(result):
-        if movie_year in list(year_to_rating_map.keys()):
-            year_to_rating_map[movie_year].append(float(movie_rating))
+costar_graph = None
+costar_graph_lock = threading.Lock()
+
+def get_costar_graph():
+    '''
+        The graph is loaded once per session, later commands only patch in new played_in changes.
+        Returns a snapshot so a query taken by a batch worker is not affected by another worker
+        patching in changes while it runs.
+    '''
+    global costar_graph
+    with costar_graph_lock:
+        if costar_graph is None:
+            costar_graph = costar_graph_module.load_graph()
         else:
-            year_to_rating_map[movie_year] = [float(movie_rating)]
-    for index, movie_year in enumerate(list(year_to_rating_map.keys())):
-        if args.limit is not None and index >= args.limit:
-            break
-        print(f'\tAverage movie rating in year {movie_year}: {round(sum(year_to_rating_map[movie_year])/len(year_to_rating_map[movie_year]), 2)}')
+            costar_graph.apply_changes()
+        return costar_graph.snapshot()
+
+def query_costars(args, actor_id):
+    costars = get_costar_graph().top_costars(actor_id, limit=args.limit if args.limit is not None else 10)
+    actor_names = dict(query_cache.call(dm.get_actors, [costar_id for costar_id, _ in costars]))
+    rows = [
+        {'actor_id': costar_id, 'actor_name': actor_names.get(costar_id), 'shared_movie_count': shared_movie_count}
+        for costar_id, shared_movie_count in costars
+    ]
+    return QueryResult('costars', actor_name_of(args), rows)
+
+def query_path(args, actor_id, other_actor_id):
+    '''
+        other_actor_id: id of the actor named by --path, None if there is no such actor
+        Returns:
+            QueryResult: one row per shared movie along the path, summary {'degrees': int | None},
+            degrees is None if the actors are not connected
+    '''
+    if other_actor_id is None:
+        return query_unknown_actor('path', args.path)
+    path = get_costar_graph().shortest_path(actor_id, other_actor_id)
+    if path is None:
+        return QueryResult('path', actor_name_of(args), [], summary={'degrees': None})
+    actor_names = dict(query_cache.call(dm.get_actors, path[0::2]))
+    movies = {movie_id: (movie_name, movie_year) for movie_id, movie_name, _, movie_year, _, _ in query_cache.call(dm.get_movies, path[1::2])}
+    rows = []
+    for index in range(0, len(path) - 1, 2):
+        movie_name, movie_year = movies.get(path[index + 1], (None, None))
+        rows.append({
+            'actor_id': path[index], 'actor_name': actor_names.get(path[index]),
+            'movie_id': path[index + 1], 'movie_name': movie_name, 'movie_year': movie_year,
+            'costar_id': path[index + 2], 'costar_name': actor_names.get(path[index + 2]),
+        })
+    return QueryResult('path', actor_name_of(args), rows, summary={'degrees': len(path) // 2})
+
+def query_search(args):
+    rows = [
+        {'kind': kind, 'entity_id': entity_id, 'name': name, 'snippet': ' '.join(snippet.split()), 'score': score}
+        for kind, entity_id, name, snippet, score in query_cache.call(dm.search, args.search, limit=args.limit if args.limit is not None else 10)
+    ]
+    return QueryResult('search', None, rows)
+
+def query_ratings(args, actor_id):
+    '''
+        Returns:
+            QueryResult: one row per year, summary {'average_rating': float | None, 'rated_movie_count': int}
+    '''
+    stats = query_cache.call(dm.get_actor_stats, actor_id)
+    if stats is None or stats.rated_movie_count == 0:
+        return QueryResult('ratings', actor_name_of(args), [], summary={'average_rating': None, 'rated_movie_count': 0})
+    rows = [
+        {'movie_year': movie_year, 'average_rating': year_avg_rating, 'min_rating': year_min_rating, 'max_rating': year_max_rating, 'movie_count': year_movie_count}
+        for movie_year, year_avg_rating, year_min_rating, year_max_rating, year_movie_count in stats.yearly_ratings[:args.limit]
+    ]
+    return QueryResult('ratings', actor_name_of(args), rows, summary={'average_rating': stats.average_rating, 'rated_movie_count': stats.rated_movie_count})
+
+def query_topfive(args, actor_id):
+    stats = query_cache.call(dm.get_actor_stats, actor_id)
+    top_movie_ids = stats.top_movie_ids[:args.limit] if stats is not None else []
+    rows = [
+        {'movie_id': movie_id, 'movie_name': movie_name, 'movie_rating': movie_rating, 'movie_year': movie_year, 'movie_genre': movie_genre}
+        for movie_id, movie_name, movie_rating, movie_year, movie_genre, _ in query_cache.call(dm.get_movies, top_movie_ids)
+    ]
+    return QueryResult('topfive', actor_name_of(args), rows)
+
+def resolve_actor_ids(queries):
+    '''
+        Looks up the actors of all parsed query lines (their own actor and the --path actor) in one go.
+        Returns:
+            dict: {actor_name: actor_id}
+    '''
+    actor_names = set()
+    for args in queries:
+        if needs_actor(args):
+            actor_names.add(actor_name_of(args))
+        if args.path is not None:
+            actor_names.add(args.path)
+    return query_cache.call(dm.find_actor_ids, actor_names)
 
-def process_topfive(args):
-    print(f'\nTop 5 movies of {args.first_name} {args.last_name}:')
-    actor_id = get_actor_id(args)
+def run_query(args, actor_ids):
+    '''
+        Runs every command of one parsed query line, in the order they are printed.
+        actor_ids: {actor_name: actor_id} of resolve_actor_ids
+        Returns:
+            list[QueryResult]: results
+    '''
+    results = []
+    if args.actors:
+        results.append(query_actors(args))
+    if args.genre_stats:
+        results.append(query_genre_stats(args))
+    if args.search is not None:
+        results.append(query_search(args))
+    if not needs_actor(args):
+        return results
+    actor_id = actor_ids.get(actor_name_of(args))
     if actor_id is None:
-        return
-    
-    result = dm.get_actor_top_five_movies(actor_id)
-    for index, (_, movie_name, movie_rating, movie_year, movie_genre, _, _) in enumerate(result):
-        if args.limit is not None and index >= args.limit:
-            break
-        print(f'\t{movie_rating}: {movie_name} ({movie_year}) - {movie_genre}')
-    
-if __name__ == '__main__':
+        results.append(query_unknown_actor('unknown_actor', actor_name_of(args)))
+        return results
+    if args.bio:
+        results.append(query_bio(args, actor_id))
+    if args.movies:
+        results.append(query_movies(args, actor_id))
+    if args.awards:
+        results.append(query_awards(args, actor_id))
+    if args.genres:
+        results.append(query_genres(args, actor_id))
+    if args.ratings:
+        results.append(query_ratings(args, actor_id))
+    if args.topfive:
+        results.append(query_topfive(args, actor_id))
+    if args.costars:
+        results.append(query_costars(args, actor_id))
+    if args.path is not None:
+        results.append(query_path(args, actor_id, actor_ids.get(args.path)))
+    return results
+
+# Formatters: one per command, they turn a QueryResult into the lines of the interactive mode.
+
+def format_unknown_actor(args, result):
+    lines = [f'\t{result.error}']
+    if len(result.rows) > 0:
+        lines.append(f'\tDid you mean: {", ".join(row["actor_name"] for row in result.rows)}?')
+    return lines
+
+def format_actors(args, result):
+    lines = ['\nAll available actors:']
+    lines += [f'\t{index + 1}. {row["actor_name"]}' for index, row in enumerate(result.rows)]
+    return lines + next_page_lines(args, result)
+
+def format_bio(args, result):
+    return [f'\nBiography of {result.actor_name}:', result.rows[0]['actor_bio']]
+
+def format_movies(args, result):
+    lines = [f'\nMovies of {result.actor_name}:']
+    lines += [f'\t{index + 1}. {row["movie_name"]} ({row["movie_year"]})' for index, row in enumerate(result.rows)]
+    return lines + next_page_lines(args, result)
+
+def format_awards(args, result):
+    lines = [f'\nAwards of {result.actor_name}:']
+    lines += [f'\t{index + 1}. {row["award_name"]} ({row["award_year"]})' for index, row in enumerate(result.rows)]
+    return lines + next_page_lines(args, result)
+
+def format_genres(args, result):
+    lines = [f'\nGenres of {result.actor_name}:']
+    return lines + [f'\t{index + 1}. {row["movie_genre"]} ({row["movie_count"]} movies)' for index, row in enumerate(result.rows)]
+
+def format_genre_stats(args, result):
+    lines = ['\nGenres of all movies:']
+    for index, row in enumerate(result.rows):
+        avg_movie_rating = round(row['average_rating'], 2) if row['average_rating'] is not None else 'n/a'
+        lines.append(f'\t{index + 1}. {row["movie_genre"]} ({row["movie_count"]} movies, average rating {avg_movie_rating})')
+    return lines
+
+def format_costars(args, result):
+    lines = [f'\nCo-stars of {result.actor_name}:']
+    return lines + [f'\t{index + 1}. {row["actor_name"]} ({row["shared_movie_count"]} movies together)' for index, row in enumerate(result.rows)]
+
+def format_path(args, result):
+    lines = [f'\nPath from {actor_name_of(args)} to {args.path}:']
+    if result.error is not None:
+        return lines + format_unknown_actor(args, result)
+    if result.summary['degrees'] is None:
+        return lines + ['\tThe actors are not connected through shared movies.']
+    lines.append(f'\t{result.summary["degrees"]} degrees of separation')
+    return lines + [f'\t{row["actor_name"]} and {row["costar_name"]} in {row["movie_name"]} ({row["movie_year"]})' for row in result.rows]
+
+def format_search(args, result):
+    lines = [f'\nSearch results for "{args.search}":']
+    if len(result.rows) == 0:
+        lines.append('\tNo matches.')
+    return lines + [f'\t{index + 1}. {row["name"]} ({row["kind"]}): {row["snippet"]}' for index, row in enumerate(result.rows)]
+
+def format_ratings(args, result):
+    lines = [f'\nMovie Ratings (Overall and Yearly) of {result.actor_name}:']
+    if result.summary['rated_movie_count'] == 0:
+        return lines + ['\tNo rated movies.']
+    lines.append(f'\tAverage overall movie rating: {round(result.summary["average_rating"], 2)} ({result.summary["rated_movie_count"]} rated movies)')
+    for row in result.rows:
+        movie_year = row['movie_year'] if row['movie_year'] is not None else 'unknown'
+        lines.append(f'\tAverage movie rating in year {movie_year}: {round(row["average_rating"], 2)} (min {row["min_rating"]}, max {row["max_rating"]}, {row["movie_count"]} movies)')
+    return lines
+
+def format_topfive(args, result):
+    lines = [f'\nTop 5 movies of {result.actor_name}:']
+    return lines + [f'\t{row["movie_rating"]}: {row["movie_name"]} ({row["movie_year"]}) - {row["movie_genre"]}' for row in result.rows]
+
+FORMATTERS = {
+    'unknown_actor': format_unknown_actor,
+    'actors': format_actors,
+    'genre_stats': format_genre_stats,
+    'search': format_search,
+    'bio': format_bio,
+    'movies': format_movies,
+    'awards': format_awards,
+    'genres': format_genres,
+    'ratings': format_ratings,
+    'topfive': format_topfive,
+    'costars': format_costars,
+    'path': format_path,
+}
+
+def print_result(args, result):
+    print('\n'.join(FORMATTERS[result.command](args, result)))
+
+def parse_query(parser, query_string):
+    '''
+        Returns:
+            argparse.Namespace: parsed query line
+        Raises:
+            ValueError: if the line is not a valid query (with argparse's message, or the help for --help)
+                or its --after cursor is invalid
+    '''
+    args = parser.parse_args(shlex.split(query_string))
+    if args.after is not None:
+        dm.decode_cursor(args.after)
+    return args
+
+def run_interactive():
     parser = parse_arguments()
     while True:
         input_string = input('Please provide a actors name or use --help to get information about possible functions (Write Q to quit):\n\t')
         if input_string == 'Q':
             break
-        args = parser.parse_args(shlex.split(input_string))
-        if args.actors:
-            process_actors(args)
-        if args.bio:
-            process_bio(args)
-        if args.movies:
-            process_movies(args)
-        if args.awards:
-            process_awards(args)
-        if args.genres:
-            process_genres(args)
-        if args.ratings:
-            process_ratings(args)
-        if args.topfive:
-            process_topfive(args)
-
-    dm.conn.commit()
-    dm.conn.close()
\ No newline at end of file
+        try:
+            args = parse_query(parser, input_string)
+        except ValueError as e:
+            print(f'\t{e}')
+            continue
+        for result in run_query(args, resolve_actor_ids([args])):
+            print_result(args, result)
+
+# Batch mode: query lines are read in chunks, the actors of a chunk are resolved with one lookup,
+# and each result is written as soon as its query line is done, in input order.
+
+BATCH_CHUNK_SIZE = 500
+CSV_FIELDS = ['line', 'command', 'query_actor', 'error', 'next_after'] + list(dict.fromkeys(field for fields in ROW_FIELDS.values() for field in fields))
+
+def read_query_lines(query_file):
+    '''
+        Skips blank lines and lines starting with #.
+        Yields:
+            tuple: (line_number, query_string)
+    '''
+    for line_number, line in enumerate(query_file, start=1):
+        query_string = line.strip()
+        if query_string != '' and not query_string.startswith('#'):
+            yield line_number, query_string
+
+def run_batch_line(line_number, query_string, args_or_error, actor_ids):
+    '''
+        Returns:
+            tuple: (line_number, query_string, [QueryResult, ...])
+    '''
+    if isinstance(args_or_error, ValueError):
+        return line_number, query_string, [QueryResult('invalid_query', None, [], error=str(args_or_error))]
+    return line_number, query_string, run_query(args_or_error, actor_ids)
+
+def result_record(result):
+    '''
+        Returns:
+            dict: JSON-ready result, {"command", "actor_name", "rows", "next_after", "error"} plus the summary fields
+    '''
+    record = result._asdict()
+    record.update(record.pop('summary') or {})
+    return record
+
+class NdjsonWriter:
+    '''
+        One JSON object per query line: {"line", "query", "results": [{"command", "actor_name", "rows", ...}, ...]}
+    '''
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+
+    def write(self, line_number, query_string, results):
+        record = {'line': line_number, 'query': query_string, 'results': [result_record(result) for result in results]}
+        self.output_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.output_file.flush()
+
+class CsvWriter:
+    '''
+        One CSV row per result row with the columns CSV_FIELDS, query_actor is the actor of the query line.
+        Results without rows (e.g. errors) get one row of their own. Summaries are only part of the NDJSON output.
+    '''
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.writer = csv.DictWriter(output_file, CSV_FIELDS, extrasaction='ignore')
+        self.writer.writeheader()
+
+    def write(self, line_number, query_string, results):
+        for result in results:
+            common = {'line': line_number, 'command': result.command, 'query_actor': result.actor_name, 'error': result.error, 'next_after': result.next_after}
+            for row in result.rows or [{}]:
+                self.writer.writerow({**common, **row})
+        self.output_file.flush()
+
+OUTPUT_WRITERS = {'ndjson': NdjsonWriter, 'csv': CsvWriter}
+
+def run_batch(query_file, output_file, output_format='ndjson', workers=1):
+    '''
+        Runs every query line of query_file and streams the results to output_file.
+        With workers > 1 the lines of a chunk run in parallel threads, each with its own read-only connection,
+        with 1 all lines share the connection of the calling thread.
+        Returns:
+            int: number of query lines
+    '''
+    parser = parse_arguments()
+    writer = OUTPUT_WRITERS[output_format](output_file)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    query_lines = read_query_lines(query_file)
+    line_count = 0
+    try:
+        while True:
+            chunk = list(itertools.islice(query_lines, BATCH_CHUNK_SIZE))
+            if len(chunk) == 0:
+                break
+            parsed = []
+            for _, query_string in chunk:
+                try:
+                    parsed.append(parse_query(parser, query_string))
+                except ValueError as e:
+                    parsed.append(e)
+            actor_ids = resolve_actor_ids(args for args in parsed if not isinstance(args, ValueError))
+            arguments = [(line_number, query_string, args, actor_ids) for (line_number, query_string), args in zip(chunk, parsed)]
+            if executor is not None:
+                # map keeps the input order and hands out results as soon as the next one in order is done.
+                lines = executor.map(lambda line_arguments: run_batch_line(*line_arguments), arguments)
+            else:
+                lines = (run_batch_line(*line_arguments) for line_arguments in arguments)
+            for line_number, query_string, results in lines:
+                writer.write(line_number, query_string, results)
+            line_count += len(chunk)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return line_count
+
+def parse_batch_arguments():
+    parser = argparse.ArgumentParser(description='Query the movies database, interactively or in batch mode.')
+    parser.add_argument('--batch', type=str, default=None, help='Run the query lines of this file ("-" for stdin) instead of prompting, one query per line as in the interactive mode.')
+    parser.add_argument('--format', choices=sorted(OUTPUT_WRITERS), default='ndjson', help='Output format of the batch mode.')
+    parser.add_argument('--output', type=str, default='-', help='Output file of the batch mode ("-" for stdout).')
+    parser.add_argument('--workers', type=int, default=1, help='Number of query lines the batch mode runs in parallel.')
+    parser.add_argument('--cache-size', type=int, default=1024, help='Number of query results kept in memory, 0 disables the query cache.')
+    parser.add_argument('--cache-stats', action='store_true', help='Print the hits and misses of the query cache to stderr on exit.')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    dm.configure(readonly=True)
+    batch_args = parse_batch_arguments()
+    query_cache.max_entries = batch_args.cache_size
+    if batch_args.batch is None:
+        run_interactive()
+    else:
+        query_file = sys.stdin if batch_args.batch == '-' else open(batch_args.batch, encoding='utf-8')
+        output_file = sys.stdout if batch_args.output == '-' else open(batch_args.output, 'w', encoding='utf-8', newline='')
+        try:
+            run_batch(query_file, output_file, batch_args.format, batch_args.workers)
+        finally:
+            if query_file is not sys.stdin:
+                query_file.close()
+            if output_file is not sys.stdout:
+                output_file.close()
+
+    if batch_args.cache_stats:
+        print(f'Query cache: {json.dumps(query_cache.stats())}', file=sys.stderr)
+    if costar_graph is not None:
+        costar_graph.close()
+    query_cache.close()
+    dm.close()
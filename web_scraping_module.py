@@ -1,245 +1,390 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import StaleElementReferenceException, ElementClickInterceptedException, ElementNotInteractableException, TimeoutException
+from selenium.common.exceptions import ElementClickInterceptedException, ElementNotInteractableException, StaleElementReferenceException, TimeoutException
 import time
-from bs4 import BeautifulSoup
-import re
-import json
+import argparse
+import os
+import threading
 
+import costar_graph_module
 import database_module as dm
+from extraction_module import IMDB_BASE_URL, extract_actor_awards, extract_actor_bio, extract_actor_list, extract_actor_movies, extract_award_url, extract_movie_metadata
+from fetch_module import HostRateLimiter, RequestsFetcher, SeleniumFetcher, create_driver
+from page_cache_module import CachingFetcher, PageCache, canonical_url
+import scrape_metrics_module
+from scrape_metrics_module import ScrapeMetrics, timed
+from scraping_pool_module import ScrapeWorkerPool
+
+url = f"{IMDB_BASE_URL}/list/ls053501318/"
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'page_cache')
+
+# Browser waits poll their condition with a backoff that doubles from WAIT_INITIAL_DELAY up to WAIT_MAX_DELAY.
+WAIT_INITIAL_DELAY = 0.05
+WAIT_MAX_DELAY = 0.25
+CLICK_TIMEOUT_SECONDS = 10
+# After a click, how long to wait for the page to show its effect before moving on.
+CLICK_SETTLE_SECONDS = 5
+# The actor list counts as loaded once its height stayed the same for SCROLL_QUIET_SECONDS.
+SCROLL_QUIET_SECONDS = 0.5
+SCROLL_TIMEOUT_SECONDS = 10
+# The fixed sleeps the waits replace, for the saved time in the run report.
+CLICK_SLEEP_SECONDS = 1.0
+SCROLL_SLEEP_SECONDS = 5 * 0.5
+ELEMENT_COUNT_SCRIPT = "return document.getElementsByTagName('*').length;"
+
+# Fetchers of the scrape_* functions when none is passed. Bios, movie metadata and award lists
+# are static pages ('http'), only filmographies need the browser ('browser'). Nothing is created
+# on import: Chrome only starts when the first page is actually fetched through it.
+_default_fetchers = {}
+_default_fetchers_lock = threading.Lock()
+DEFAULT_FETCHER_FACTORIES = {
+    'http': RequestsFetcher,
+    'browser': lambda: SeleniumFetcher(create_driver()),
+}
+
+def get_default_fetcher(kind):
+    '''
+        kind: 'http' or 'browser'
+        Returns:
+            fetcher: the default fetcher of that kind, created on first use
+    '''
+    with _default_fetchers_lock:
+        if kind not in _default_fetchers:
+            _default_fetchers[kind] = DEFAULT_FETCHER_FACTORIES[kind]()
+        return _default_fetchers[kind]
 
-# SELENIUM SETUP
-url = "https://www.imdb.com/list/ls053501318/"
-options = Options()
-options.headless = True
-options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
-driver = webdriver.Chrome(options=options)
-driver.set_page_load_timeout(5)
-
-def wait_until_clickable(parent, selector):
-    button_element = parent.find_element(selector[0], selector[1])
-    wait = True
-    while wait:
-        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button_element)
-        time.sleep(1)
-        try:
-            button_element.click()
-            time.sleep(1)
-            wait = False
-        except ElementClickInterceptedException as e:
-            continue
-        except ElementNotInteractableException as e:
-            continue
-            
-def scrape_actors(url):
-    driver.get(url)
-
-    for _ in range(5):
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(0.5) 
-
-    accept_button = driver.find_element(By.CSS_SELECTOR, '[data-testid="accept-button"]')
-    accept_button.click()
-
-    html = driver.page_source
-    soup = BeautifulSoup(html, 'html.parser')
-
-    actor_anchors = soup.find_all('a', class_='ipc-title-link-wrapper')
-
-    actor_names = []
-    actor_links = []
-    for anchor in actor_anchors:
-        name_anchor = anchor.find('h3', class_='ipc-title__text')
-        name = name_anchor.get_text(strip=True) if name_anchor else "Unknown Actor"
-        name = ' '.join(name.split(' ')[1:])
-        if 'href' in anchor.attrs:
-            actor_link = f"https://www.imdb.com{anchor['href']}"
-            actor_links.append(actor_link)
-            actor_names.append(name)
-        else:
-            print(f"Skipping actor '{name}' because link is not found.")
+def set_default_fetcher(kind, fetcher):
+    with _default_fetchers_lock:
+        _default_fetchers[kind] = fetcher
 
-    return list(zip(actor_names, actor_links))
+def close_default_fetchers():
+    '''
+        Closes the default fetchers that were created (quitting Chrome), later calls create new ones.
+    '''
+    with _default_fetchers_lock:
+        fetchers = list(_default_fetchers.values())
+        _default_fetchers.clear()
+    for fetcher in fetchers:
+        fetcher.close()
 
-def scrape_actor_bio(actor_link, actor_name):
+def wait_for(condition, timeout, name, replaced_seconds=0.0):
     '''
-        For a given actor link return the bio
+        Calls condition until it returns a truthy value or timeout seconds have passed.
+        name and replaced_seconds (the fixed sleep this wait stands in for) go to the run report.
         Returns:
-            str: actor_bio
+            the truthy value of condition, None on timeout
     '''
+    started = time.monotonic()
+    delay = WAIT_INITIAL_DELAY
+    slept = 0.0
+    while True:
+        value = condition()
+        elapsed = time.monotonic() - started
+        if value or elapsed >= timeout:
+            break
+        sleep_seconds = min(delay, timeout - elapsed)
+        time.sleep(sleep_seconds)
+        slept += sleep_seconds
+        delay = min(2 * delay, WAIT_MAX_DELAY)
+    scrape_metrics_module.record_wait(name, time.monotonic() - started, slept, replaced_seconds, timed_out=not value)
+    return value if value else None
+
+def wait_until_clickable(parent, selector, web_driver=None, timeout=CLICK_TIMEOUT_SECONDS):
+    '''
+        Scrolls the element into view and clicks it as soon as nothing covers it, then waits until
+        the page reacts: new elements appear, or the element changes its class, hides or goes stale.
+        Raises:
+            TimeoutException: if the element could not be clicked within timeout seconds
+    '''
+    # An element's parent attribute is the driver it belongs to.
+    web_driver = web_driver if web_driver is not None else getattr(parent, 'parent', parent)
+    button_element = parent.find_element(selector[0], selector[1])
+    element_count = web_driver.execute_script(ELEMENT_COUNT_SCRIPT)
+    button_class = button_element.get_attribute('class')
 
-    driver.get(actor_link)
-    actor_html = driver.page_source
-    actor_soup = BeautifulSoup(actor_html, 'html.parser')
+    def click():
+        web_driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", button_element)
+        try:
+            button_element.click()
+            return True
+        except (ElementClickInterceptedException, ElementNotInteractableException):
+            return False
 
-    bio_div = actor_soup.find('div', class_='ipc-html-content-inner-div')
-    actor_bio = bio_div.get_text(strip=True) if bio_div else "Biography not available."
+    def page_changed():
+        try:
+            return web_driver.execute_script(ELEMENT_COUNT_SCRIPT) != element_count or button_element.get_attribute('class') != button_class or not button_element.is_displayed()
+        except StaleElementReferenceException:
+            return True
 
-    return actor_bio
+    if wait_for(click, timeout, 'click', replaced_seconds=CLICK_SLEEP_SECONDS) is None:
+        raise TimeoutException(f'{selector[1]} was not clickable within {timeout} seconds')
+    wait_for(page_changed, CLICK_SETTLE_SECONDS, 'click_settle', replaced_seconds=CLICK_SLEEP_SECONDS)
 
-def scrape_actor_movies(actor_link, actor_name):
+def scroll_actor_list(web_driver):
     '''
-        For a given actor returns all the movies he acted in.
-        Returns:
-            list[tuple]: [(movie_title, movie_sub_url), ...]
+        Scrolls to the bottom until the lazily loaded list stops growing, then accepts the cookie banner.
+    '''
+    # Imported here like in create_driver, selenium.webdriver is only loaded once a browser runs.
+    from selenium.webdriver.common.by import By
+
+    last_height = {'height': None, 'since': None}
+    def scrolled_to_end():
+        height = web_driver.execute_script("window.scrollTo(0, document.body.scrollHeight); return document.body.scrollHeight;")
+        now = time.monotonic()
+        if height != last_height['height']:
+            last_height['height'], last_height['since'] = height, now
+        return now - last_height['since'] >= SCROLL_QUIET_SECONDS
+
+    wait_for(scrolled_to_end, SCROLL_TIMEOUT_SECONDS, 'scroll', replaced_seconds=SCROLL_SLEEP_SECONDS)
+    accept_buttons = wait_for(lambda: web_driver.find_elements(By.CSS_SELECTOR, '[data-testid="accept-button"]'), CLICK_TIMEOUT_SECONDS, 'accept_button')
+    if accept_buttons is None:
+        raise TimeoutException(f'No accept button within {CLICK_TIMEOUT_SECONDS} seconds')
+    accept_buttons[0].click()
+
+def expand_filmography(web_driver):
     '''
-    driver.get(actor_link)
+        Clicks through the "see more" buttons until the actor's previous projects are complete.
+    '''
+    from selenium.webdriver.common.by import By
 
-    actor_previous_projects = driver.find_elements(By.CSS_SELECTOR, '[id=actor-previous-projects]')
+    actor_previous_projects = web_driver.find_elements(By.CSS_SELECTOR, '[id=actor-previous-projects]')
     if len(actor_previous_projects) == 0:
-        actor_previous_projects = driver.find_elements(By.CSS_SELECTOR, '[id=actress-previous-projects]')
+        actor_previous_projects = web_driver.find_elements(By.CSS_SELECTOR, '[id=actress-previous-projects]')
     actor_previous_projects = actor_previous_projects[0]
     actor_previous_projects_classes = actor_previous_projects.get_attribute('class')
     if 'collapsed' in str(actor_previous_projects_classes):
-        wait_until_clickable(driver, (By.CSS_SELECTOR, f'[id={actor_previous_projects.get_attribute('id')}]'))
+        wait_until_clickable(web_driver, (By.CSS_SELECTOR, f'[id={actor_previous_projects.get_attribute("id")}]'), web_driver)
     else:
         while len(actor_previous_projects.find_elements(By.CSS_SELECTOR, '[class*="ipc-see-more__button"]')) > 0:
-            wait_until_clickable(actor_previous_projects, (By.CSS_SELECTOR, '[class*="ipc-see-more__button"]'))
-
-    actor_html = driver.page_source
-    actor_soup = BeautifulSoup(actor_html, 'html.parser')
+            wait_until_clickable(actor_previous_projects, (By.CSS_SELECTOR, '[class*="ipc-see-more__button"]'), web_driver)
 
-    movie_lis = actor_soup.find_all('li', class_='ipc-metadata-list-summary-item')
-    movie_lis = [li for li in movie_lis if 'data-testid=\"cred_actor' in str(li) or 'data-testid=\"cred_actress' in str(li)]
-    movies = []
-    for movie_li in movie_lis:
-        film_title_anchor = movie_li.find('a', class_="ipc-metadata-list-summary-item__t")
-        film_title = film_title_anchor.decode_contents()
-        film_title_href = film_title_anchor['href']
-        film_title_url = f"https://www.imdb.com{film_title_href}"
-        movies.append((film_title, film_title_url))
-    return movies
+def scrape_actors(url, fetcher=None):
+    fetcher = fetcher if fetcher is not None else get_default_fetcher('browser')
+    list_html = fetcher.fetch(url, interact=scroll_actor_list)
+    with timed('parse'):
+        return extract_actor_list(list_html)
 
-def scrape_movie_metadata(movie_link, movie_title):
+def fetch_actor_page(actor_link, fetcher=None):
     '''
-        For a given movie link we return the movie_year, movie_rating and movie_genres.
+        The actor page is always loaded with the filmography expanded, so that one load
+        (or one cache entry) serves the bio, the award link and the movies.
         Returns:
-            tuple: (movie_year, movie_rating, [movie_genre, ...])
+            str: actor_html
     '''
-    driver.get(movie_link)
-
-    movie_html = driver.page_source
-    movie_soup = BeautifulSoup(movie_html, 'html.parser')
+    fetcher = fetcher if fetcher is not None else get_default_fetcher('browser')
+    return fetcher.fetch(actor_link, interact=expand_filmography)
 
-    genres_div = movie_soup.find('div', {'data-testid': "interests"})
-    movie_genres = [anchor.find('span').decode_contents() for anchor in genres_div.find_all('a')]
-
-    hero_page_title_h1 = movie_soup.find('h1', {'data-testid': "hero__pageTitle"})
-    hero_page_title_h1_parent_div = hero_page_title_h1.parent
-    pattern = re.compile(r"^/title/.*/releaseinfo/.*")
-    year_anchor = hero_page_title_h1_parent_div.find('a', href=pattern)
-    if year_anchor is not None:
-        movie_year = year_anchor.decode_contents()[:4]
-    else:
-        movie_year = None
+def scrape_actor_bio(actor_link, actor_name, fetcher=None):
+    '''
+        For a given actor link return the bio
+        Returns:
+            str: actor_bio
+    '''
+    actor_html = fetch_actor_page(actor_link, fetcher)
+    with timed('parse'):
+        return extract_actor_bio(actor_html)
 
-    rating_div = movie_soup.find('div', {'data-testid': "hero-rating-bar__aggregate-rating__score"})
-    movie_rating = rating_div.find_all('span')[0].decode_contents() if rating_div is not None else 0
+def scrape_actor_movies(actor_link, actor_name, fetcher=None):
+    '''
+        For a given actor returns all the movies he acted in.
+        Returns:
+            list[MovieCredit]: [(movie_name, movie_url), ...]
+    '''
+    actor_html = fetch_actor_page(actor_link, fetcher)
+    with timed('parse'):
+        return extract_actor_movies(actor_html)
 
-    return movie_year, movie_rating, movie_genres
+def scrape_movie_metadata(movie_link, movie_title, fetcher=None):
+    '''
+        For a given movie link we return the movie_year, movie_rating and movie_genres.
+        Returns:
+            MovieMetadata: (movie_year, movie_rating, [movie_genre, ...])
+    '''
+    fetcher = fetcher if fetcher is not None else get_default_fetcher('http')
+    movie_html = fetcher.fetch(movie_link)
+    with timed('parse'):
+        return extract_movie_metadata(movie_html)
 
-def scrape_actor_awards(actor_link, actor_name):
+def scrape_actor_awards(actor_link, actor_name, fetcher=None):
     '''
         For a given actor returns the awards he got in respective years.
+        The award link is in the static part of the actor page: the expanded page cached by the bio
+        phase is used if there is one, otherwise the plain page is fetched, no browser needed.
         Returns:
-            list[tuple]: [(award_name, award_tag, award_category, award_year), ...]
+            list[Award]: [(award_name, award_tag, award_category, award_year), ...]
     '''
-    driver.get(actor_link)
-
-    actor_html = driver.page_source
-    actor_soup = BeautifulSoup(actor_html, 'html.parser')
-    pattern = re.compile(r"^/name/.*/awards/.*")
-    award_href = actor_soup.find('a', href=pattern)['href']
-    award_url = f"https://www.imdb.com{award_href}"
-
-    driver.get(award_url)
-
-    award_html = driver.page_source
-    award_soup = BeautifulSoup(award_html, 'html.parser')
-
-    award_lis = award_soup.find_all('li', {'data-testid': "list-item"})
-    actor_awards = []
-    for award_li in award_lis:
-        award_div = award_li.find('div', class_='ipc-metadata-list-summary-item__tc')
-        award_anchor = award_div.find('a', class_='ipc-metadata-list-summary-item__t')
-        award_year, award_tag = tuple(award_anchor.decode_contents().split('<span')[0].split(' '))
-        award_name = award_anchor.find('span').decode_contents()
-        award_category = award_div.find('span', class_='ipc-metadata-list-summary-item__li awardCategoryName')
-        actor_awards.append((award_name, award_tag, award_category.decode_contents() if award_category is not None else "No Category", award_year))
-
-    return actor_awards
+    fetcher = fetcher if fetcher is not None else get_default_fetcher('http')
+    actor_html = fetcher.cached(actor_link, interact=expand_filmography) if isinstance(fetcher, CachingFetcher) else None
+    if actor_html is None:
+        actor_html = fetcher.fetch(actor_link)
+    with timed('parse'):
+        award_url = extract_award_url(actor_html)
+    award_html = fetcher.fetch(award_url)
+    with timed('parse'):
+        return extract_actor_awards(award_html)
+
+def is_due(job, refresh_before, max_attempts):
+    '''
+        A stage is due when it never finished, or when it finished before refresh_before (incremental mode).
+        Stages that failed max_attempts times in a row are left alone until their job row is reset.
+        job: (status, attempts, fetched_at) or None if the entity was never scraped
+    '''
+    if job is None:
+        return True
+    status, attempts, fetched_at = job
+    if status == 'done':
+        return refresh_before is not None and (fetched_at is None or fetched_at < refresh_before)
+    return attempts < max_attempts
+
+def run_stage(pool, stage, tasks, save_result):
+    '''
+        Scrapes all tasks on the pool and saves every result together with its checkpoint.
+        A failure is recorded on the job so the next run retries it.
+        Durations, sleeps and retries are recorded in pool.metrics under stage.
+        tasks: iterable of ((entity, label), scrape_function, arguments)
+    '''
+    metrics = pool.metrics
+    saved, failed = 0, 0
+    with metrics.stage(stage):
+        for (entity, label), result, error in pool.run(tasks, stage):
+            metrics.record_result(stage, entity, error)
+            with metrics.task(stage, entity), timed('db_write'):
+                if error is not None:
+                    print(f'Failed {stage} for {label}: {error!r}')
+                    dm.fail_scrape_job(entity, stage, repr(error))
+                    failed += 1
+                    continue
+                print(f'Scraped {stage} for {label}...')
+                save_result(entity, label, result)
+                saved += 1
+    print(f'{stage}: {saved} saved, {failed} failed')
+
+def run_bio_stage(pool, listed_actors, refresh_before, max_attempts):
+    '''
+        Scrapes the bio of every listed actor that is new or due for a refresh.
+        Actors already stored under another ref_ variant of their link keep their stored link.
+    '''
+    stored_links = {canonical_url(actor_link): actor_link for _, _, actor_link in dm.get_actor_links() if actor_link is not None}
+    jobs = dm.get_scrape_jobs('bio')
+    tasks = (
+        ((stored_links.get(canonical_url(actor_link), actor_link), actor_name), scrape_actor_bio, (actor_link, actor_name))
+        for actor_name, actor_link in listed_actors
+        if is_due(jobs.get(stored_links.get(canonical_url(actor_link), actor_link)), refresh_before, max_attempts)
+    )
+    run_stage(pool, 'bio', tasks, lambda actor_link, actor_name, actor_bio: dm.save_actor_bio(actor_name, actor_bio, actor_link))
+
+def run_awards_stage(pool, actors, refresh_before, max_attempts):
+    '''
+        Scrapes the won awards of every stored actor whose awards are due.
+    '''
+    actor_ids = {actor_link: actor_id for actor_id, _, actor_link in actors}
+    jobs = dm.get_scrape_jobs('awards')
+    tasks = (
+        ((actor_link, actor_name), scrape_actor_awards, (actor_link, actor_name))
+        for _, actor_name, actor_link in actors if is_due(jobs.get(actor_link), refresh_before, max_attempts)
+    )
+    def save_awards(actor_link, actor_name, actor_awards):
+        won_awards = [(award_name, award_category, award_year) for award_name, award_tag, award_category, award_year in actor_awards if award_tag == 'Winner']
+        dm.save_actor_awards(actor_ids[actor_link], actor_link, won_awards)
+    run_stage(pool, 'awards', tasks, save_awards)
+
+def run_movies_stage(pool, actors, refresh_before, max_attempts):
+    '''
+        Scrapes the filmography of every stored actor whose movies are due.
+    '''
+    actor_ids = {actor_link: actor_id for actor_id, _, actor_link in actors}
+    jobs = dm.get_scrape_jobs('movies')
+    tasks = (
+        ((actor_link, actor_name), scrape_actor_movies, (actor_link, actor_name))
+        for _, actor_name, actor_link in actors if is_due(jobs.get(actor_link), refresh_before, max_attempts)
+    )
+    run_stage(pool, 'movies', tasks, lambda actor_link, actor_name, actor_movies: dm.save_actor_movies(actor_ids[actor_link], actor_link, actor_movies))
+
+def run_metadata_stage(pool, refresh_before, max_attempts):
+    '''
+        Scrapes the metadata of every staged movie that is new, plus stored movies due for a refresh.
+    '''
+    jobs = dm.get_scrape_jobs('metadata')
+    movies = dm.pending_movie_urls()
+    if refresh_before is not None:
+        movies += [(movie_name, movie_url) for _, movie_name, movie_url in dm.get_all_movies()]
+    tasks = (
+        ((movie_url, movie_name), scrape_movie_metadata, (movie_url, movie_name))
+        for movie_name, movie_url in movies if is_due(jobs.get(movie_url), refresh_before, max_attempts)
+    )
+    def save_metadata(movie_url, movie_name, movie_metadata):
+        movie_year, movie_rating, movie_genres = movie_metadata
+        dm.save_movie(movie_name, movie_rating, movie_year, ", ".join(movie_genres), movie_url)
+    run_stage(pool, 'metadata', tasks, save_metadata)
 
 if __name__ == '__main__':
-    
-    print('Scrape Actor Data:')
-    result = dm.get_actor_links()
-    actors_in_database = [(actor_name, actor_link) for _, actor_name, actor_link in result]
-    for actor_index, (actor_name, actor_link) in enumerate(scrape_actors(url)):
-        if (actor_name, actor_link) in actors_in_database:
-            print(f'Skipping {actor_name}...')
-            continue
-        print(f'Scraping {actor_name}...')
-        actor_bio = scrape_actor_bio(actor_link, actor_name)
-        actor_id = dm.insert_actor_into_actors_table(actor_name, actor_bio, actor_link)
-
-    print('Scrape Actor Award Data:')
-    actors_in_actors = dm.get_actor_links()
-    actors_in_awards = [actor_name for actor_name, in dm.get_actors_in_awards()]
-    for actor_id, actor_name, actor_link in actors_in_actors:
-        if actor_name in actors_in_awards:
-            print(f'Skipping Awards for {actor_name}...')
-            continue
-        print(f'Scraping Awards for {actor_name}...')
-        actor_awards = scrape_actor_awards(actor_link, actor_name)
-        actor_awards = [ actor_award for actor_award in actor_awards if actor_award[1] == 'Winner']
-        for award_name, award_tag, award_category, award_year in actor_awards:
-            dm.insert_award_into_awards_table(actor_id, award_name, award_category, award_year)
-    
-    print('Scrape Actor Movie Data:')
-    actors_in_actor_movie_staging = [actor_name for actor_name, in dm.get_actors_in_actor_movie_staging()]
-    for actor_id, actor_name, actor_link in actors_in_actors:
-        if actor_name in actors_in_actor_movie_staging:
-            print(f'Skipping Movies for {actor_name}...')
-            continue
-        print(f'Scraping Movies for {actor_name}...')
-        wait = True
-        while wait:
-            try:
-                actor_movies = scrape_actor_movies(actor_link, actor_name)
-                wait = False
-            except StaleElementReferenceException as e:
-                continue           
-        for movie_name, movie_url in actor_movies:
-            dm.insert_into_actor_movie_staging_table(actor_id, movie_name, movie_url)
-        dm.conn.commit()
-
-    print('Scrape Movie Data:')
-    movies_in_movies = dm.get_all_movies()
-    movie_urls_in_movies = [movie_url for _, _, movie_url in movies_in_movies]
-    stg_in_actor_movie_staging = dm.get_all_actor_movie_staging_table()
-    unique_movies_in_actor_movie_staging = list(set([(movie_name, movie_url) for _, movie_name, movie_url in stg_in_actor_movie_staging]))
-    movies_to_scrape = [(movie_name, movie_url) for _, movie_name, movie_url in stg_in_actor_movie_staging if movie_url not in movie_urls_in_movies]
-    for movie_index, (movie_name, movie_url) in enumerate(movies_to_scrape):
-        print(f'Scraping Movie {movie_name}...')
-        wait = True
-        while wait:
-            try:
-                movie_year, movie_rating, movie_genres = scrape_movie_metadata(movie_url, movie_name)
-                wait = False
-            except TimeoutException as e:
-                continue
-        movie_id = dm.insert_movie_into_movies_table(movie_name, movie_rating, movie_year, ", ".join(movie_genres), movie_url)
-
-    print('Insert played_in relations:')
-    for movie_index, (actor_id, movie_name, movie_url) in enumerate(stg_in_actor_movie_staging):
-        if movie_index % 25 == 0:
-            print(f'{movie_index}/{len(stg_in_actor_movie_staging)}')
-        movie_id = dm.get_movie_id(movie_url)[0]
-        dm.insert_entry_in_played_in_table(actor_id, movie_id)
-
-    dm.conn.commit()
-    dm.conn.close()
-    driver.quit()
+    parser = argparse.ArgumentParser(description='Scrape actors, awards and movies from IMDb into the movies database.')
+    parser.add_argument('--workers', type=int, default=4, help='Number of parallel headless browsers for pages that need JS interaction.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of parallel HTTP requests for static pages.')
+    parser.add_argument('--rate-limit', type=float, default=None, help='Maximum number of requests per second to one host.')
+    parser.add_argument('--static-backend', choices=['requests', 'selenium'], default='requests', help='Backend used for static pages.')
+    parser.add_argument('--max-retries', type=int, default=3, help='Retries per page after a timeout or a stale element.')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIRECTORY, help='Directory of the on-disk page cache.')
+    parser.add_argument('--cache-ttl', type=float, default=7 * 24, help='Hours after which a cached page is fetched again.')
+    parser.add_argument('--cache-max-mb', type=float, default=1024, help='Size of the page cache before least recently used pages are evicted.')
+    parser.add_argument('--replay', action='store_true', help='Run the whole pipeline from cached pages only, without a browser or network access.')
+    parser.add_argument('--incremental', type=float, default=None, metavar='HOURS', help='Also re-scrape stages that finished more than HOURS ago, cached pages older than that are fetched again.')
+    parser.add_argument('--max-attempts', type=int, default=5, help='Consecutive failed runs after which a stage is no longer retried.')
+    parser.add_argument('--report', type=str, default=None, help='Write the run report (time per stage, phase and url, sleeps, retries, time saved by the waits) as JSON to this file.')
+    parser.add_argument('--profile', type=str, default=None, help='Profile the main and all worker threads with cProfile and write the merged stats to this file. On Python 3.12+ the threads share one profiler and times of concurrent calls are approximate.')
+    args = parser.parse_args()
+    refresh_before = time.time() - args.incremental * 3600 if args.incremental is not None else None
+    metrics = ScrapeMetrics(profile=args.profile is not None)
+
+    # A refresh must not be answered by a page cached before refresh_before, or it would be checkpointed as fresh.
+    cache_ttl = min(args.cache_ttl, args.incremental) if args.incremental is not None else args.cache_ttl
+    page_cache = PageCache(args.cache_dir, ttl_seconds=cache_ttl * 3600, max_bytes=int(args.cache_max_mb * 1024 ** 2))
+    if args.replay:
+        replay_fetcher = CachingFetcher(None, page_cache, replay=True)
+        set_default_fetcher('browser', replay_fetcher)
+        browser_pool = ScrapeWorkerPool(args.concurrency, lambda: replay_fetcher, max_retries=0, metrics=metrics)
+        static_pool = browser_pool
+    else:
+        rate_limiter = HostRateLimiter(args.rate_limit)
+        # The actor list is usually cached, then no browser is started for it.
+        set_default_fetcher('browser', CachingFetcher(None, page_cache, fetcher_factory=lambda: SeleniumFetcher(create_driver(), rate_limiter)))
+        browser_pool = ScrapeWorkerPool(args.workers, lambda: CachingFetcher(None, page_cache, fetcher_factory=lambda: SeleniumFetcher(create_driver(), rate_limiter)), max_retries=args.max_retries, metrics=metrics)
+        if args.static_backend == 'requests':
+            http_fetcher = CachingFetcher(RequestsFetcher(args.concurrency, rate_limiter), page_cache)
+            set_default_fetcher('http', http_fetcher)
+            static_pool = ScrapeWorkerPool(args.concurrency, lambda: http_fetcher, max_retries=args.max_retries, metrics=metrics)
+        else:
+            static_pool = browser_pool
+
+    with metrics.profiled():
+        print('Scrape Actor Data:')
+        # Bios come from the expanded actor page, which the browser loads once per actor.
+        with metrics.stage('list'), metrics.task('list', url):
+            listed_actors = scrape_actors(url)
+        run_bio_stage(browser_pool, listed_actors, refresh_before, args.max_attempts)
+        actors = dm.get_actor_links()
+
+        print('Scrape Actor Award Data:')
+        run_awards_stage(static_pool, actors, refresh_before, args.max_attempts)
+
+        print('Scrape Actor Movie Data:')
+        run_movies_stage(browser_pool, actors, refresh_before, args.max_attempts)
+
+        print('Scrape Movie Data:')
+        run_metadata_stage(static_pool, refresh_before, args.max_attempts)
+
+        print('Insert played_in relations:')
+        with metrics.stage('finalize'), metrics.task('finalize', dm.database_path()), timed('db_write'):
+            print(f'{dm.materialize_played_in()} new relations')
+            print(f'{dm.refresh_actor_stats()} actor statistics refreshed')
+            print(f'{costar_graph_module.update_graph()} actors and movies updated in the co-star graph')
+
+    static_pool.close()
+    browser_pool.close()
+    print(f'Page cache: {page_cache.hits} hits, {page_cache.misses} misses')
+    for line in metrics.summary_lines():
+        print(line)
+    if args.report is not None:
+        metrics.write_report(args.report)
+    if args.profile is not None:
+        metrics.write_profile(args.profile)
+    close_default_fetchers()
+    dm.close()